@@ -0,0 +1,316 @@
+"""
+Admin CLI - seeding, synthetic data generation and streaming inspection of the database
+
+Usage:
+    python admin.py seed
+    python admin.py create-admin --email ops@example.com --name "Ops" [--password ...]
+    python admin.py generate --users 100000 --inspections 1000000
+    python admin.py users [--role pilot] [--limit 50]
+    python admin.py inspections [--status completed] [--limit 50]
+    python admin.py reports [--limit 50]
+    python admin.py rollups [--customer-id 42]
+    python admin.py dispatch [--solver greedy] [--dry-run]
+    python admin.py sla
+    python admin.py archive [--older-than-days 365] [--dry-run]
+    python admin.py analysis-worker [--processes 4] [--until-idle]
+    FIELD_MODE=on python admin.py sync [--url https://api.example.com --token ...]
+    FIELD_MODE=on python admin.py field-login --email pilot@example.com [--password ...]
+    python admin.py summary
+"""
+import argparse
+import getpass
+import multiprocessing
+import time
+
+from sqlalchemy import func, select
+
+from app.database import Base, SessionLocal, engine
+from app.models import ArchivePartition, User, Inspection, Report, Finding
+from app.auth import FIELD_MODE, hash_password
+from app.services.synthetic_data import SyntheticDataGenerator
+from app.services.trend_service import TrendService
+from app.services.dispatch_service import DispatchService
+from app.services.sla_service import SlaService
+from app.services.archive_service import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ArchiveService
+from app.services.sync_service import FIELD_SYNC_TOKEN, FIELD_SYNC_URL, SyncEngine
+from app.services.analysis_service import AnalysisWorker
+
+STREAM_BATCH_SIZE = 1000
+
+def seed(db, args):
+    """Create the demo customer and pilot accounts"""
+    if db.query(User.id).filter(User.email.in_(["customer@example.com", "pilot@example.com"])).first():
+        print("Users already exist. Skipping seed.")
+        return
+
+    db.add(User(name="Test Customer", email="customer@example.com", password=hash_password("customer123"), role="customer"))
+    db.add(User(name="Test Pilot", email="pilot@example.com", password=hash_password("pilot123"), role="pilot"))
+    db.commit()
+    print("Seeded customer@example.com / customer123")
+    print("Seeded pilot@example.com / pilot123")
+
+def create_admin(db, args):
+    """Create an admin account, or promote an existing user (the API only registers customers and pilots)"""
+    user = db.query(User).filter(User.email == args.email).first()
+    if user is not None:
+        user.role = "admin"
+        db.commit()
+        print(f"Promoted {args.email} to admin")
+        return
+    password = args.password or getpass.getpass("Password: ")
+    if not password:
+        raise SystemExit("A password is required")
+    db.add(User(name=args.name or args.email, email=args.email, password=hash_password(password), role="admin"))
+    db.commit()
+    print(f"Created admin {args.email}")
+
+def generate(db, args):
+    """Bulk-load synthetic users, inspections, reports and findings"""
+    started = time.perf_counter()
+    generator = SyntheticDataGenerator(db, seed=args.seed, batch_size=args.batch_size)
+    counts = generator.generate(
+        users=args.users,
+        inspections=args.inspections,
+        pilot_ratio=args.pilot_ratio,
+        findings_per_report=args.findings_per_report
+    )
+    counts["defect_rollups"] = TrendService(db).rebuild()
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"{table:<12} {count:>12,}")
+    print(f"Done in {elapsed:.1f}s ({sum(counts.values()) / max(elapsed, 1e-9):,.0f} rows/s)")
+
+def rebuild_rollups(db, args):
+    """Recompute defect trend rollups from reports and findings"""
+    started = time.perf_counter()
+    rows = TrendService(db).rebuild(customer_id=args.customer_id)
+    print(f"Rebuilt {rows:,} rollup rows in {time.perf_counter() - started:.1f}s")
+
+def refresh_sla(db, args):
+    """Rebuild the SLA percentile summary (run from cron instead of on demand if preferred)"""
+    started = time.perf_counter()
+    rows = SlaService(db).refresh()
+    print(f"Rebuilt {rows:,} SLA summary rows in {time.perf_counter() - started:.1f}s")
+
+def archive(db, args):
+    """Move settled inspections older than the cutoff into the yearly cold partitions"""
+    started = time.perf_counter()
+    moved = ArchiveService(db).archive(args.older_than_days, args.batch_size, args.dry_run)
+    verb = "would move" if args.dry_run else "moved"
+    for table, count in moved.items():
+        print(f"{verb} {table:<18} {count:>12,}")
+    for partition in db.scalars(select(ArchivePartition).order_by(ArchivePartition.year)):
+        print(f"archive {partition.year}  {partition.inspections:>12,} inspections  "
+              f"newest {partition.newest_settled_at:%Y-%m-%d}  last run {partition.archived_at:%Y-%m-%d %H:%M}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+def _run_analysis_worker(until_idle: bool) -> int:
+    return AnalysisWorker().run(until_idle=until_idle)
+
+def analysis_worker(db, args):
+    """Claim analysis shards and classify their frames in --processes processes (each loads its own model)"""
+    started = time.perf_counter()
+    if args.processes == 1:
+        completed = [_run_analysis_worker(args.until_idle)]
+    else:
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            completed = pool.map(_run_analysis_worker, [args.until_idle] * args.processes)
+    print(f"{sum(completed)} shards completed by {args.processes} workers in {time.perf_counter() - started:.1f}s")
+
+def field_sync(db, args):
+    """Field laptop: push local work to the central API and pull the pilot's assignments"""
+    started = time.perf_counter()
+    result = SyncEngine(db, args.url, args.token).run()
+    for item in result.pop("conflicts"):
+        print(f"conflict (central kept): {item}")
+    for item in result.pop("rejected"):
+        print(f"rejected: {item}")
+    print("  ".join(f"{key}={value:,}" for key, value in result.items()))
+    print(f"Synced in {time.perf_counter() - started:.1f}s")
+
+def field_login(db, args):
+    """Field laptop: set the local password a pulled user signs in with (checked and signed here, not centrally)"""
+    if FIELD_MODE != "on":
+        raise SystemExit("field-login only applies with FIELD_MODE=on")
+    user = db.query(User).filter(User.email == args.email).first()
+    if user is None:
+        raise SystemExit(f"{args.email} is not in the field store; run sync first")
+    password = args.password or getpass.getpass("Local password: ")
+    if not password:
+        raise SystemExit("A password is required")
+    user.password = hash_password(password)
+    db.commit()
+    print(f"Local login set for {args.email}")
+
+def dispatch(db, args):
+    """Batch-assign pending inspections to pilots"""
+    started = time.perf_counter()
+    result = DispatchService(db).dispatch(solver=args.solver, dry_run=args.dry_run, limit=args.limit)
+    print(f"pending {result['pending']:,}  pilots {result['available_pilots']:,}  "
+          f"assigned {result['assigned']:,}  solver {result['solver']}  "
+          f"mean distance {result.get('mean_distance_km')} km  ({time.perf_counter() - started:.2f}s)")
+
+def _stream(db, query, limit):
+    """Yield rows from a server-side cursor without materializing the table"""
+    if limit:
+        query = query.limit(limit)
+    result = db.execute(query.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+def list_users(db, args):
+    query = select(User.id, User.name, User.email, User.role).order_by(User.id)
+    if args.role:
+        query = query.where(User.role == args.role)
+
+    print(f"{'ID':<8} {'Name':<25} {'Email':<35} {'Role':<10}")
+    print("-" * 80)
+    shown = 0
+    for row in _stream(db, query, args.limit):
+        print(f"{row.id:<8} {row.name[:25]:<25} {row.email[:35]:<35} {row.role:<10}")
+        shown += 1
+    print(f"Shown: {shown}")
+
+def list_inspections(db, args):
+    query = select(
+        Inspection.id, Inspection.customer_id, Inspection.location,
+        Inspection.status, Inspection.scheduled_date
+    ).order_by(Inspection.id)
+    if args.status:
+        query = query.where(Inspection.status == args.status)
+
+    print(f"{'ID':<8} {'CustID':<8} {'Location':<30} {'Status':<15} {'Date':<20}")
+    print("-" * 85)
+    shown = 0
+    for row in _stream(db, query, args.limit):
+        print(f"{row.id:<8} {row.customer_id:<8} {row.location[:30]:<30} {row.status:<15} {str(row.scheduled_date)[:19]:<20}")
+        shown += 1
+    print(f"Shown: {shown}")
+
+def list_reports(db, args):
+    query = select(
+        Report.id, Report.inspection_id, Report.title,
+        Report.defect_classification, Report.confidence
+    ).order_by(Report.id)
+
+    print(f"{'ID':<8} {'InspID':<8} {'Title':<40} {'Defects':<15} {'Confidence':<10}")
+    print("-" * 85)
+    shown = 0
+    for row in _stream(db, query, args.limit):
+        print(f"{row.id:<8} {row.inspection_id:<8} {row.title[:40]:<40} {row.defect_classification or 'N/A':<15} {row.confidence or 'N/A':<10}")
+        shown += 1
+    print(f"Shown: {shown}")
+
+def summary(db, args):
+    """Table overview computed with SQL aggregates only"""
+    print("\n=== USERS ===")
+    for role, count in db.execute(select(User.role, func.count()).group_by(User.role).order_by(User.role)):
+        print(f"{role:<20} {count:>12,}")
+
+    print("\n=== INSPECTIONS ===")
+    for status, count in db.execute(
+        select(Inspection.status, func.count()).group_by(Inspection.status).order_by(Inspection.status)
+    ):
+        print(f"{status or 'N/A':<20} {count:>12,}")
+    for package, count in db.execute(
+        select(Inspection.package, func.count()).group_by(Inspection.package).order_by(Inspection.package)
+    ):
+        print(f"package {package or 'N/A':<12} {count:>12,}")
+    first, last = db.execute(select(func.min(Inspection.created_at), func.max(Inspection.created_at))).one()
+    print(f"created between {first} and {last}")
+
+    print("\n=== REPORTS ===")
+    reports, avg_confidence = db.execute(select(func.count(Report.id), func.avg(Report.confidence))).one()
+    print(f"{'total':<20} {reports:>12,}")
+    print(f"{'avg confidence':<20} {float(avg_confidence or 0):>12.1f}")
+
+    print("\n=== FINDINGS ===")
+    for defect_class, count, confidence in db.execute(
+        select(Finding.defect_class, func.count(), func.avg(Finding.confidence))
+        .group_by(Finding.defect_class)
+        .order_by(func.count().desc())
+    ):
+        print(f"{defect_class:<20} {count:>12,}   avg confidence {float(confidence or 0):.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Vyooma admin CLI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("seed", help="Create demo customer/pilot accounts").set_defaults(handler=seed)
+
+    admin = commands.add_parser("create-admin", help="Create or promote an admin account")
+    admin.add_argument("--email", required=True)
+    admin.add_argument("--name")
+    admin.add_argument("--password", help="Prompted for when omitted")
+    admin.set_defaults(handler=create_admin)
+
+    gen = commands.add_parser("generate", help="Bulk-load synthetic data")
+    gen.add_argument("--users", type=int, default=10000)
+    gen.add_argument("--inspections", type=int, default=100000)
+    gen.add_argument("--pilot-ratio", type=float, default=0.1)
+    gen.add_argument("--findings-per-report", type=float, default=8.0)
+    gen.add_argument("--batch-size", type=int, default=10000)
+    gen.add_argument("--seed", type=int, default=42)
+    gen.set_defaults(handler=generate)
+
+    users = commands.add_parser("users", help="Stream users")
+    users.add_argument("--role", choices=["customer", "pilot"])
+    users.add_argument("--limit", type=int, default=100, help="0 for no limit")
+    users.set_defaults(handler=list_users)
+
+    inspections = commands.add_parser("inspections", help="Stream inspections")
+    inspections.add_argument("--status")
+    inspections.add_argument("--limit", type=int, default=100, help="0 for no limit")
+    inspections.set_defaults(handler=list_inspections)
+
+    reports = commands.add_parser("reports", help="Stream reports")
+    reports.add_argument("--limit", type=int, default=100, help="0 for no limit")
+    reports.set_defaults(handler=list_reports)
+
+    rollups = commands.add_parser("rollups", help="Rebuild defect trend rollups")
+    rollups.add_argument("--customer-id", type=int)
+    rollups.set_defaults(handler=rebuild_rollups)
+
+    commands.add_parser("sla", help="Rebuild SLA percentile summaries").set_defaults(handler=refresh_sla)
+
+    archiver = commands.add_parser("archive", help="Move old settled inspections to cold partitions")
+    archiver.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archiver.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    archiver.add_argument("--dry-run", action="store_true")
+    archiver.set_defaults(handler=archive)
+
+    worker = commands.add_parser("analysis-worker", help="Classify analysis shards (run on each analysis node)")
+    worker.add_argument("--processes", type=int, default=1, help="Worker processes on this machine")
+    worker.add_argument("--until-idle", action="store_true", help="Exit once no shard is left to claim")
+    worker.set_defaults(handler=analysis_worker)
+
+    syncer = commands.add_parser("sync", help="Field mode: sync the local store with the central API")
+    syncer.add_argument("--url", default=FIELD_SYNC_URL)
+    syncer.add_argument("--token", default=FIELD_SYNC_TOKEN)
+    syncer.set_defaults(handler=field_sync)
+
+    local_login = commands.add_parser("field-login", help="Field mode: set a pulled user's local password")
+    local_login.add_argument("--email", required=True)
+    local_login.add_argument("--password", help="Prompted for when omitted")
+    local_login.set_defaults(handler=field_login)
+
+    dispatcher = commands.add_parser("dispatch", help="Batch-assign pending inspections to pilots")
+    dispatcher.add_argument("--solver", choices=["auto", "greedy", "exact"], default="auto")
+    dispatcher.add_argument("--limit", type=int)
+    dispatcher.add_argument("--dry-run", action="store_true")
+    dispatcher.set_defaults(handler=dispatch)
+
+    commands.add_parser("summary", help="Aggregate counts per table").set_defaults(handler=summary)
+
+    args = parser.parse_args()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        args.handler(db, args)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import os
+import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,12 +16,39 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "CHANGE_ME_IN_PRODUCTION_3a8f9b2c5d7e1f
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "1440"))  # 24 hours default
 
+# Field mode (FIELD_MODE=on) signs local logins with a key of its own: a laptop never holds the
+# central signing key, and the pilot's central token is only sent on outbound sync calls
+FIELD_MODE = os.getenv("FIELD_MODE", "off")
+FIELD_JWT_KEY_PATH = os.getenv("FIELD_JWT_KEY_PATH", "field.key")
+
+def _field_secret_key() -> str:
+    """FIELD_JWT_SECRET_KEY, or a random key generated once and kept in FIELD_JWT_KEY_PATH"""
+    key = os.getenv("FIELD_JWT_SECRET_KEY")
+    if key:
+        if key == os.getenv("JWT_SECRET_KEY"):
+            raise RuntimeError("FIELD_JWT_SECRET_KEY must differ from the central JWT_SECRET_KEY")
+        return key
+    try:
+        fd = os.open(FIELD_JWT_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(FIELD_JWT_KEY_PATH) as f:
+            return f.read().strip()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key
+
+if FIELD_MODE == "on":
+    SECRET_KEY = _field_secret_key()
+
 def hash_password(password: str) -> str:
     """Hash a plain text password"""
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (False for accounts without a usable one, e.g. users pulled into a field store)"""
+    if pwd_context.identify(hashed_password) is None:
+        return False
     return pwd_context.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
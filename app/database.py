@@ -1,15 +1,28 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi import Request
 
 import os
+import itertools
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Field mode: the backend runs on a pilot's laptop against a local SQLite store
+# and exchanges changes with the central API through the sync engine (sync_service)
+FIELD_MODE = os.getenv("FIELD_MODE", "off")  # off or on
+FIELD_DB_PATH = os.getenv("FIELD_DB_PATH", "field.db")
+
 # Use the DATABASE_URL from env, fallback to local if not found (or raise error)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
+if not DATABASE_URL and FIELD_MODE == "on":
+    DATABASE_URL = f"sqlite:///{FIELD_DB_PATH}"
+elif not DATABASE_URL:
     # Fallback to local for safety, or you can print a warning
     DB_USER = "root"
     DB_PASSWORD = "!mahi?123"
@@ -18,23 +31,209 @@ if not DATABASE_URL:
     DB_NAME = "drone_inspection"
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Supabase (Postgres) needs postgresql:// but typically comes as postgres:// sometimes
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def _normalize_url(url: str) -> str:
+    # Supabase (Postgres) needs postgresql:// but typically comes as postgres:// sometimes
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+DATABASE_URL = _normalize_url(DATABASE_URL)
+
+# Read replicas (comma separated). Empty means every session uses the primary.
+DATABASE_REPLICA_URLS = [
+    _normalize_url(url.strip())
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+REPLICA_SELECTION = os.getenv("REPLICA_SELECTION", "round_robin")  # round_robin, least_connections
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "10"))
+REPLICA_RETRY_AFTER_SECONDS = float(os.getenv("REPLICA_RETRY_AFTER_SECONDS", "30"))
+# After a client writes, its reads stay on the primary for this long (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
 
 engine = create_engine(DATABASE_URL)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets the API read while the sync engine or a background job writes
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine
 )
 
+# Sessions handed to read-only routes; bound per session to a replica or the primary
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False
+)
+
 Base = declarative_base()
 
-def get_db():
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _reject_read_session_writes(session, flush_context, instances):
+    if session.new or session.deleted or session.dirty:
+        raise RuntimeError("Read-only session cannot write; use get_db for this route")
+
+class Replica:
+    """A replica engine plus its health bookkeeping"""
+
+    def __init__(self, url: str):
+        self.engine = create_engine(url, pool_pre_ping=True)
+        self.down_until = 0.0
+        self.checked_at = 0.0
+
+    def connections(self) -> int:
+        """Connections currently checked out of this replica's pool"""
+        checkedout = getattr(self.engine.pool, "checkedout", None)
+        return checkedout() if checkedout else 0
+
+    def replication_lag(self) -> float:
+        """
+        Seconds this replica is behind the primary
+
+        Raises:
+            DBAPIError: If the replica cannot be reached
+        """
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name == "postgresql":
+                lag = conn.execute(text(
+                    "SELECT CASE WHEN pg_is_in_recovery() "
+                    "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+                    "ELSE 0 END"
+                )).scalar()
+                return float(lag or 0)
+            conn.execute(text("SELECT 1"))
+            return 0.0
+
+class ReplicaRouter:
+    """
+    Picks a healthy replica for read-only sessions
+
+    Replicas that fail or fall more than REPLICA_MAX_LAG_SECONDS behind are taken
+    out of rotation for REPLICA_RETRY_AFTER_SECONDS, then probed again.
+    """
+
+    def __init__(self, urls: list, selection: str = "round_robin"):
+        self.replicas = [Replica(url) for url in urls]
+        self.selection = selection
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def mark_down(self, replica: Replica):
+        replica.down_until = time.monotonic() + REPLICA_RETRY_AFTER_SECONDS
+
+    def _is_healthy(self, replica: Replica, now: float) -> bool:
+        if replica.down_until > now:
+            return False
+        if now - replica.checked_at < REPLICA_CHECK_INTERVAL_SECONDS:
+            return True
+
+        with self._lock:
+            if now - replica.checked_at < REPLICA_CHECK_INTERVAL_SECONDS:
+                return replica.down_until <= now
+            replica.checked_at = now
+            try:
+                lag = replica.replication_lag()
+            except DBAPIError:
+                lag = None
+            if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+                self.mark_down(replica)
+                return False
+        return True
+
+    def pick(self):
+        """
+        Select a replica for the next read session
+
+        Returns:
+            Replica, or None when no replica is healthy (caller uses the primary)
+        """
+        now = time.monotonic()
+        healthy = [r for r in self.replicas if self._is_healthy(r, now)]
+        if not healthy:
+            return None
+        if self.selection == "least_connections":
+            return min(healthy, key=lambda r: r.connections())
+        return healthy[next(self._counter) % len(healthy)]
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS, REPLICA_SELECTION)
+
+# Client key (Authorization header) -> monotonic time of its last write
+_recent_writes = {}
+_RECENT_WRITES_LIMIT = 10000
+
+def _client_key(request: Request):
+    return request.headers.get("authorization") if request else None
+
+def _record_write(key: str):
+    now = time.monotonic()
+    if len(_recent_writes) >= _RECENT_WRITES_LIMIT:
+        for stale in [k for k, t in _recent_writes.items() if now - t > READ_YOUR_WRITES_SECONDS]:
+            _recent_writes.pop(stale, None)
+    _recent_writes[key] = now
+
+def _wrote_recently(key: str) -> bool:
+    written_at = _recent_writes.get(key) if key else None
+    return written_at is not None and time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS
+
+def get_db(request: Request = None):
+    """Primary session for routes that write (or must read their own writes)"""
     db = SessionLocal()
     try:
         yield db
     finally:
+        key = _client_key(request)
+        if key and db.info.get("wrote"):
+            _record_write(key)
         db.close()
+
+def _open_read_session(replica):
+    if replica is None:
+        return ReadSessionLocal(bind=engine), None
+    db = ReadSessionLocal(bind=replica.engine)
+    try:
+        db.connection()
+        return db, replica
+    except DBAPIError:
+        db.close()
+        replica_router.mark_down(replica)
+        return ReadSessionLocal(bind=engine), None
+
+def get_read_db(request: Request = None):
+    """
+    Read-only session for routes that declare read intent
+
+    Routed to a healthy replica, falling back to the primary when no replica is
+    available or the caller wrote within READ_YOUR_WRITES_SECONDS.
+    """
+    replica = None
+    if replica_router.replicas and not _wrote_recently(_client_key(request)):
+        replica = replica_router.pick()
+
+    db, replica = _open_read_session(replica)
+    try:
+        yield db
+    except DBAPIError:
+        if replica is not None:
+            replica_router.mark_down(replica)
+        raise
+    finally:
+        db.close()
+
+@contextmanager
+def read_session(request: Request = None):
+    """get_read_db as a context manager, for work that outlives the route (streaming responses)"""
+    yield from get_read_db(request)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,18 +9,44 @@ from app import models
 from app.schemas import UserCreate, UserResponse, InspectionCreate, InspectionResponse, ReportCreate, ReportResponse
 from app.auth import hash_password, verify_password, pwd_context
 from app.models import User, Inspection, Report
+from app.services.trend_service import TrendService
+from app.services.storage_client import close_storage_client
+from app.services.inspection_service import invalidate_inspections
+from app.services.dashboard_service import invalidate_dashboards
+from app.services.history_service import close_history_writer, make_event, record_transitions
 from pydantic import BaseModel
 
 # Import new routers
 from app.routers import auth as auth_router
 from app.routers import inspections as inspections_router
 from app.routers import reports as reports_router
+from app.routers import uploads as uploads_router
+from app.routers import frames as frames_router
+from app.routers import analytics as analytics_router
+from app.routers import search as search_router
+from app.routers import profiles as profiles_router
+from app.routers import sync as sync_router
+from app.routers import analysis as analysis_router
+from app.routers import dashboard as dashboard_router
+from app.middleware.query_budget import QueryBudgetMiddleware, QUERY_BUDGET_MODE
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.middleware.compression import CompressionMiddleware, COMPRESSION_ENCODINGS
+from app.middleware.profiling import ProfilingMiddleware, PROFILING_MODE
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The storage client's connection pool lives as long as the app
+    await close_storage_client()
+    # Write out status history still buffered
+    close_history_writer()
 
 # 1️⃣ Create FastAPI app
 app = FastAPI(
     title="Vyooma Drone Inspection API",
     description="Production-ready backend for drone inspection management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Allow CORS for Frontend
@@ -35,6 +62,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Retried creates/uploads with the same Idempotency-Key get the first response back
+app.add_middleware(IdempotencyMiddleware)
+
+# gzip/br/zstd per Accept-Encoding; outside idempotency so replays are negotiated per request
+if COMPRESSION_ENCODINGS:
+    app.add_middleware(CompressionMiddleware)
+
+# Opt-in: profile sampled requests and admin requests sent with X-Profile
+if PROFILING_MODE == "on":
+    app.add_middleware(ProfilingMiddleware)
+
+# Dev/staging only: record SQL per request and flag routes over their @query_budget
+if QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, raise_on_violation=QUERY_BUDGET_MODE == "raise")
+
 # 2️⃣ Create tables in DB
 Base.metadata.create_all(bind=engine)
 
@@ -42,6 +84,14 @@ Base.metadata.create_all(bind=engine)
 app.include_router(auth_router.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(inspections_router.router, prefix="/api/v1/inspections", tags=["Inspections"])
 app.include_router(reports_router.router, prefix="/api/v1/reports", tags=["Reports"])
+app.include_router(uploads_router.router, prefix="/api/v1/inspections", tags=["Uploads"])
+app.include_router(frames_router.router, prefix="/api/v1/inspections", tags=["Frames"])
+app.include_router(analysis_router.router, prefix="/api/v1/inspections", tags=["Analysis"])
+app.include_router(analytics_router.router, prefix="/api/v1/analytics", tags=["Analytics"])
+app.include_router(search_router.router, prefix="/api/v1/search", tags=["Search"])
+app.include_router(profiles_router.router, prefix="/api/v1/profiles", tags=["Profiling"])
+app.include_router(sync_router.router, prefix="/api/v1/sync", tags=["Field sync"])
+app.include_router(dashboard_router.router, prefix="/api/v1/dashboard", tags=["Dashboard"])
 
 # 3️⃣ Health check route
 @app.get("/")
@@ -77,6 +127,9 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     existing_user = db.query(User).filter(User.email == user.email).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
+    # Admins are created out-of-band (python admin.py create-admin), never by self-registration
+    if user.role not in ["customer", "pilot"]:
+        raise HTTPException(status_code=400, detail="Role must be 'customer' or 'pilot'")
 
     new_user = User(
         name=user.name,
@@ -104,6 +157,7 @@ def create_inspection(inspection: InspectionCreate, customer_id: int, db: Sessio
     db.add(new_inspection)
     db.commit()
     db.refresh(new_inspection)
+    invalidate_dashboards([customer_id])
     return new_inspection
 
 @app.get("/inspections", response_model=List[InspectionResponse])
@@ -128,11 +182,17 @@ def create_report(report: ReportCreate, db: Session = Depends(get_db)):
     )
     # Update inspection status
     inspection = db.query(Inspection).filter(Inspection.id == report.inspection_id).first()
+    previous = inspection.status if inspection else None
     if inspection:
         inspection.status = "completed"
     
     db.add(new_report)
+    if inspection:
+        TrendService(db).record_report(new_report, inspection, [])
     db.commit()
+    invalidate_inspections([report.inspection_id])
+    if inspection and previous != "completed":
+        record_transitions([make_event(report.inspection_id, "completed", previous, source="report")])
     db.refresh(new_report)
     return new_report
 
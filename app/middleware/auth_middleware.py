@@ -72,3 +72,4 @@ def require_role(allowed_roles: List[str]):
 require_customer = require_role(["customer"])
 require_pilot = require_role(["pilot"])
 require_customer_or_pilot = require_role(["customer", "pilot"])
+require_admin = require_role(["admin"])
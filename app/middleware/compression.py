@@ -0,0 +1,217 @@
+"""
+Negotiated response compression
+Text responses (JSON, NDJSON, CSV, ...) of at least COMPRESSION_MIN_BYTES are
+compressed with the best encoding both sides support: zstd and brotli when
+their packages are installed, gzip always, in COMPRESSION_ENCODINGS order
+when the client weighs them equally. Streamed responses are compressed chunk
+by chunk and flushed after each one, so a client reading a stream still gets
+every chunk as soon as it is produced. Responses that set their own
+Content-Encoding (field sync batches) or are already compressed (images, PDFs,
+gzip/Parquet exports) pass through untouched.
+"""
+import os
+import zlib
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # br is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")  # Preference order, empty disables
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+def qvalues(header: Optional[str]) -> Dict[str, float]:
+    """Tokens of an Accept / Accept-Encoding header with their weights ("gzip;q=0.5" -> {"gzip": 0.5})"""
+    weights = {}
+    for part in (header or "").split(","):
+        token, *params = part.split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[token] = weight
+    return weights
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag, compared weakly (RFC 9110)
+
+    Compressed responses carry W/ ETags, so clients revalidate with those;
+    routes answering 304 must accept them as well as the strong form.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.strip().removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _Zstd:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+_CODECS = {"gzip": _Gzip, "br": _Brotli if brotli else None, "zstd": _Zstd if zstandard else None}
+
+def available_encodings(preference: str = COMPRESSION_ENCODINGS) -> list:
+    """Encodings from a preference list whose codec is installed"""
+    names = [name.strip().lower() for name in preference.split(",")]
+    return [name for name in names if _CODECS.get(name)]
+
+def negotiate(accept_encoding: Optional[str], encodings: list) -> Optional[str]:
+    """
+    Encoding to answer an Accept-Encoding header with, or None for identity
+
+    The client's weights win; ties go to the earlier encoding in the list.
+    """
+    weights = qvalues(accept_encoding)
+    best, best_weight = None, 0.0
+    for name in encodings:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+def compressible(content_type: str) -> bool:
+    """Whether a media type is worth compressing (text and structured text, not images or archives)"""
+    media_type = content_type.split(";")[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith(("json", "xml"))
+        or media_type in ("application/javascript", "image/svg+xml")
+    )
+
+def _vary(headers: list) -> list:
+    """Headers with Accept-Encoding added to Vary"""
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" in value.lower() or value.strip() == b"*":
+                return headers
+            return [*headers[:index], (name, value + b", Accept-Encoding"), *headers[index + 1:]]
+    return [*headers, (b"vary", b"Accept-Encoding")]
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text responses with the encoding the client prefers
+
+    Args:
+        app: ASGI app
+        minimum_size: Smallest complete body compressed (streamed bodies always are)
+        encodings: Comma-separated encodings in server preference order
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES, encodings: str = COMPRESSION_ENCODINGS):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings(encodings)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"), self.encodings)
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                if (
+                    message["status"] < 200 or message["status"] in (204, 304)
+                    or b"content-encoding" in headers
+                    or not compressible(headers.get(b"content-type", b"").decode("latin-1"))
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message  # Held until the first body chunk shows whether it is worth compressing
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                headers = _vary(list(start.get("headers", [])))
+                if encoding is None or (not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send({**start, "headers": headers})
+                    await send(message)
+                    return
+                compressor = _CODECS[encoding]()
+                headers = [
+                    (name, b"W/" + value if name.lower() == b"etag" and not value.startswith(b"W/") else value)
+                    for name, value in headers if name.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more:
+                    data = compressor.compress(body) + compressor.finish()
+                    headers.append((b"content-length", str(len(data)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send({**start, "headers": headers})
+
+            if more:
+                data = compressor.compress(body) + compressor.flush()
+            else:
+                data = compressor.compress(body) + compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
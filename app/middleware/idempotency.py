@@ -0,0 +1,186 @@
+"""
+Idempotency keys for create and upload endpoints
+Routes marked @idempotent accept an Idempotency-Key header. The first request
+with a key runs normally and its response is stored per (user, key); a retry
+that arrives while it is still running waits for it, and a retry after it
+finished gets the stored response back (Idempotent-Replayed: true) without
+touching the database. A key reused for a different method, path or request
+body (compared by SHA-256) is answered 422 instead of replaying.
+
+The store is in-process and bounded (IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_SECONDS),
+so with several workers a retry landing on another worker runs again; the
+unique constraints (e.g. one report per inspection) still reject the duplicate.
+5xx responses are not stored, so a retry after a server error tries again.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Optional
+
+from starlette.routing import Match
+
+from app.auth import verify_token
+from app.services.cache import TTLCache
+
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(1024 * 1024)))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+_MISSING = object()
+
+def idempotent(endpoint):
+    """
+    Let an endpoint's callers retry safely with an Idempotency-Key header
+
+    Usage:
+        @router.post("")
+        @idempotent
+        def create_inspection(...):
+            ...
+    """
+    endpoint.__idempotent__ = True
+    return endpoint
+
+def route_scope(scope) -> dict:
+    """Scope entries (route, endpoint, path params) the app's router will dispatch this request with"""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return child_scope
+    return {}
+
+def _user_id(scope) -> Optional[int]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            payload = verify_token(token) if scheme.lower() == "bearer" else None
+            return payload.get("user_id") if payload else None
+    return None
+
+async def _body_digest(receive, digest=None) -> Optional[str]:
+    """SHA-256 of the rest of a request body, read and discarded; None if the client disconnected first"""
+    digest = digest or hashlib.sha256()
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return None
+        digest.update(message.get("body", b""))
+        if not message.get("more_body"):
+            return digest.hexdigest()
+
+async def _send_json(send, status: int, body: bytes, extra_headers: list = ()):
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *extra_headers,
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware replaying stored responses for repeated Idempotency-Keys
+
+    Args:
+        app: ASGI app
+        maxsize: Completed responses kept before the least recently used is dropped
+        ttl: Seconds a completed response can be replayed
+    """
+
+    def __init__(self, app, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.app = app
+        # (user, key) -> (method, path, body sha256, status, headers, body)
+        self.responses = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._running = {}  # (user, key) -> asyncio.Event set when the first request's response is complete
+        self.replays = 0
+
+    async def __call__(self, scope, receive, send):
+        key = route = None
+        if scope["type"] == "http":
+            key = dict(scope["headers"]).get(b"idempotency-key")
+        if key is not None:
+            route = route_scope(scope)
+        if not route or not getattr(route.get("endpoint"), "__idempotent__", False):
+            await self.app(scope, receive, send)
+            return
+
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            await _send_json(send, 400, b'{"detail":"Idempotency-Key must be 1-255 characters"}')
+            return
+        user_id = _user_id(scope)
+        if user_id is None:
+            # Let the route's own authentication reject it
+            await self.app(scope, receive, send)
+            return
+
+        store_key = (user_id, key)
+        request = (scope["method"], scope["path"])
+        fingerprint = _MISSING  # This request's body digest, read only once there is a response to compare with
+        while True:
+            stored = self.responses.get(store_key, _MISSING)
+            if stored is not _MISSING:
+                if fingerprint is _MISSING:
+                    fingerprint = await _body_digest(receive)
+                if stored[:3] != (*request, fingerprint):
+                    await _send_json(send, 422, b'{"detail":"Idempotency-Key was already used for a different request"}')
+                    return
+                self.replays += 1
+                scope.update(route)  # Outer middleware still sees which route answered
+                _, _, _, status, headers, body = stored
+                await send({"type": "http.response.start", "status": status,
+                            "headers": [*headers, (b"idempotent-replayed", b"true")]})
+                await send({"type": "http.response.body", "body": body})
+                return
+            running = self._running.get(store_key)
+            if running is None:
+                break
+            try:
+                await asyncio.wait_for(running.wait(), IDEMPOTENCY_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                await _send_json(send, 409, b'{"detail":"A request with this Idempotency-Key is still in progress"}',
+                                 [(b"retry-after", b"5")])
+                return
+            # Finished: replay its response, or run again if it was not stored (5xx)
+
+        done = self._running[store_key] = asyncio.Event()
+        start = {}
+        chunks = []
+        size = 0
+        digest = hashlib.sha256()
+        body_read = False
+
+        async def receive_hashed():
+            # The body is fingerprinted as the route streams it, never buffered
+            nonlocal body_read
+            message = await receive()
+            if message["type"] == "http.request":
+                digest.update(message.get("body", b""))
+                body_read = not message.get("more_body")
+            return message
+
+        async def send_recorded(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body" and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if not message.get("more_body") and start["status"] < 500 and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                    # A route that answered without reading its whole body (an early error) has the rest read here
+                    stored_digest = digest.hexdigest() if body_read else await _body_digest(receive, digest)
+                    if stored_digest is not None:
+                        # Store before background tasks run, so retries don't wait for them
+                        self.responses.set(store_key, (
+                            *request, stored_digest, start["status"], list(start.get("headers", [])), b"".join(chunks)
+                        ))
+                    done.set()
+            await send(message)
+
+        try:
+            await self.app(scope, receive_hashed, send_recorded)
+        finally:
+            del self._running[store_key]
+            done.set()
+
+    def stats(self) -> dict:
+        return {**self.responses.stats(), "running": len(self._running), "replays": self.replays}
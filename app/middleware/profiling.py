@@ -0,0 +1,283 @@
+"""
+On-demand request profiling
+With PROFILING_MODE=on, a PROFILE_SAMPLE_RATE share of requests, plus any
+request an admin sends with an X-Profile header (or anyone sends with an
+X-Profile token an admin issued), is profiled: a sampling
+profiler records the request's call stacks every PROFILE_INTERVAL_MS (on the
+event loop and in the threadpool), the SQL it issued is kept, and routes marked
+@trace_allocations (or requests sent with "X-Profile: memory") also get a
+tracemalloc snapshot diff. Finished profiles go to a ring buffer of the last
+PROFILE_BUFFER_SIZE requests, downloadable as folded stacks for flamegraph
+tools. With PROFILING_MODE=off (default) the middleware is not installed.
+"""
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from app.auth import create_access_token, verify_token
+from app.middleware.idempotency import route_scope
+from app.middleware.query_budget import current_query_log, record_queries
+
+PROFILING_MODE = os.getenv("PROFILING_MODE", "off")  # off or on
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Share of all requests, 0-1
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_TOKEN_MINUTES = int(os.getenv("PROFILE_TOKEN_MINUTES", "15"))
+PROFILE_TOP_ALLOCATIONS = 25
+
+_current_profile = contextvars.ContextVar("profile", default=None)
+_ids = itertools.count(1)
+
+def trace_allocations(endpoint):
+    """
+    Take tracemalloc snapshots around this endpoint whenever a request to it is profiled
+
+    Usage:
+        @router.post("/{inspection_id}/upload")
+        @trace_allocations
+        async def upload_inspection_images(...):
+            ...
+    """
+    endpoint.__trace_allocations__ = True
+    return endpoint
+
+class Profile:
+    """Stacks, SQL and allocations recorded for one request"""
+
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = next(_ids)
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self.status = None
+        self.duration_ms = None
+        self.stacks = Counter()  # "outer;...;inner" -> samples
+        self.sql = []
+        self.allocations = None
+
+    def add_stack(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        """Collapsed stacks, one "frame;frame;frame count" line each (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id, "method": self.method, "path": self.path, "trigger": self.trigger,
+            "started_at": self.started_at, "status": self.status, "duration_ms": self.duration_ms,
+            "samples": sum(self.stacks.values()), "statements": len(self.sql),
+            "allocations": self.allocations is not None,
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "sql": self.sql, "allocations": self.allocations, "stacks": dict(self.stacks.most_common())}
+
+def _frame_profile(frame) -> Optional[Profile]:
+    """Profile of the request a thread is running, found through the context its task or job runs in"""
+    while frame is not None:
+        if frame.f_code.co_name in ("run", "_run"):  # anyio WorkerThread.run, asyncio Handle._run
+            local = frame.f_locals
+            for context in (local.get("context"), getattr(local.get("self"), "_context", None)):
+                if isinstance(context, contextvars.Context):
+                    profile = context.get(_current_profile)
+                    if profile is not None:
+                        return profile
+        frame = frame.f_back
+    return None
+
+class _Sampler:
+    """One thread sampling every thread's stack while any profile is active"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self.active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self.active.discard(profile)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                profile = _frame_profile(frame)
+                if profile in self.active:
+                    profile.add_stack(frame)
+            del frame
+            time.sleep(self.interval)
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+_profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+
+def list_profiles() -> List[dict]:
+    """Summaries of the buffered profiles, newest first"""
+    with _profiles_lock:
+        return [profile.summary() for profile in reversed(_profiles)]
+
+def get_profile(profile_id: int) -> Optional[Profile]:
+    with _profiles_lock:
+        return next((profile for profile in _profiles if profile.id == profile_id), None)
+
+class _AllocationTracer:
+    """Snapshots around one request; tracemalloc runs for as long as any profiled request needs it"""
+
+    _users = 0
+    _started = False  # Whether tracemalloc was started here (and so is ours to stop)
+    _lock = threading.Lock()
+
+    def __enter__(self):
+        cls = type(self)
+        with cls._lock:
+            if cls._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                cls._started = True
+            cls._users += 1
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+        return self
+
+    def result(self) -> dict:
+        """Largest growth by line since __enter__ (process-wide, so concurrent requests show up too)"""
+        current, peak = tracemalloc.get_traced_memory()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        top = after.compare_to(self.before.filter_traces(ignore), "lineno")[:PROFILE_TOP_ALLOCATIONS]
+        return {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in top
+            ],
+        }
+
+    def __exit__(self, *exc):
+        cls = type(self)
+        with cls._lock:
+            cls._users -= 1
+            if cls._users == 0 and cls._started:
+                tracemalloc.stop()
+                cls._started = False
+
+def create_profile_token(memory: bool = False) -> str:
+    """
+    Token an admin hands to a client: requests sent with it in X-Profile are profiled
+
+    It carries no user, so it is not accepted as an access token.
+    """
+    return create_access_token(
+        {"scope": "profile", "memory": memory}, expires_delta=timedelta(minutes=PROFILE_TOKEN_MINUTES)
+    )
+
+def _is_admin(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            payload = verify_token(token) if scheme.lower() == "bearer" else None
+            return bool(payload) and payload.get("role") == "admin"
+    return False
+
+def _requested(scope, header: Optional[bytes]) -> Optional[dict]:
+    """What an X-Profile header asks for ({"memory": bool}), or None if it isn't authorised"""
+    if header is None:
+        return None
+    if header in (b"1", b"memory") and _is_admin(scope):
+        return {"memory": header == b"memory"}
+    payload = verify_token(header.decode("latin-1"))
+    if payload and payload.get("scope") == "profile":
+        return {"memory": bool(payload.get("memory"))}
+    return None
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling sampled requests and requests marked with X-Profile
+
+    The profiled response carries X-Profile-Id, the id to download it by.
+
+    Args:
+        app: ASGI app
+        sample_rate: Share of all requests profiled (0 for header-triggered only)
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = _requested(scope, dict(scope["headers"]).get(b"x-profile"))
+        if requested is not None:
+            trigger = "header"
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = "sample"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], trigger)
+        trace = (requested or {}).get("memory") or getattr(route_scope(scope).get("endpoint"), "__trace_allocations__", False)
+        log = current_query_log()
+        offset = len(log.statements) if log is not None else 0
+
+        async def send_tagged(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", str(profile.id).encode())]}
+            await send(message)
+
+        token = _current_profile.set(profile)
+        _sampler.add(profile)
+        start = time.perf_counter()
+        try:
+            with (_AllocationTracer() if trace else nullcontext()) as tracer, \
+                    (nullcontext(log) if log is not None else record_queries()) as log:
+                try:
+                    await self.app(scope, receive, send_tagged)
+                finally:
+                    if tracer is not None:
+                        profile.allocations = tracer.result()
+        finally:
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            _sampler.remove(profile)
+            _current_profile.reset(token)
+            profile.sql = [
+                {"sql": " ".join(sql.split()), "ms": seconds * 1000, "rows": rows}
+                for sql, _, seconds, rows in (log.statements[offset:] if log is not None else [])
+            ]
+            with _profiles_lock:
+                _profiles.append(profile)
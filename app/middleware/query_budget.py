@@ -0,0 +1,222 @@
+"""
+SQL query budgets per endpoint
+Routes declare how many statements (and optionally rows) they may use with
+@query_budget. The QueryBudgetMiddleware records every statement issued while a
+request runs and reports routes that exceed their budget, listing the statements.
+"""
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# off (no middleware, zero overhead), warn (log offenders) or raise (500 on offenders)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+
+_current_log = contextvars.ContextVar("query_log", default=None)
+
+class QueryBudget:
+    """Declared maximum statements (and rows fetched, if given) for one endpoint"""
+
+    def __init__(self, statements: int, rows: Optional[int] = None):
+        self.statements = statements
+        self.rows = rows
+
+    def __repr__(self):
+        return f"QueryBudget(statements={self.statements}, rows={self.rows})"
+
+class QueryLog:
+    """Statements recorded while a request (or block) runs"""
+
+    def __init__(self):
+        self.statements = []  # [sql, parameters, seconds, rows fetched]
+        self.rows = 0
+        self.closed = False  # Set once the response is sent: background tasks are not the request's
+
+    def violations(self, budget: QueryBudget) -> list:
+        problems = []
+        if len(self.statements) > budget.statements:
+            problems.append(f"{len(self.statements)} statements > budget {budget.statements}")
+        if budget.rows is not None and self.rows > budget.rows:
+            problems.append(f"{self.rows} rows fetched > budget {budget.rows}")
+        return problems
+
+    def format(self) -> str:
+        return "\n".join(
+            f"  [{i}] {rows} rows, {seconds * 1000:.1f} ms: {' '.join(sql.split())}"
+            for i, (sql, _, seconds, rows) in enumerate(self.statements, 1)
+        )
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a recorded QueryLog is over its declared budget"""
+
+def query_budget(statements: int, rows: Optional[int] = None):
+    """
+    Declare an endpoint's SQL budget
+
+    Usage:
+        @router.get("/{inspection_id}")
+        @query_budget(statements=1, rows=1)
+        def get_inspection(...):
+            ...
+
+    Args:
+        statements: Maximum SQL statements per request
+        rows: Maximum rows fetched per request (None for lists that scale with data)
+    """
+    def decorator(endpoint):
+        endpoint.__query_budget__ = QueryBudget(statements, rows)
+        return endpoint
+    return decorator
+
+def get_budget(endpoint) -> Optional[QueryBudget]:
+    return getattr(endpoint, "__query_budget__", None)
+
+def assert_within_budget(label: str, budget: QueryBudget, log: QueryLog):
+    """
+    Raises:
+        QueryBudgetExceeded: With every statement issued, if the budget is exceeded
+    """
+    problems = log.violations(budget)
+    if problems:
+        raise QueryBudgetExceeded(f"{label}: {'; '.join(problems)}\n{log.format()}")
+
+class _CountingCursor:
+    """DBAPI cursor proxy that counts rows as the result fetches them"""
+
+    def __init__(self, cursor, entry: list, log: QueryLog):
+        self._cursor = cursor
+        self._entry = entry
+        self._log = log
+
+    def _count(self, rows):
+        self._entry[3] += len(rows)
+        self._log.rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._count(self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count([row])
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+_installed = False
+
+def install():
+    """Attach statement recording to every Engine (primary and replicas); idempotent"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        log = _current_log.get()
+        if log is not None and not log.closed:
+            conn.info.setdefault("query_budget_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        log = _current_log.get()
+        started = conn.info.get("query_budget_started")
+        if log is None or not started:
+            return
+        started = started.pop()
+        if log.closed:
+            return
+        entry = [statement, parameters, time.perf_counter() - started, 0]
+        log.statements.append(entry)
+        if context is not None and cursor.description is not None:
+            # The CursorResult reads rows through context.cursor after this hook
+            context.cursor = _CountingCursor(cursor, entry, log)
+
+@contextmanager
+def record_queries():
+    """Record every statement issued in this context (and threads it spawns via copy_context)"""
+    install()
+    log = QueryLog()
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+def current_query_log() -> Optional[QueryLog]:
+    """The log recording this context's statements, if any"""
+    return _current_log.get()
+
+def _report(request_label: str, budget: Optional[QueryBudget], log: QueryLog):
+    if budget is None:
+        logger.warning("%s has no declared query budget (%d statements)", request_label, len(log.statements))
+        return
+    problems = log.violations(budget)
+    if problems:
+        logger.warning("%s over query budget: %s\n%s", request_label, "; ".join(problems), log.format())
+
+class QueryBudgetMiddleware:
+    """
+    ASGI middleware recording each request's SQL and checking the matched route's budget
+
+    Args:
+        app: ASGI app
+        on_request: Callback (label, budget, log); defaults to logging offenders
+        raise_on_violation: Replace over-budget responses with a 500 (QUERY_BUDGET_MODE=raise)
+    """
+
+    def __init__(self, app, on_request: Callable = None, raise_on_violation: bool = False):
+        self.app = app
+        self.on_request = on_request or _report
+        self.raise_on_violation = raise_on_violation
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pending = []
+
+        async def send_checked(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                log.closed = True
+            # Hold the response start until the body finished, so a violation can still become a 500
+            if self.raise_on_violation and message["type"] == "http.response.start":
+                pending.append(message)
+                return
+            if pending and message["type"] == "http.response.body" and not message.get("more_body"):
+                budget = get_budget(scope.get("endpoint"))
+                if budget is not None and log.violations(budget):
+                    error = f"Query budget exceeded: {'; '.join(log.violations(budget))}\n{log.format()}".encode()
+                    await send({"type": "http.response.start", "status": 500,
+                                "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(error)).encode())]})
+                    await send({"type": "http.response.body", "body": error})
+                    return
+            if pending:
+                await send(pending.pop())
+            await send(message)
+
+        with record_queries() as log:
+            await self.app(scope, receive, send_checked)
+
+        route = scope.get("route")
+        label = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        self.on_request(label, get_budget(scope.get("endpoint")), log)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, BigInteger, Float, String, Date, DateTime, ForeignKey, Index, UniqueConstraint, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -10,20 +10,26 @@ class User(Base):
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, index=True, nullable=False)
     password = Column(String(255), nullable=False)
-    role = Column(String(20), nullable=False)  # customer / pilot
+    role = Column(String(20), nullable=False)  # customer / pilot / admin
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Pilot home base, used by the batch dispatcher
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
 class Inspection(Base):
     __tablename__ = "inspections"
 
     id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    pilot_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
-    status = Column(String(50), default="pending")  # pending, scheduled, completed, cancelled
+    customer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    pilot_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    status = Column(String(50), default="pending", index=True)  # pending, scheduled, completed, cancelled
     location = Column(String(200), nullable=False)
     scheduled_date = Column(DateTime(timezone=True), nullable=True)
     package = Column(String(50), default="Basic") # Basic, Advanced, Premium, Elite
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    latitude = Column(Float, nullable=True)  # Site coordinates, used by the batch dispatcher
+    longitude = Column(Float, nullable=True)
     
     # New fields for async workflow
     assigned_at = Column(DateTime(timezone=True), nullable=True)
@@ -33,6 +39,10 @@ class Inspection(Base):
     raw_images_path = Column(String(500), nullable=True)  # Supabase Storage path
     processed_images_path = Column(String(500), nullable=True)
     
+    # Change tracking for field sync: bumped by every UPDATE (ORM or Core)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    
     # Relationships
     customer = relationship("User", foreign_keys=[customer_id])
     pilot = relationship("User", foreign_keys=[pilot_id])
@@ -47,7 +57,300 @@ class Report(Base):
     defect_classification = Column(String(100), nullable=True) # e.g. "Crack", "Hotspot"
     image_url = Column(String(500), nullable=True) # URL to defect image
     confidence = Column(Integer, nullable=True) # Confidence % (0-100)
+    # Written by the analysis merge, whose later merges may recompute the summary fields; a pilot's are left alone
+    automated = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))  # Keys PDF renders
     
     # Relationship
     inspection = relationship("Inspection")
+
+# Defect classes produced by the RGB classifier ("Clean" frames yield no finding)
+DEFECT_CLASSES = ["Bird_dropping", "Dust", "Electrical", "Physical"]
+
+class Finding(Base):
+    __tablename__ = "findings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False, index=True)
+    inspection_id = Column(Integer, ForeignKey("inspections.id", ondelete="CASCADE"), nullable=False, index=True)
+    defect_class = Column(String(50), nullable=False)  # One of DEFECT_CLASSES
+    confidence = Column(Integer, nullable=True)  # Confidence % (0-100)
+    frame_path = Column(String(500), nullable=True)  # Storage path of the source frame
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True)  # UUID handed to the client
+    inspection_id = Column(Integer, ForeignKey("inspections.id", ondelete="CASCADE"), nullable=False, index=True)
+    pilot_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)  # Declared total size in bytes
+    offset = Column(BigInteger, default=0)  # Bytes received contiguously from the start
+    status = Column(String(20), default="open")  # open, finalized
+    storage_path = Column(String(500), nullable=True)  # Set once finalized
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+    __table_args__ = (
+        UniqueConstraint("session_id", "offset", name="uq_upload_chunks_offset"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(36), ForeignKey("upload_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    claimed_at = Column(DateTime, nullable=True)  # Set while its bytes are being written; the chunk counts once cleared
+
+class DefectRollup(Base):
+    """Monthly defect counts per customer, site and class (maintained by TrendService)"""
+    __tablename__ = "defect_rollups"
+    __table_args__ = (
+        UniqueConstraint("customer_id", "month", "location", "defect_class", name="uq_defect_rollup_key"),
+        Index("ix_defect_rollups_customer_month", "customer_id", "month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    customer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    month = Column(Date, nullable=False)  # First day of the month
+    location = Column(String(200), nullable=False)  # Inspection.location (site)
+    defect_class = Column(String(100), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+class Frame(Base):
+    """One captured frame: an uploaded still (pose from EXIF/XMP headers) or a video keyframe"""
+    __tablename__ = "frames"
+    __table_args__ = (
+        # Spatial key lookups are always scoped to one inspection
+        Index("ix_frames_inspection_geokey", "inspection_id", "geokey"),
+        # Unplanned frames (shard_id NULL) and a shard's frames
+        Index("ix_frames_inspection_shard", "inspection_id", "shard_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    inspection_id = Column(Integer, ForeignKey("inspections.id", ondelete="CASCADE"), nullable=False)
+    storage_path = Column(String(500), nullable=False)
+    original_name = Column(String(255), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geokey = Column(BigInteger, nullable=True)  # Z-order (Morton) code of latitude/longitude
+    altitude = Column(Float, nullable=True)  # GPS altitude (m above sea level)
+    relative_altitude = Column(Float, nullable=True)  # m above take-off point
+    gimbal_pitch = Column(Float, nullable=True)
+    gimbal_yaw = Column(Float, nullable=True)
+    captured_at = Column(DateTime, nullable=True)
+    video_path = Column(String(500), nullable=True)  # Source video, for keyframes extracted from one
+    video_offset = Column(Float, nullable=True)  # Seconds into the source video
+    # Analysis shard the frame was planned into; NULL until AnalysisService.plan picks it up
+    shard_id = Column(Integer, ForeignKey("analysis_shards.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class InspectionEvent(Base):
+    __tablename__ = "inspection_events"
+    __table_args__ = (
+        Index("ix_inspection_events_inspection_time", "inspection_id", "occurred_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String(36), unique=True, nullable=False)  # Client-generated UUID; makes redelivery idempotent
+    inspection_id = Column(Integer, ForeignKey("inspections.id", ondelete="CASCADE"), nullable=False)
+    field = Column(String(50), nullable=False)  # status or analysis_status
+    from_value = Column(String(50), nullable=True)
+    to_value = Column(String(50), nullable=False)
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    source = Column(String(50), nullable=False)  # assign, status, upload, report, dispatch
+    occurred_at = Column(DateTime, nullable=False)  # When the transition committed (UTC)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SlaSummary(Base):
+    """Turnaround percentiles per stage, month, package and region (rebuilt by SlaService)"""
+    __tablename__ = "sla_summaries"
+    __table_args__ = (
+        UniqueConstraint("stage", "period", "package", "region", name="uq_sla_summary_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    stage = Column(String(30), nullable=False)  # created_assigned, assigned_started, started_completed
+    period = Column(String(7), nullable=False)  # YYYY-MM the stage ended in, or "all"
+    package = Column(String(50), nullable=False)  # Tier, or "all"
+    region = Column(String(32), nullable=False)  # "lat,lon" grid cell (SW corner), "unknown" or "all"
+    count = Column(Integer, nullable=False)
+    mean_seconds = Column(Float, nullable=True)
+    p50_seconds = Column(Float, nullable=True)
+    p90_seconds = Column(Float, nullable=True)
+    p99_seconds = Column(Float, nullable=True)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class ReportRender(Base):
+    """A PDF of one version of a report (rendered in the background by ReportPdfService)"""
+    __tablename__ = "report_renders"
+    __table_args__ = (
+        UniqueConstraint("report_id", "version_key", name="uq_report_renders_version"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, nullable=False)  # No foreign key: renders outlive the hot row when the report is archived
+    version_key = Column(String(64), nullable=False)  # Report version, inspection version and layout revision
+    status = Column(String(20), nullable=False)  # rendering, ready, failed
+    storage_path = Column(String(500), nullable=True)  # reports/pdf/<sha256 of the file>.pdf once ready
+    size = Column(Integer, nullable=True)
+    error = Column(String(500), nullable=True)
+    attempts = Column(Integer, nullable=False, default=1)  # Renders started for this version, failed ones included
+    started_at = Column(DateTime, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+class AnalysisShard(Base):
+    """
+    A contiguous run of an inspection's frames, classified by whichever analysis
+    worker claims it (AnalysisService); findings are merged once every shard is done
+    """
+    __tablename__ = "analysis_shards"
+    __table_args__ = (
+        UniqueConstraint("inspection_id", "seq", name="uq_analysis_shards_seq"),
+        Index("ix_analysis_shards_claim", "status", "lease_expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    inspection_id = Column(Integer, ForeignKey("inspections.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # Shard number within the inspection, in frame order
+    # Id range of the frames it was planned from; membership itself is Frame.shard_id
+    first_frame_id = Column(Integer, nullable=False)
+    last_frame_id = Column(Integer, nullable=False)  # Inclusive
+    frames = Column(Integer, nullable=False)
+    processed = Column(Integer, nullable=False, default=0)  # Frames classified by the current attempt
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    worker = Column(String(100), nullable=True)  # Node holding (or last holding) the lease
+    lease_expires_at = Column(DateTime, nullable=True)  # A running shard past its lease is claimable again
+    error = Column(String(500), nullable=True)
+    result = Column(String, nullable=True)  # JSON list of findings once done
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+class VideoJob(Base):
+    """
+    A stored flight video awaiting keyframe extraction, claimed by whichever
+    analysis worker gets to it first (VIDEO_INGEST_MODE=worker)
+    """
+    __tablename__ = "video_jobs"
+    __table_args__ = (
+        Index("ix_video_jobs_claim", "status", "lease_expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    inspection_id = Column(Integer, ForeignKey("inspections.id", ondelete="CASCADE"), nullable=False, index=True)
+    storage_path = Column(String(500), nullable=False)  # The stored original video
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    worker = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)  # A running job past its lease is claimable again
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime, nullable=True)
+
+class ArchivePartition(Base):
+    """
+    One year of cold data: inspections settled that year, moved out of the hot
+    tables with their reports, findings, events and frames (by ArchiveService)
+    """
+    __tablename__ = "archive_partitions"
+
+    year = Column(Integer, primary_key=True)
+    inspections = Column(Integer, nullable=False, default=0)
+    newest_settled_at = Column(DateTime, nullable=False)  # Latest completion/cancellation/scheduled date moved here
+    archived_at = Column(DateTime, nullable=False)
+
+class SyncRecord(Base):
+    """
+    Field store only: what the central database held for a row at the last sync
+
+    kind is inspection (base_values/base_version are the central row, for
+    three-way merges), report (remote_id is the central report) or object
+    (a stored file already pushed).
+    """
+    __tablename__ = "sync_records"
+    __table_args__ = (
+        UniqueConstraint("kind", "local_id", name="uq_sync_records_kind_local"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)
+    local_id = Column(String(500), nullable=False)  # Row id, or storage path for objects
+    remote_id = Column(Integer, nullable=True)
+    base_version = Column(Integer, nullable=True)  # Central Inspection.version last seen
+    base_values = Column(String, nullable=True)  # JSON of the synced columns at that version
+    synced_version = Column(Integer, nullable=True)  # Local Inspection.version when last in sync
+    synced_at = Column(DateTime, nullable=False)
+
+class SyncCursor(Base):
+    """Field store only: named positions of the sync engine (last pull, last event pushed)"""
+    __tablename__ = "sync_cursors"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(String(100), nullable=True)
+
+# Full-text search indexes (dialect-specific, created along with the tables)
+# Postgres: expression GIN indexes on the tsvector of each searchable field, plus
+# a trigram index on location for substring typeahead.
+# SQLite: one FTS5 table per inspection (location, report text, scope tokens for
+# role/status filtering), kept in sync by triggers.
+_SQLITE_SEARCH_ROW = """
+    INSERT INTO search_fts(rowid, location, report, scope)
+    SELECT i.id, i.location,
+           coalesce(r.title, '') || ' ' || coalesce(r.summary, '') || ' ' || coalesce(r.defect_classification, ''),
+           'c' || i.customer_id || ' p' || coalesce(i.pilot_id, 0) || ' s' || coalesce(i.status, '')
+    FROM inspections i LEFT JOIN reports r ON r.inspection_id = i.id
+"""
+SEARCH_DDL = {
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_inspections_location_tsv ON inspections "
+        "USING gin (to_tsvector('simple', coalesce(location, '')))",
+        "CREATE INDEX IF NOT EXISTS ix_reports_text_tsv ON reports USING gin (to_tsvector('simple', "
+        "coalesce(title, '') || ' ' || coalesce(summary, '') || ' ' || coalesce(defect_classification, '')))",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE search_fts USING fts5("
+        "location, report, scope, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')",
+        _SQLITE_SEARCH_ROW,
+        f"""CREATE TRIGGER search_inspections_ai AFTER INSERT ON inspections BEGIN
+            {_SQLITE_SEARCH_ROW} WHERE i.id = NEW.id; END""",
+        f"""CREATE TRIGGER search_inspections_au AFTER UPDATE OF location, customer_id, pilot_id, status ON inspections BEGIN
+            DELETE FROM search_fts WHERE rowid = OLD.id;
+            {_SQLITE_SEARCH_ROW} WHERE i.id = NEW.id; END""",
+        """CREATE TRIGGER search_inspections_ad AFTER DELETE ON inspections BEGIN
+            DELETE FROM search_fts WHERE rowid = OLD.id; END""",
+        f"""CREATE TRIGGER search_reports_ai AFTER INSERT ON reports BEGIN
+            DELETE FROM search_fts WHERE rowid = NEW.inspection_id;
+            {_SQLITE_SEARCH_ROW} WHERE i.id = NEW.inspection_id; END""",
+        f"""CREATE TRIGGER search_reports_au AFTER UPDATE ON reports BEGIN
+            DELETE FROM search_fts WHERE rowid IN (OLD.inspection_id, NEW.inspection_id);
+            {_SQLITE_SEARCH_ROW} WHERE i.id IN (OLD.inspection_id, NEW.inspection_id); END""",
+        f"""CREATE TRIGGER search_reports_ad AFTER DELETE ON reports BEGIN
+            DELETE FROM search_fts WHERE rowid = OLD.inspection_id;
+            {_SQLITE_SEARCH_ROW} WHERE i.id = OLD.inspection_id; END""",
+    ],
+}
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_indexes(target, connection, **kw):
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        try:
+            with connection.begin_nested():
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_inspections_location_trgm ON inspections USING gin (location gin_trgm_ops)"
+                ))
+        except Exception:  # No privilege to add extensions; typeahead then scans the caller's sites
+            pass
+    elif dialect == "sqlite":
+        if connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'search_fts'")).first():
+            return
+    for statement in SEARCH_DDL.get(dialect, []):
+        connection.execute(text(statement))
@@ -0,0 +1,42 @@
+"""
+Analysis router - Progress of an inspection's sharded defect analysis
+Shards are created as frames are uploaded and processed by analysis workers
+(admin.py analysis-worker) on any number of machines.
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import get_db, get_read_db
+from app.schemas import AnalysisProgressResponse
+from app.services.inspection_service import InspectionService
+from app.services.analysis_service import AnalysisService
+from app.middleware.auth_middleware import get_current_user, require_admin
+from app.middleware.query_budget import query_budget
+
+router = APIRouter()
+
+@router.get("/{inspection_id}/analysis", response_model=AnalysisProgressResponse)
+@query_budget(statements=2)
+def get_analysis_progress(
+    inspection_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Analysis progress: frames classified so far and each shard's state
+    """
+    inspection = InspectionService(db).get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+    return AnalysisService(db).progress(inspection)
+
+@router.post("/{inspection_id}/analysis/retry", response_model=AnalysisProgressResponse)
+@query_budget(statements=5)
+def retry_analysis(
+    inspection_id: int,
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Requeue an inspection's failed shards with fresh attempts (Admin only)
+    """
+    service = AnalysisService(db)
+    service.retry(inspection_id)
+    return service.progress(InspectionService(db).get_inspection(inspection_id, fresh=True))
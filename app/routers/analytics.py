@@ -0,0 +1,57 @@
+"""
+Analytics router - Operational metrics for admins
+SLA percentiles are served from the sla_summaries table, which is rebuilt in
+the background once it is older than SLA_REFRESH_SECONDS.
+"""
+import re
+from datetime import datetime
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.database import get_db, get_read_db
+from app.services.sla_service import SlaService, SLA_GROUPINGS, SLA_REFRESH_SECONDS, refresh_sla_job
+from app.middleware.auth_middleware import require_admin
+from app.middleware.query_budget import query_budget
+
+router = APIRouter()
+
+@router.get("/sla")
+@query_budget(statements=2)
+def get_sla_percentiles(
+    background_tasks: BackgroundTasks,
+    period: str = Query("all", description="all, a month (YYYY-MM) or monthly (every month)"),
+    group_by: str = Query("none", description="none, package, region or package_region"),
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    """
+    p50/p90/p99 seconds for created→assigned, assigned→started and started→completed (admins only)
+
+    Regions are SLA_REGION_GRID_DEGREES grid cells named by their south-west
+    corner. A stale summary is still returned while a refresh runs in the background.
+    """
+    if group_by not in SLA_GROUPINGS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"group_by must be one of: {', '.join(SLA_GROUPINGS)}")
+    if period not in ("all", "monthly") and not re.fullmatch(r"\d{4}-\d{2}", period):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="period must be all, monthly or YYYY-MM")
+
+    service = SlaService(db)
+    summary = service.get_summary(period, group_by)
+    refreshed_at = summary["refreshed_at"] or service.last_refreshed()
+    stale = refreshed_at is None or (datetime.utcnow() - refreshed_at).total_seconds() > SLA_REFRESH_SECONDS
+    if stale:
+        background_tasks.add_task(refresh_sla_job)
+    summary["refreshed_at"] = refreshed_at
+    summary["refreshing"] = stale
+    return summary
+
+@router.post("/sla/refresh")
+@query_budget(statements=3)
+def refresh_sla_percentiles(
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Rebuild the SLA summary now (admins only)
+    """
+    return {"rows": SlaService(db).refresh()}
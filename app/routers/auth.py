@@ -9,6 +9,7 @@ from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserResponse
 from app.auth import hash_password, verify_password, create_access_token
+from app.middleware.query_budget import query_budget
 
 router = APIRouter()
 
@@ -22,6 +23,7 @@ class LoginResponse(BaseModel):
     user: dict
 
 @router.post("/login", response_model=LoginResponse)
+@query_budget(statements=1, rows=1)
 def auth_login(request: LoginRequest, db: Session = Depends(get_db)):
     """
     Authenticate user and return JWT token
@@ -58,6 +60,7 @@ def auth_login(request: LoginRequest, db: Session = Depends(get_db)):
     }
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+@query_budget(statements=3, rows=2)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """
     Register a new user
@@ -84,7 +87,9 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         name=user.name,
         email=user.email,
         password=hash_password(user.password),
-        role=user.role
+        role=user.role,
+        latitude=user.latitude,
+        longitude=user.longitude
     )
     
     db.add(new_user)
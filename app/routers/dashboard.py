@@ -0,0 +1,29 @@
+"""
+Dashboard router - Everything a customer's or pilot's home screen shows, in one request
+Replaces the separate analytics, inspection-list and report-list calls the
+home screens make on load.
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import get_read_db
+from app.schemas import DashboardResponse
+from app.services.dashboard_service import DashboardService
+from app.middleware.auth_middleware import require_customer_or_pilot
+from app.middleware.query_budget import query_budget
+
+router = APIRouter()
+
+@router.get("/me", response_model=DashboardResponse)
+@query_budget(statements=3)
+def get_my_dashboard(
+    current_user: dict = Depends(require_customer_or_pilot),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Home-screen payload for the current user, shaped by role
+    
+    Customers get analytics, status counts, upcoming inspections and recent reports;
+    pilots get their counts and assignments plus the pending pool.
+    Cached per user for a few seconds and dropped when their inspections change.
+    """
+    return DashboardService(db).get_dashboard(current_user["user_id"], current_user["role"])
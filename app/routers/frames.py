@@ -0,0 +1,62 @@
+"""
+Frame router - Where each drone frame of an inspection was captured
+Frame positions come from header-only EXIF/XMP ingest at upload time.
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_read_db
+from app.schemas import FrameResponse
+from app.services.inspection_service import InspectionService
+from app.services.frame_service import FrameService
+from app.middleware.auth_middleware import get_current_user
+from app.middleware.query_budget import query_budget
+
+router = APIRouter()
+
+@router.get("/{inspection_id}/frames", response_model=List[FrameResponse])
+@query_budget(statements=2)
+def list_frames(
+    inspection_id: int,
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Frames of an inspection in capture order, optionally limited to a bounding box
+    """
+    InspectionService(db).get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+    return FrameService(db).get_frames(inspection_id, min_lat, min_lon, max_lat, max_lon, limit)
+
+@router.get("/{inspection_id}/frames/bounds")
+@query_budget(statements=2, rows=2)
+def get_frame_bounds(
+    inspection_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Bounding box covered by an inspection's located frames
+    """
+    InspectionService(db).get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+    return FrameService(db).get_bounds(inspection_id)
+
+@router.get("/{inspection_id}/frames/nearest", response_model=List[FrameResponse])
+@query_budget(statements=6)
+def get_nearest_frames(
+    inspection_id: int,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(1, ge=1, le=50),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    The k frames captured closest to a point (e.g. a panel with a defect)
+    """
+    InspectionService(db).get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+    return FrameService(db).get_nearest(inspection_id, lat, lon, k)
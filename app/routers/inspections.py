@@ -1,16 +1,28 @@
-from fastapi import APIRouter, Depends, Query, status, File, UploadFile, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, status, File, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-from app.database import get_db
-from app.schemas import InspectionCreate, InspectionResponse
-from app.services.inspection_service import InspectionService
-from app.services.storage_service import StorageService
-from app.middleware.auth_middleware import get_current_user, require_role
+from app.database import get_db, get_read_db
+from app.schemas import InspectionCreate, InspectionResponse, InspectionEventResponse, InspectionBatchResponse
+from app.services.inspection_service import InspectionService, batch_ids
+from app.services.storage_service import get_storage_service
+from app.services.dispatch_service import DispatchService
+from app.services.frame_service import FrameService
+from app.services.history_service import HistoryService
+from app.services.video_service import VIDEO_INGEST_MODE, VideoIngestService, is_video, ingest_video_job
+from app.services.analysis_service import AnalysisService
+from app.middleware.auth_middleware import get_current_user, require_role, require_admin
+from app.middleware.query_budget import query_budget
+from app.middleware.idempotency import idempotent
+from app.middleware.profiling import trace_allocations
+from app.streaming import NDJSON_RESPONSES, ndjson_response, wants_ndjson
 
 router = APIRouter()
 
 @router.post("", response_model=InspectionResponse, status_code=status.HTTP_201_CREATED)
+@query_budget(statements=2, rows=2)
+@idempotent
 def create_inspection(
     inspection: InspectionCreate,
     current_user: dict = Depends(require_role(["customer"])),
@@ -30,30 +42,86 @@ def create_inspection(
         data=inspection
     )
 
-@router.get("", response_model=List[InspectionResponse])
+@router.post("/dispatch")
+@query_budget(statements=3)
+def dispatch_pending_inspections(
+    solver: str = Query("auto", description="greedy, exact (scipy) or auto"),
+    dry_run: bool = Query(False, description="Compute the plan without assigning"),
+    limit: Optional[int] = Query(None, description="Max pending inspections to consider"),
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Batch-assign the pending backlog to pilots with free capacity (admins only)
+    
+    Costs combine pilot-to-site distance, schedule urgency and package tier;
+    assignments are written with one conditional bulk update, so jobs claimed
+    manually in the meantime are skipped.
+    """
+    if solver not in ("auto", "greedy", "exact"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Solver must be auto, greedy or exact")
+    try:
+        return DispatchService(db).dispatch(solver=solver, dry_run=dry_run, limit=limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("", response_model=List[InspectionResponse], responses=NDJSON_RESPONSES)
+@query_budget(statements=2)
 def list_inspections(
+    request: Request,
     status: Optional[str] = Query(None, description="Filter by status (pending, scheduled, completed)"),
+    date_from: Optional[datetime] = Query(None, description="Only inspections scheduled on or after this date, archived ones included"),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     List inspections (role-filtered)
     
     - Customers see only their own inspections
     - Pilots see pending inspections and ones assigned to them
+    
+    Settled inspections move to the archive after a while; pass date_from to
+    list back that far. With Accept: application/x-ndjson the list streams as
+    one inspection per line.
     """
+    if wants_ndjson(request):
+        return ndjson_response(
+            request,
+            lambda db: InspectionService(db).iter_inspections(
+                current_user["user_id"], current_user["role"], status, date_from
+            ),
+            InspectionResponse
+        )
     service = InspectionService(db)
     return service.list_inspections(
         user_id=current_user["user_id"],
         role=current_user["role"],
-        status_filter=status
+        status_filter=status,
+        date_from=date_from
     )
 
+@router.get("/batch", response_model=InspectionBatchResponse)
+@query_budget(statements=3)
+def get_inspections_batch(
+    ids: List[int] = Query(..., description="Inspection IDs (repeat the parameter, up to BATCH_MAX_IDS)"),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get many inspections in one request
+    
+    Each ID gets its own result: the inspection, or the 403/404 the
+    single-inspection endpoint would have returned for it.
+    """
+    service = InspectionService(db)
+    return {"items": service.get_visible_inspections(batch_ids(ids), current_user["user_id"], current_user["role"])}
+
 @router.get("/{inspection_id}", response_model=InspectionResponse)
+@query_budget(statements=3)
 def get_inspection(
     inspection_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get a specific inspection by ID
@@ -63,23 +131,27 @@ def get_inspection(
     - Pilots can view assigned inspections or pending ones
     """
     service = InspectionService(db)
-    inspection = service.get_inspection(inspection_id)
-    
-    # Authorization check
-    role = current_user["role"]
-    user_id = current_user["user_id"]
-    
-    if role == "customer" and inspection.customer_id != user_id:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your inspection")
-    
-    if role == "pilot" and inspection.pilot_id != user_id and inspection.status != "pending":
-        from fastapi import HTTPException
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not assigned to you")
+    return service.get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+
+@router.get("/{inspection_id}/history", response_model=List[InspectionEventResponse])
+@query_budget(statements=5)
+def get_inspection_history(
+    inspection_id: int,
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Status transitions of an inspection, oldest first, with who made them
     
-    return inspection
+    The log is written in the background, so a change can take a moment
+    (HISTORY_FLUSH_INTERVAL_SECONDS) to appear here.
+    """
+    InspectionService(db).get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+    return HistoryService(db).get_history(inspection_id, limit)
 
 @router.patch("/{inspection_id}/assign", response_model=InspectionResponse)
+@query_budget(statements=2, rows=1)
 def assign_pilot_to_inspection(
     inspection_id: int,
     current_user: dict = Depends(require_role(["pilot"])),
@@ -98,6 +170,7 @@ def assign_pilot_to_inspection(
     )
 
 @router.patch("/{inspection_id}/status")
+@query_budget(statements=2, rows=1)
 def update_inspection_status(
     inspection_id: int,
     new_status: str = Query(..., description="New status (pending, scheduled, completed, cancelled)"),
@@ -112,7 +185,8 @@ def update_inspection_status(
     - Pilots can update status of assigned inspections
     """
     service = InspectionService(db)
-    inspection = service.get_inspection(inspection_id)
+    # Loaded once: update_status reuses this row from the session
+    inspection = service.get_inspection(inspection_id, fresh=True)
     
     # Authorization
     role = current_user["role"]
@@ -131,11 +205,15 @@ def update_inspection_status(
             from fastapi import HTTPException
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not assigned to you")
     
-    return service.update_status(inspection_id, new_status)
+    return service.update_status(inspection_id, new_status, actor_id=user_id)
 
 @router.post("/{inspection_id}/upload")
+@query_budget(statements=8, rows=2)
+@idempotent
+@trace_allocations
 async def upload_inspection_images(
     inspection_id: int,
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     current_user: dict = Depends(require_role(["pilot"])),
     db: Session = Depends(get_db)
@@ -144,19 +222,16 @@ async def upload_inspection_images(
     Upload drone images for analysis (Pilots only)
     
     1. Uploads images to Supabase Storage
-    2. Updates inspection metadata (paths and timestamps)
-    3. Sets analysis_status to 'processing'
+    2. Indexes each frame's GPS/gimbal metadata (headers only)
+    3. Updates inspection metadata (paths and timestamps)
+    4. Sets analysis_status to 'processing' and splits the frames into analysis shards
+    5. Extracts keyframes from any video files in the background (they get shards of their own)
     """
     inspection_service = InspectionService(db)
-    storage_service = StorageService()
+    storage_service = get_storage_service()
     
     # 1. Verify inspection and ownership
-    inspection = inspection_service.get_inspection(inspection_id)
-    if inspection.pilot_id != current_user["user_id"]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="You are not assigned to this inspection"
-        )
+    inspection = inspection_service.get_assigned_inspection(inspection_id, current_user["user_id"])
         
     # 2. Upload to storage
     result = await storage_service.upload_inspection_images(inspection_id, files)
@@ -164,15 +239,21 @@ async def upload_inspection_images(
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
         
-    # 3. Update inspection record
-    inspection.raw_images_path = result["folder"]
-    inspection.analysis_status = "processing"
-    inspection.started_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(inspection)
+    # 3. Index frame positions from their headers, then update inspection record
+    metadata = FrameService.read_metadata([f.file for f in files])
+    FrameService(db).index_frames(inspection_id, [{**stored, **meta} for stored, meta in zip(result["files"], metadata)])
+    inspection = inspection_service.record_upload(inspection, result["folder"])
+    AnalysisService(db).plan(inspection_id)
     
-    # TODO: Trigger background analysis job
+    # 4. Videos are reduced to keyframes by the analysis workers, or here after the response is sent
+    videos = [(f, stored) for f, stored in zip(files, result["files"]) if is_video(f.filename, f.content_type)]
+    if VIDEO_INGEST_MODE == "worker":
+        if videos:
+            VideoIngestService(db, storage_service).enqueue(inspection_id, [stored["storage_path"] for _, stored in videos])
+    else:
+        for f, stored in videos:
+            local_path = await run_in_threadpool(storage_service.stage_copy, f.file)  # May be GBs: off the event loop
+            background_tasks.add_task(ingest_video_job, inspection_id, local_path, stored["storage_path"])
     
     return {
         "message": "Images uploaded successfully",
@@ -0,0 +1,59 @@
+"""
+Profiles router - Download request profiles captured by the ProfilingMiddleware
+Profiling is enabled with PROFILING_MODE=on. Admins mark their own requests
+with "X-Profile: 1" (or "memory" for allocation snapshots too); for other
+users' requests they issue a profile token that the client sends as X-Profile.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from app.middleware.auth_middleware import require_admin
+from app.middleware.profiling import (
+    PROFILING_MODE, PROFILE_SAMPLE_RATE, PROFILE_TOKEN_MINUTES, create_profile_token, get_profile, list_profiles
+)
+from app.middleware.query_budget import query_budget
+
+router = APIRouter()
+
+@router.get("")
+@query_budget(statements=0)
+def get_profiles(current_user: dict = Depends(require_admin)):
+    """
+    Buffered profiles, newest first (admins only)
+    """
+    return {
+        "enabled": PROFILING_MODE == "on",
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "profiles": list_profiles(),
+    }
+
+@router.post("/token")
+@query_budget(statements=0)
+def issue_profile_token(
+    memory: bool = Query(False, description="Also take tracemalloc snapshots"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Token marking requests for profiling when sent as X-Profile (admins only)
+    """
+    return {"token": create_profile_token(memory), "expires_in": PROFILE_TOKEN_MINUTES * 60}
+
+@router.get("/{profile_id}")
+@query_budget(statements=0)
+def download_profile(
+    profile_id: int,
+    format: str = Query("json", description="json (stacks, SQL, allocations) or folded (flamegraph.pl / speedscope input)"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    One profile (admins only)
+    """
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be json or folded")
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile {profile_id} not found (or no longer buffered)")
+    if format == "folded":
+        return PlainTextResponse(profile.folded(), headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'
+        })
+    return profile.to_dict()
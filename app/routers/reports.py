@@ -1,17 +1,38 @@
 """
 Report router - API endpoints for reports and analytics
 """
-from fastapi import APIRouter, Depends, status, HTTPException
+import math
+import zlib
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response, status, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.schemas import ReportCreate, ReportResponse
+from typing import List, Optional
+from datetime import date, datetime
+from app.database import get_db, get_read_db, read_session
+from app.schemas import ReportCreate, ReportResponse, ReportBatchResponse
 from app.services.report_service import ReportService
+from app.services.export_service import ExportService, EXPORT_FORMATS
+from app.services.trend_service import TrendService
+from app.services.heatmap_service import HeatmapService, HEATMAP_FORMATS, HEATMAP_MAX_ZOOM
+from app.services.report_pdf_service import (
+    ReportPdfService, REPORT_PDF_RETRY_AFTER_SECONDS, REPORT_PDF_URL_SECONDS, render_report_pdf_job
+)
+from app.services.storage_service import get_storage_service
+from app.services.inspection_service import InspectionService, batch_ids
+from app.models import DEFECT_CLASSES
 from app.middleware.auth_middleware import get_current_user, require_role
+from app.middleware.query_budget import query_budget
+from app.middleware.idempotency import idempotent
+from app.middleware.compression import etag_matches
+from app.middleware.profiling import trace_allocations
+from app.streaming import NDJSON_RESPONSES, ndjson_response, wants_ndjson
 
 router = APIRouter()
 
 @router.post("", response_model=ReportResponse, status_code=status.HTTP_201_CREATED)
+@query_budget(statements=6, rows=3)
+@idempotent
+@trace_allocations
 def create_report(
     report: ReportCreate,
     current_user: dict = Depends(require_role(["pilot"])),
@@ -21,13 +42,32 @@ def create_report(
     Create a new report for an inspection (Pilots only)
     """
     service = ReportService(db)
-    return service.create_report(report)
+    return service.create_report(report, actor_id=current_user["user_id"])
+
+@router.get("/batch", response_model=ReportBatchResponse)
+@query_budget(statements=4)
+def get_reports_batch(
+    inspection_ids: List[int] = Query(..., description="Inspection IDs (repeat the parameter, up to BATCH_MAX_IDS)"),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get the reports of many inspections in one request
+    
+    Image URLs are signed in one batch; each ID gets the report or the
+    403/404 the single-report endpoint would have returned.
+    """
+    service = ReportService(db)
+    return {"items": service.get_reports_by_inspections(
+        batch_ids(inspection_ids), current_user["user_id"], current_user["role"]
+    )}
 
 @router.get("/{inspection_id}", response_model=ReportResponse)
+@query_budget(statements=5)
 def get_report(
     inspection_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get report for a specific inspection
@@ -37,31 +77,185 @@ def get_report(
     
     # Auth check: Customer can only see their own reports
     if current_user["role"] == "customer":
-        from app.models import Inspection
-        inspection = db.query(Inspection).filter(Inspection.id == inspection_id).first()
+        inspection = InspectionService(db).get_inspection(inspection_id)
         if inspection.customer_id != current_user["user_id"]:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your report")
             
     return report
 
-@router.get("/customer/all", response_model=List[ReportResponse])
+@router.get("/{inspection_id}/pdf")
+@query_budget(statements=7)
+def download_report_pdf(
+    inspection_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    PDF of an inspection report: summary, findings per class and defect thumbnails
+    
+    The first request for a version of the report queues the render and gets
+    202 with Retry-After; once it is ready, requests are redirected to the
+    stored file (or served it directly from local storage). A failed render
+    answers 503 with its error, and Retry-After while it may still be retried.
+    """
+    service = ReportPdfService(db)
+    render, started = service.request_render(inspection_id, current_user["user_id"], current_user["role"])
+    if started:
+        background_tasks.add_task(render_report_pdf_job, render.id)
+    if render.status == "failed":
+        retry_at = service.retry_at(render)
+        headers = {}
+        if retry_at is not None:
+            headers["Retry-After"] = str(max(1, math.ceil((retry_at - datetime.utcnow()).total_seconds())))
+        return JSONResponse(
+            {"status": "failed", "render_id": render.id, "error": render.error, "attempts": render.attempts},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers=headers
+        )
+    if render.status != "ready":
+        return JSONResponse(
+            {"status": "rendering", "render_id": render.id},
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Retry-After": str(REPORT_PDF_RETRY_AFTER_SECONDS)}
+        )
+    
+    storage = get_storage_service()
+    if storage.client.local_dir:
+        return FileResponse(
+            storage.client.local_path(render.storage_path),
+            media_type="application/pdf",
+            filename=f"inspection-{inspection_id}-report.pdf"
+        )
+    url = storage.get_signed_url(render.storage_path, REPORT_PDF_URL_SECONDS)
+    if url is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Report PDF could not be signed, retry shortly")
+    return RedirectResponse(url, status_code=status.HTTP_303_SEE_OTHER)
+
+@router.get("/customer/all", response_model=List[ReportResponse], responses=NDJSON_RESPONSES)
+@query_budget(statements=2)
 def get_my_reports(
+    request: Request,
+    date_from: Optional[datetime] = Query(None, description="Only reports of inspections scheduled on or after this date, archived ones included"),
     current_user: dict = Depends(require_role(["customer"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all reports for the currently authenticated customer
+    
+    Reports of archived inspections are included back to date_from. With
+    Accept: application/x-ndjson the list streams as one report per line.
     """
+    if wants_ndjson(request):
+        return ndjson_response(
+            request, lambda db: ReportService(db).iter_customer_reports(current_user["user_id"], date_from), ReportResponse
+        )
     service = ReportService(db)
-    return service.get_customer_reports(current_user["user_id"])
+    return service.get_customer_reports(current_user["user_id"], date_from)
+
+@router.get("/customer/export")
+@query_budget(statements=2)
+@trace_allocations
+def export_my_data(
+    request: Request,
+    format: str = Query("csv", description="csv, ndjson or parquet"),
+    compress: Optional[str] = Query(None, description="gzip (Parquet uses internal gzip codec)"),
+    date_from: Optional[datetime] = Query(None, alias="from", description="Scheduled on or after"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="Scheduled before"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Filter by inspection status"),
+    current_user: dict = Depends(require_role(["customer"]))
+):
+    """
+    Stream every inspection (with its report, if any) for the authenticated customer
+    
+    Rows are read through a server-side cursor and written out batch by batch,
+    so exports of any size run in constant memory. A range starting before the
+    hot window (or no range) includes archived inspections.
+    """
+    ExportService(None).validate(format, compress)
+    customer_id = current_user["user_id"]
+    
+    def body():
+        # The session lives as long as the stream, not the request handler
+        with read_session(request) as db:
+            service = ExportService(db)
+            batches = service.rows(customer_id, date_from, date_to, status_filter)
+            yield from service.stream(batches, format, compress)
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"vyooma-export.{extension}"
+    if compress and format != "parquet":
+        media_type, filename = "application/gzip", filename + ".gz"
+    
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/analytics/me")
+@query_budget(statements=3, rows=3)
 def get_my_analytics(
     current_user: dict = Depends(require_role(["customer"])),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get analytics dashboard data for the authenticated customer
     """
     service = ReportService(db)
     return service.get_analytics(current_user["user_id"])
+
+@router.get("/analytics/me/trends")
+@query_budget(statements=1)
+def get_my_defect_trends(
+    date_from: Optional[date] = Query(None, alias="from", description="First month (any day in it)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last month (any day in it)"),
+    by_site: bool = Query(False, description="Break counts down per site"),
+    defect_class: Optional[str] = Query(None, description="Restrict to one defect class"),
+    current_user: dict = Depends(require_role(["customer"])),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Monthly defect counts by class (and optionally site) for the authenticated customer
+    
+    Served from pre-aggregated rollups, so any date range is a single indexed query.
+    """
+    service = TrendService(db)
+    return {
+        "trends": service.get_trends(current_user["user_id"], date_from, date_to, by_site, defect_class)
+    }
+
+@router.get("/heatmap/{inspection_id}/{z}/{x}/{y}.{fmt}")
+@query_budget(statements=2)
+def get_heatmap_tile(
+    inspection_id: int,
+    z: int,
+    x: int,
+    y: int,
+    fmt: str,
+    request: Request,
+    defect_class: Optional[str] = Query(None, description="Only map one defect class"),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Defect density map tile for an inspection's site
+    
+    `png` tiles are a yellow-to-red heat overlay; `geojson` tiles carry one
+    polygon per occupied cell with per-class finding counts.
+    """
+    if fmt not in HEATMAP_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tile format must be png or geojson")
+    if not 0 <= z <= HEATMAP_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tile out of range")
+    if defect_class and defect_class not in DEFECT_CLASSES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown defect class '{defect_class}'")
+    
+    InspectionService(db).get_visible_inspection(inspection_id, current_user["user_id"], current_user["role"])
+    tile = HeatmapService(db).get_tile(inspection_id, z, x, y, fmt, defect_class)
+    
+    etag = f'"{zlib.crc32(tile):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=tile, media_type=HEATMAP_FORMATS[fmt], headers=headers)
@@ -0,0 +1,57 @@
+"""
+Search router - Find inspections by site or report text, and site typeahead
+Results are limited to the inspections the caller may see.
+"""
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_read_db
+from app.schemas import SearchResults
+from app.services.search_service import SearchService
+from app.middleware.auth_middleware import get_current_user
+from app.middleware.query_budget import query_budget
+
+router = APIRouter()
+
+INSPECTION_STATUSES = ("pending", "scheduled", "completed", "cancelled")
+
+@router.get("", response_model=SearchResults)
+@query_budget(statements=1)
+def search_inspections(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find (each matches as a prefix)"),
+    status_filter: Optional[str] = Query(None, alias="status", description="pending, scheduled, completed or cancelled"),
+    date_from: Optional[date] = Query(None, alias="from", description="Scheduled on or after"),
+    date_to: Optional[date] = Query(None, alias="to", description="Scheduled on or before"),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Search inspections by location, report title, summary or defect classification
+    
+    Newest first; follow next_cursor for more pages.
+    """
+    if status_filter and status_filter not in INSPECTION_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status. Must be one of: {', '.join(INSPECTION_STATUSES)}"
+        )
+    return SearchService(db).search(
+        q, current_user["user_id"], current_user["role"],
+        status=status_filter, date_from=date_from, date_to=date_to, cursor=cursor, limit=limit
+    )
+
+@router.get("/suggest", response_model=List[str])
+@query_budget(statements=1)
+def suggest_locations(
+    q: str = Query(..., min_length=1, max_length=100, description="What has been typed so far"),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Site names for search-box typeahead
+    """
+    return SearchService(db).suggest(q, current_user["user_id"], current_user["role"], limit)
@@ -0,0 +1,64 @@
+"""
+Sync router - Central endpoints the field sync engine talks to
+Batches are JSON, gzip-compressed both ways when the client says so
+(Content-Encoding / Accept-Encoding), so a day's field work moves in a few requests.
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app.database import get_db, get_read_db
+from app.schemas import SyncPush
+from app.services.sync_service import SyncService, SYNC_PULL_PAGE_SIZE, decode_batch, encode_batch
+from app.middleware.auth_middleware import require_role
+from app.middleware.query_budget import query_budget
+from app.middleware.idempotency import idempotent
+
+router = APIRouter()
+
+async def read_batch(request: Request) -> dict:
+    """Request body as a sync batch (gzip or plain JSON)"""
+    return decode_batch(await request.body(), request.headers.get("content-encoding"))
+
+async def read_push(payload: dict = Depends(read_batch)) -> SyncPush:
+    """A pushed batch validated like any request body (422 with the failing fields)"""
+    try:
+        return SyncPush.model_validate(payload)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+def batch_response(request: Request, payload: dict) -> Response:
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Vary": "Accept-Encoding", **({"Content-Encoding": "gzip"} if gzipped else {})}
+    return Response(encode_batch(payload, compress=gzipped), media_type="application/json", headers=headers)
+
+@router.get("/changes")
+@query_budget(statements=3)
+def pull_changes(
+    request: Request,
+    after: Optional[str] = Query(None, description="cursor from the previous page"),
+    limit: int = Query(SYNC_PULL_PAGE_SIZE, ge=1, le=5000),
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_read_db)
+):
+    """
+    The pilot's inspections changed after the cursor (Pilots only)
+    """
+    return batch_response(request, SyncService(db).changes(current_user["user_id"], after, limit))
+
+@router.post("/push")
+@query_budget(statements=6)
+@idempotent
+def push_changes(
+    request: Request,
+    payload: SyncPush = Depends(read_push),
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Merge a batch of field changes (Pilots only)
+
+    Each pushed report adds the statements of a normal report creation.
+    """
+    return batch_response(request, SyncService(db).apply_push(current_user["user_id"], payload))
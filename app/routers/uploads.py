@@ -0,0 +1,133 @@
+"""
+Resumable upload router - chunked uploads that survive dropped connections
+Create a session per file, PATCH chunks with Upload-Offset, HEAD/GET the
+current offset to resume, then finalize to queue the inspection for analysis.
+"""
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.schemas import UploadSessionCreate, UploadSessionResponse, UploadFinalize
+from app.services.inspection_service import InspectionService
+from app.services.upload_service import UploadService
+from app.services.video_service import VIDEO_INGEST_MODE, VideoIngestService, ingest_video_job
+from app.services.analysis_service import AnalysisService
+from app.middleware.auth_middleware import require_role
+from app.middleware.query_budget import query_budget
+from app.middleware.profiling import trace_allocations
+
+router = APIRouter()
+
+@router.post("/{inspection_id}/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+@query_budget(statements=6)
+def create_upload(
+    inspection_id: int,
+    upload: UploadSessionCreate,
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Open a resumable upload session for one file (Pilots only)
+    """
+    inspection = InspectionService(db).get_assigned_inspection(inspection_id, current_user["user_id"])
+    return UploadService(db).create_session(inspection, current_user["user_id"], upload.filename, upload.size)
+
+@router.get("/{inspection_id}/uploads/{upload_id}", response_model=UploadSessionResponse)
+@query_budget(statements=2, rows=2)
+def get_upload(
+    inspection_id: int,
+    upload_id: str,
+    response: Response,
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Current state of an upload; resume by PATCHing from the returned offset
+    """
+    service = UploadService(db)
+    session = service.sync_offset(service.get_session(inspection_id, upload_id, current_user["user_id"]))
+    response.headers["Upload-Offset"] = str(session.offset)
+    response.headers["Upload-Length"] = str(session.size)
+    return session
+
+@router.head("/{inspection_id}/uploads/{upload_id}")
+@query_budget(statements=2, rows=2)
+def head_upload(
+    inspection_id: int,
+    upload_id: str,
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Offset probe without a body (tus-style clients)
+    """
+    service = UploadService(db)
+    session = service.sync_offset(service.get_session(inspection_id, upload_id, current_user["user_id"]))
+    return Response(headers={
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.size),
+        "Cache-Control": "no-store"
+    })
+
+@router.patch("/{inspection_id}/uploads/{upload_id}", response_model=UploadSessionResponse)
+@query_budget(statements=9)
+async def upload_chunk(
+    inspection_id: int,
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Write one chunk at Upload-Offset (raw bytes body)
+
+    Chunks may be sent in parallel and out of order. Upload-Checksum takes
+    "sha256 <hex>"; a mismatch returns 460 and the chunk must be resent.
+    """
+    service = UploadService(db)
+    session = await run_in_threadpool(service.get_session, inspection_id, upload_id, current_user["user_id"])
+    length = request.headers.get("content-length")
+    session = await service.write_chunk(
+        session, upload_offset, request.stream(), upload_checksum, int(length) if length and length.isdigit() else None
+    )
+    response.headers["Upload-Offset"] = str(session.offset)
+    return session
+
+@router.post("/{inspection_id}/uploads/finalize")
+@query_budget(statements=8)
+@trace_allocations
+def finalize_uploads(
+    inspection_id: int,
+    data: UploadFinalize,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(require_role(["pilot"])),
+    db: Session = Depends(get_db)
+):
+    """
+    Commit completed uploads and queue their frames for analysis, like the multipart /upload route
+    
+    Video files are reduced to keyframes by the analysis workers (or, with
+    VIDEO_INGEST_MODE=api, in the background after the response).
+    """
+    inspection_service = InspectionService(db)
+    inspection = inspection_service.get_assigned_inspection(inspection_id, current_user["user_id"])
+
+    result = UploadService(db).finalize(inspection, data.upload_ids, current_user["user_id"])
+    inspection = inspection_service.record_upload(inspection, result["folder"])
+    AnalysisService(db).plan(inspection_id)
+    if VIDEO_INGEST_MODE == "worker":
+        if result["videos"]:
+            VideoIngestService(db).enqueue(inspection_id, [video["storage_path"] for video in result["videos"]])
+    else:
+        for video in result["videos"]:
+            background_tasks.add_task(ingest_video_job, inspection_id, video["local_path"], video["storage_path"])
+
+    return {
+        "message": "Images uploaded successfully",
+        "file_count": len(result["files"]),
+        "analysis_status": inspection.analysis_status
+    }
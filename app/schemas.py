@@ -1,13 +1,14 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Union
 
 class UserCreate(BaseModel):
     name: str
     email: EmailStr
     password: str
     role: str  # customer or pilot
-
-from datetime import datetime
-from typing import Optional
+    latitude: Optional[float] = None  # Pilot home base
+    longitude: Optional[float] = None
 
 class UserResponse(UserCreate):
     id: int
@@ -21,6 +22,8 @@ class InspectionCreate(BaseModel):
     location: str
     scheduled_date: datetime
     package: str = "Basic" # Added package selection
+    latitude: Optional[float] = None  # Site coordinates (used for pilot dispatch)
+    longitude: Optional[float] = None
 
 class InspectionResponse(InspectionCreate):
     id: int
@@ -42,7 +45,14 @@ class InspectionResponse(InspectionCreate):
         "from_attributes": True
     }
 
-class ReportCreate(BaseModel):
+class FindingCreate(BaseModel):
+    defect_class: str
+    confidence: Optional[int] = None
+    frame_path: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class ReportBase(BaseModel):
     inspection_id: int
     title: str
     summary: Optional[str]
@@ -50,10 +60,193 @@ class ReportCreate(BaseModel):
     image_url: Optional[str] = None
     confidence: Optional[int] = None
 
-class ReportResponse(ReportCreate):
+class ReportCreate(ReportBase):
+    findings: List[FindingCreate] = []  # Individual detections, if the pipeline provides them
+
+class ReportResponse(ReportBase):
     id: int
     created_at: datetime
 
     model_config = {
         "from_attributes": True
     }
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int  # Total file size in bytes
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    inspection_id: int
+    filename: str
+    size: int
+    offset: int
+    status: str
+    expires_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class UploadFinalize(BaseModel):
+    upload_ids: List[str]
+
+class FrameResponse(BaseModel):
+    id: int
+    storage_path: str
+    original_name: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    altitude: Optional[float] = None
+    relative_altitude: Optional[float] = None
+    gimbal_pitch: Optional[float] = None
+    gimbal_yaw: Optional[float] = None
+    captured_at: Optional[datetime] = None
+    video_path: Optional[str] = None
+    video_offset: Optional[float] = None  # Seconds into video_path
+    distance_m: Optional[float] = None  # Set by nearest-frame queries
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class InspectionEventResponse(BaseModel):
+    id: int
+    inspection_id: int
+    field: str
+    from_value: Optional[str] = None
+    to_value: str
+    actor_id: Optional[int] = None
+    source: str
+    occurred_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class SearchHit(BaseModel):
+    id: int
+    location: str
+    status: Optional[str] = None
+    package: Optional[str] = None
+    scheduled_date: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    analysis_status: Optional[str] = None
+    report_id: Optional[int] = None
+    report_title: Optional[str] = None
+    defect_classification: Optional[str] = None
+
+class SearchResults(BaseModel):
+    results: List[SearchHit]
+    next_cursor: Optional[int] = None  # Pass as cursor to get the next page
+
+class InspectionBatchItem(BaseModel):
+    id: int
+    status_code: int  # 200, or 403/404 as the single-item endpoint would return
+    inspection: Optional[InspectionResponse] = None
+    detail: Optional[str] = None
+
+class InspectionBatchResponse(BaseModel):
+    items: List[InspectionBatchItem]  # In request order
+
+class ReportBatchItem(BaseModel):
+    inspection_id: int
+    status_code: int
+    report: Optional[ReportResponse] = None
+    detail: Optional[str] = None
+
+class ReportBatchResponse(BaseModel):
+    items: List[ReportBatchItem]
+
+class SyncInspectionChange(BaseModel):
+    id: int
+    base_version: Optional[int] = None  # Central version the field copy was based on
+    base: Dict[str, Any] = {}  # Synced column values at that version
+    changes: Dict[str, Any] = {}  # Columns changed in the field (checked per column when merged)
+
+class SyncEvent(BaseModel):
+    event_id: str = Field(min_length=1, max_length=36)  # Client-generated UUID
+    inspection_id: int
+    field: Optional[str] = None  # status when omitted
+    from_value: Optional[str] = None
+    to_value: str
+    source: Optional[str] = None
+    occurred_at: datetime
+
+class SyncReport(ReportCreate):
+    local_id: Optional[int] = None  # Field report id, echoed back in the result
+
+class SyncPush(BaseModel):
+    inspections: List[SyncInspectionChange] = []
+    events: List[SyncEvent] = []
+    reports: List[SyncReport] = []
+
+class AnalysisShardResponse(BaseModel):
+    seq: int
+    status: str  # pending, running, done, merged, failed
+    frames: int
+    processed: int
+    attempts: int
+    worker: Optional[str] = None
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+class AnalysisProgressResponse(BaseModel):
+    inspection_id: int
+    analysis_status: str
+    frames: int
+    processed: int
+    shard_counts: Dict[str, int]  # Shards per status
+    shards: List[AnalysisShardResponse]
+
+class DashboardInspection(BaseModel):
+    id: int
+    location: str
+    package: str
+    status: str
+    analysis_status: str
+    scheduled_date: Optional[datetime] = None
+    customer_id: int
+    pilot_id: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class DashboardReport(BaseModel):
+    id: int
+    inspection_id: int
+    location: str
+    title: str
+    defect_classification: Optional[str] = None
+    confidence: Optional[int] = None
+    image_url: Optional[str] = None  # Signed URL
+    created_at: datetime
+
+class DashboardAnalytics(BaseModel):
+    total_inspections: int
+    completed: int
+    cost_saved: int
+    next_booking_date: Optional[datetime] = None
+
+class CustomerDashboardResponse(BaseModel):
+    role: Literal["customer"]
+    generated_at: datetime  # When the (possibly cached) payload was built
+    analytics: DashboardAnalytics
+    status_counts: Dict[str, int]  # Inspections per status
+    upcoming: List[DashboardInspection]  # Next pending/scheduled inspections
+    recent_reports: List[DashboardReport]  # Newest first
+
+class PilotDashboardCounts(BaseModel):
+    assigned: int  # Open inspections assigned to the pilot
+    completed: int
+    analysis_processing: int
+
+class PilotDashboardResponse(BaseModel):
+    role: Literal["pilot"]
+    generated_at: datetime
+    counts: PilotDashboardCounts
+    assigned: List[DashboardInspection]  # Next open assignments
+    available_count: int  # Pending inspections any pilot can take
+    available: List[DashboardInspection]
+
+DashboardResponse = Union[CustomerDashboardResponse, PilotDashboardResponse]
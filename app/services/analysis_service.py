@@ -0,0 +1,519 @@
+"""
+Analysis service - Map/reduce defect classification of one inspection across worker nodes
+As frames are indexed, an inspection's frames not yet in a shard are split
+into shards of up to ANALYSIS_SHARD_FRAMES consecutive frames, each frame
+recording its shard (Frame.shard_id). Any analysis worker (admin.py
+analysis-worker: one per process, on as many machines as share the database)
+claims the oldest open shard under a lease, classifies its frames, renews the
+lease with its progress after every batch and hands back the shard's findings.
+A worker that dies stops renewing its lease, and the shard is claimed again.
+A shard that fails ANALYSIS_MAX_ATTEMPTS times fails the analysis. The worker
+that finishes an inspection's last open shard merges every shard's findings
+into the inspection's report, so one large flight finishes in roughly
+1/N of the time with N workers.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import DEFECT_CLASSES, AnalysisShard, Finding, Frame, Inspection, Report
+from app.schemas import FindingCreate, ReportCreate
+from app.services.classifier_service import CLASSIFIER_BATCH_SIZE, get_classifier
+from app.services.heatmap_service import invalidate_inspection as invalidate_heatmap
+from app.services.history_service import make_event, record_transitions
+from app.services.inspection_service import invalidate_inspections
+from app.services.report_service import ReportService
+from app.services.storage_client import run_sync
+from app.services.storage_service import StorageService, get_storage_service
+from app.services.trend_service import TrendService
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_SHARD_FRAMES = int(os.getenv("ANALYSIS_SHARD_FRAMES", "500"))
+ANALYSIS_LEASE_SECONDS = int(os.getenv("ANALYSIS_LEASE_SECONDS", "300"))  # Renewed after every batch
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "3"))
+ANALYSIS_POLL_SECONDS = float(os.getenv("ANALYSIS_POLL_SECONDS", "5"))  # Idle worker's wait between claims
+ANALYSIS_BATCH_FRAMES = int(os.getenv("ANALYSIS_BATCH_FRAMES", str(CLASSIFIER_BATCH_SIZE * 4)))  # Downloaded together
+ANALYSIS_CLAIM_CANDIDATES = 8
+
+OPEN_SHARD_STATUSES = ("pending", "running")  # done: findings waiting to be merged; merged: in the report
+
+def summarise(inspection: Inspection, frames: int, findings: List[FindingCreate]) -> ReportCreate:
+    """
+    Report for merged findings: the most frequent defect class, its mean confidence and best frame
+
+    Args:
+        inspection: Inspection analysed
+        frames: Frames classified
+        findings: Findings of every shard
+    """
+    counts = Counter(finding.defect_class for finding in findings)
+    if not counts:
+        return ReportCreate(
+            inspection_id=inspection.id, title=f"Automated analysis - {inspection.location}"[:200],
+            summary=f"No defects found in {frames} frames", defect_classification=None
+        )
+    top = counts.most_common(1)[0][0]
+    top_findings = [finding for finding in findings if finding.defect_class == top]
+    best = max(top_findings, key=lambda finding: finding.confidence or 0)
+    breakdown = ", ".join(f"{defect_class} {count}" for defect_class, count in counts.most_common())
+    return ReportCreate(
+        inspection_id=inspection.id,
+        title=f"Automated analysis - {inspection.location}"[:200],
+        summary=f"{len(findings)} defects in {frames} frames: {breakdown}"[:500],
+        defect_classification=top,
+        image_url=best.frame_path,
+        confidence=round(sum(finding.confidence or 0 for finding in top_findings) / len(top_findings)),
+        findings=findings
+    )
+
+class AnalysisService:
+    """Service class for sharding inspections, leasing shards to workers and merging their findings"""
+
+    def __init__(self, db: Session, storage: StorageService = None):
+        self.db = db
+        self.storage = storage or get_storage_service()
+        self._events = []  # Transitions to record once the transaction commits
+
+    def plan(self, inspection_id: int, shard_frames: int = ANALYSIS_SHARD_FRAMES) -> int:
+        """
+        Split the inspection's frames not yet in a shard into new shards, and commit
+
+        Called wherever frames are indexed (uploads, video keyframes), so frames
+        arriving after analysis started get shards of their own; frames arriving
+        after it completed reopen it and are merged into the existing report.
+
+        Membership is recorded on the frames rather than read from an id
+        watermark: frame ids don't commit in order (Postgres hands sequence
+        values out before the insert commits), so a frame can land below ids
+        already planned and must still get a shard.
+
+        Returns:
+            Number of shards added
+        """
+        planned = AnalysisShard.inspection_id == inspection_id
+        unplanned = (
+            select(Frame.id, ((func.row_number().over(order_by=Frame.id) - 1) // shard_frames).label("bucket"))
+            .where(Frame.inspection_id == inspection_id, Frame.shard_id.is_(None))
+            .subquery()
+        )
+        columns = ["inspection_id", "seq", "first_frame_id", "last_frame_id", "frames", "processed", "status", "attempts"]
+        for attempt in range(3):
+            next_seq = self.db.scalar(select(func.coalesce(func.max(AnalysisShard.seq) + 1, 0)).where(planned))
+            # Frames are bucketed in SQL, so planning a large upload fetches nothing
+            shards = (
+                select(
+                    literal(inspection_id), literal(next_seq) + unplanned.c.bucket, func.min(unplanned.c.id),
+                    func.max(unplanned.c.id), func.count(), literal(0), literal("pending"), literal(0)
+                )
+                .group_by(unplanned.c.bucket)
+            )
+            try:
+                added = self.db.execute(insert(AnalysisShard).from_select(columns, shards)).rowcount
+                break
+            except IntegrityError:  # A concurrent plan took the same shard numbers; plan what it left
+                self.db.rollback()
+        else:
+            raise RuntimeError(f"Could not plan analysis shards for inspection {inspection_id}")
+        if added:
+            new_shards = (planned, AnalysisShard.seq >= next_seq)
+            # Only frames still unassigned are taken, so no frame is in two shards; a frame committed
+            # since the insert within a new shard's range joins it, and the counts are taken afterwards
+            self.db.execute(
+                update(Frame)
+                .where(
+                    Frame.inspection_id == inspection_id, Frame.shard_id.is_(None),
+                    Frame.id >= select(func.min(AnalysisShard.first_frame_id)).where(*new_shards).scalar_subquery()
+                )
+                .values(shard_id=select(AnalysisShard.id).where(
+                    *new_shards, AnalysisShard.first_frame_id <= Frame.id, AnalysisShard.last_frame_id >= Frame.id
+                ).scalar_subquery())
+                .execution_options(synchronize_session=False)
+            )
+            self.db.execute(
+                update(AnalysisShard).where(*new_shards).values(
+                    frames=select(func.count()).select_from(Frame).where(Frame.shard_id == AnalysisShard.id).scalar_subquery()
+                )
+                .execution_options(synchronize_session=False)
+            )
+        if added and self.db.execute(
+            update(Inspection)
+            .where(Inspection.id == inspection_id, Inspection.analysis_status == "completed")
+            .values(analysis_status="processing")
+        ).rowcount:
+            self._events.append(make_event(inspection_id, "processing", "completed", source="analysis", field="analysis_status"))
+        self._commit()
+        return added
+
+    def claim(self, worker: str) -> Optional[AnalysisShard]:
+        """
+        Lease the oldest claimable shard to a worker
+
+        Claimable shards are pending (new, or handed back after an error) or
+        running past their lease (the worker died). Concurrent claims race on a
+        conditional update, so each lease goes to one worker; on Postgres,
+        candidates another worker is claiming are skipped outright.
+
+        Returns:
+            The claimed shard (detached, so the worker's commits don't expire it), or None if there is no work
+        """
+        now = datetime.utcnow()
+        claimable = (AnalysisShard.status == "pending") | (
+            (AnalysisShard.status == "running") & (AnalysisShard.lease_expires_at < now)
+        )
+        candidates = self.db.execute(
+            select(AnalysisShard.id, AnalysisShard.inspection_id, AnalysisShard.status, AnalysisShard.attempts)
+            .where(claimable)
+            .order_by(AnalysisShard.id)
+            .limit(ANALYSIS_CLAIM_CANDIDATES)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        claimed = None
+        for shard_id, inspection_id, shard_status, attempts in candidates:
+            unchanged = (AnalysisShard.id == shard_id, AnalysisShard.status == shard_status, AnalysisShard.attempts == attempts)
+            if shard_status == "running" and attempts >= ANALYSIS_MAX_ATTEMPTS:
+                self._give_up(unchanged, inspection_id, "Lease expired on the last attempt")
+                continue
+            won = self.db.execute(update(AnalysisShard).where(*unchanged).values(
+                status="running", worker=worker, attempts=attempts + 1, processed=0, error=None,
+                lease_expires_at=now + timedelta(seconds=ANALYSIS_LEASE_SECONDS), started_at=now, completed_at=None
+            )).rowcount
+            if won:
+                claimed = shard_id
+                break
+        self._commit()
+        if claimed is None:
+            return None
+        shard = self.db.get(AnalysisShard, claimed)
+        self.db.expunge(shard)
+        return shard
+
+    def heartbeat(self, shard_id: int, worker: str, processed: int) -> bool:
+        """Record a worker's progress and renew its lease; False if it no longer holds the shard"""
+        renewed = self.db.execute(
+            update(AnalysisShard)
+            .where(AnalysisShard.id == shard_id, AnalysisShard.worker == worker, AnalysisShard.status == "running")
+            .values(processed=processed, lease_expires_at=datetime.utcnow() + timedelta(seconds=ANALYSIS_LEASE_SECONDS))
+        ).rowcount
+        self.db.commit()
+        return bool(renewed)
+
+    def complete(self, shard_id: int, worker: str, findings: List[dict]) -> bool:
+        """
+        Store a shard's findings, merging the inspection's results if it was the last open shard
+
+        Completions of one inspection take its row lock first, so exactly one
+        of them sees no shard left open.
+
+        Args:
+            shard_id: Shard the worker holds
+            worker: Worker name it was claimed with
+            findings: FindingCreate fields of each defect found
+
+        Returns:
+            False if the worker had lost the shard (its findings are dropped; the new holder redoes it)
+        """
+        inspection_id = self.db.scalar(select(AnalysisShard.inspection_id).where(AnalysisShard.id == shard_id))
+        inspection = self.db.scalar(select(Inspection).where(Inspection.id == inspection_id).with_for_update())
+        stored = inspection is not None and self.db.execute(
+            update(AnalysisShard)
+            .where(AnalysisShard.id == shard_id, AnalysisShard.worker == worker, AnalysisShard.status == "running")
+            .values(status="done", processed=AnalysisShard.frames, result=json.dumps(findings),
+                    lease_expires_at=None, completed_at=datetime.utcnow())
+        ).rowcount
+        if not stored:
+            self.db.rollback()
+            return False
+
+        still_open = self.db.scalar(
+            select(func.count()).select_from(AnalysisShard)
+            .where(AnalysisShard.inspection_id == inspection_id, AnalysisShard.status.in_(OPEN_SHARD_STATUSES + ("failed",)))
+        )
+        if still_open:
+            self._commit()
+        else:
+            self._merge(inspection)
+        return True
+
+    def fail(self, shard_id: int, worker: str, error: str) -> bool:
+        """
+        Hand a shard back after an error: it is retried until ANALYSIS_MAX_ATTEMPTS, then fails the analysis
+
+        Returns:
+            False if the worker had already lost the shard
+        """
+        shard = self.db.get(AnalysisShard, shard_id)
+        if shard is None or shard.worker != worker or shard.status != "running":
+            return False
+        held = (AnalysisShard.id == shard_id, AnalysisShard.worker == worker, AnalysisShard.status == "running")
+        if shard.attempts >= ANALYSIS_MAX_ATTEMPTS:
+            released = self._give_up(held, shard.inspection_id, error)
+        else:
+            released = self.db.execute(update(AnalysisShard).where(*held).values(
+                status="pending", lease_expires_at=None, error=error[:500]
+            )).rowcount
+        self._commit()
+        return bool(released)
+
+    def retry(self, inspection_id: int) -> int:
+        """
+        Give an inspection's failed shards a fresh set of attempts and reopen its analysis
+
+        Returns:
+            Number of shards requeued
+        """
+        requeued = self.db.execute(
+            update(AnalysisShard)
+            .where(AnalysisShard.inspection_id == inspection_id, AnalysisShard.status == "failed")
+            .values(status="pending", attempts=0, worker=None, lease_expires_at=None)
+        ).rowcount
+        if requeued and self.db.execute(
+            update(Inspection)
+            .where(Inspection.id == inspection_id, Inspection.analysis_status == "failed")
+            .values(analysis_status="processing")
+        ).rowcount:
+            self._events.append(make_event(inspection_id, "processing", "failed", source="analysis", field="analysis_status"))
+        self._commit()
+        invalidate_inspections([inspection_id])
+        return requeued
+
+    def progress(self, inspection: Inspection) -> dict:
+        """
+        Per-shard state of an inspection's analysis and its totals
+
+        Raises:
+            HTTPException: 404 if the inspection has no frames to analyse
+        """
+        shards = self.db.execute(
+            select(
+                AnalysisShard.seq, AnalysisShard.status, AnalysisShard.frames, AnalysisShard.processed,
+                AnalysisShard.attempts, AnalysisShard.worker, AnalysisShard.error,
+                AnalysisShard.started_at, AnalysisShard.completed_at
+            )
+            .where(AnalysisShard.inspection_id == inspection.id)
+            .order_by(AnalysisShard.seq)
+        ).mappings().all()
+        if not shards:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Inspection {inspection.id} has no frames to analyse"
+            )
+        return {
+            "inspection_id": inspection.id,
+            "analysis_status": inspection.analysis_status,
+            "frames": sum(shard["frames"] for shard in shards),
+            "processed": sum(shard["processed"] for shard in shards),
+            "shard_counts": dict(Counter(shard["status"] for shard in shards)),
+            "shards": [dict(shard) for shard in shards],
+        }
+
+    def _commit(self):
+        self.db.commit()
+        events, self._events = self._events, []
+        if events:
+            invalidate_inspections({event["inspection_id"] for event in events})
+            record_transitions(events)
+
+    def _give_up(self, held: tuple, inspection_id: int, error: str) -> int:
+        """Fail a shard that ran out of attempts, and with it the inspection's analysis"""
+        failed = self.db.execute(update(AnalysisShard).where(*held).values(
+            status="failed", lease_expires_at=None, error=error[:500]
+        )).rowcount
+        if failed and self.db.execute(
+            update(Inspection)
+            .where(Inspection.id == inspection_id, Inspection.analysis_status == "processing")
+            .values(analysis_status="failed")
+        ).rowcount:
+            self._events.append(make_event(inspection_id, "failed", "processing", source="analysis", field="analysis_status"))
+        return failed
+
+    def _merge(self, inspection: Inspection):
+        """
+        Reduce: put every done shard's findings in the inspection's report and complete the analysis
+
+        The first merge creates the report the way a submitted one would be
+        (completing the inspection); frames that reopened the analysis later
+        add their findings to the inspection's report and bump its version (so
+        its PDF re-renders). Only a report the analysis created has its summary
+        fields recomputed from all of its findings; a pilot's keeps what they wrote.
+        """
+        shards = self.db.execute(
+            select(AnalysisShard.id, AnalysisShard.frames, AnalysisShard.result)
+            .where(AnalysisShard.inspection_id == inspection.id, AnalysisShard.status == "done")
+            .order_by(AnalysisShard.seq)
+        ).all()
+        findings = [FindingCreate(**finding) for _, _, result in shards for finding in json.loads(result or "[]")]
+        self.db.execute(
+            update(AnalysisShard).where(AnalysisShard.id.in_([shard_id for shard_id, _, _ in shards])).values(status="merged")
+        )
+        previous = inspection.analysis_status
+        inspection.analysis_status = "completed"
+        if previous != "completed":
+            self._events.append(make_event(inspection.id, "completed", previous, source="analysis", field="analysis_status"))
+
+        report = self.db.scalar(select(Report).where(Report.inspection_id == inspection.id))
+        if report is None:
+            # Commits the merge along with the report
+            ReportService(self.db, self.storage).create_report(
+                summarise(inspection, sum(frames for _, frames, _ in shards), findings), automated=True
+            )
+            self._commit()
+            return
+        if findings:
+            self.db.execute(insert(Finding), [
+                {"report_id": report.id, "inspection_id": inspection.id, **finding.model_dump()} for finding in findings
+            ])
+            TrendService(self.db).record_report(report, inspection, [finding.defect_class for finding in findings])
+            if report.automated:
+                self._resummarise(report, inspection)
+            else:
+                report.version = Report.version + 1
+        self._commit()
+        invalidate_inspections([inspection.id])
+        if findings:
+            invalidate_heatmap(inspection.id)
+
+    def _resummarise(self, report: Report, inspection: Inspection):
+        """Recompute the report's summary fields over every finding it holds and bump its version (caller commits)"""
+        findings = [FindingCreate(**row) for row in self.db.execute(
+            select(Finding.defect_class, Finding.confidence, Finding.frame_path, Finding.latitude, Finding.longitude)
+            .where(Finding.report_id == report.id)
+            .order_by(Finding.id)
+        ).mappings()]
+        frames = self.db.scalar(
+            select(func.coalesce(func.sum(AnalysisShard.frames), 0))
+            .where(AnalysisShard.inspection_id == inspection.id, AnalysisShard.status == "merged")
+        )
+        merged = summarise(inspection, frames, findings)
+        report.summary = merged.summary
+        report.defect_classification = merged.defect_classification
+        report.confidence = merged.confidence
+        report.image_url = merged.image_url
+        report.version = Report.version + 1  # Even if the headline is unchanged, the findings (and so the PDF) are not
+
+class AnalysisWorker:
+    """
+    Claims shards and classifies their frames (one per process; run as many as there are cores to spare)
+
+    Queued videos (VIDEO_INGEST_MODE=worker) are keyframed first, since their
+    keyframes become shards of their own.
+
+    Args:
+        name: Recorded on the shards it holds (host-pid by default)
+        classifier: Anything with classify(image_paths) (the deployment's DefectClassifier by default)
+        storage: Storage service frames are downloaded through
+    """
+
+    def __init__(self, name: Optional[str] = None, classifier=None, storage: StorageService = None):
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.classifier = classifier
+        self.storage = storage or get_storage_service()
+
+    def run(self, until_idle: bool = False) -> int:
+        """
+        Process video jobs and shards until stopped, or until none are left with until_idle
+
+        Returns:
+            Shards this worker completed
+        """
+        from app.services.video_service import VideoIngestService  # video_service imports this module
+
+        completed = 0
+        while True:
+            db = SessionLocal()
+            try:
+                worked = VideoIngestService(db, self.storage).process_next(self.name)
+                if not worked:
+                    service = AnalysisService(db, self.storage)
+                    shard = service.claim(self.name)
+                    worked = shard is not None
+                    if worked:
+                        completed += self.process(service, shard)
+            finally:
+                db.close()
+            if not worked:
+                if until_idle:
+                    return completed
+                time.sleep(ANALYSIS_POLL_SECONDS)
+
+    def process(self, service: AnalysisService, shard: AnalysisShard) -> bool:
+        """Classify one claimed shard and hand back its findings (or the error); True if it was completed"""
+        try:
+            findings = self.classify(service, shard)
+        except Exception as e:
+            logger.exception("Analysis shard %s (inspection %s) failed", shard.seq, shard.inspection_id)
+            service.db.rollback()
+            service.fail(shard.id, self.name, f"{type(e).__name__}: {e}")
+            return False
+        if findings is None:
+            logger.warning("Lost the lease on shard %s of inspection %s", shard.seq, shard.inspection_id)
+            return False
+        return service.complete(shard.id, self.name, findings)
+
+    def classify(self, service: AnalysisService, shard: AnalysisShard) -> Optional[List[dict]]:
+        """
+        Findings of a shard's frames, ANALYSIS_BATCH_FRAMES downloaded and classified at a time
+
+        Returns:
+            FindingCreate fields per defect found, or None if the lease was lost midway
+        """
+        frames = service.db.execute(
+            select(Frame.storage_path, Frame.latitude, Frame.longitude)
+            .where(Frame.inspection_id == shard.inspection_id, Frame.shard_id == shard.id)
+            .order_by(Frame.id)
+        ).all()
+        service.db.commit()  # Nothing stays open while the model runs
+        classifier = self.classifier or get_classifier()
+
+        findings = []
+        with tempfile.TemporaryDirectory(prefix="analysis-") as workdir:
+            for start in range(0, len(frames), ANALYSIS_BATCH_FRAMES):
+                batch = frames[start:start + ANALYSIS_BATCH_FRAMES]
+                paths = run_sync(self._download, [frame.storage_path for frame in batch], workdir)
+                present = [(frame, path) for frame, path in zip(batch, paths) if path]
+                if len(present) < len(batch):
+                    logger.warning("Shard %s of inspection %s: %d frames missing from storage",
+                                   shard.seq, shard.inspection_id, len(batch) - len(present))
+                predictions = classifier.classify([path for _, path in present]) if present else []
+                for _, path in present:
+                    os.remove(path)
+                for (frame, _), prediction in zip(present, predictions):
+                    if prediction["defect_class"] in DEFECT_CLASSES:
+                        findings.append({
+                            "defect_class": prediction["defect_class"],
+                            "confidence": round(prediction["confidence"]),
+                            "frame_path": frame.storage_path,
+                            "latitude": frame.latitude,
+                            "longitude": frame.longitude,
+                        })
+                if not service.heartbeat(shard.id, self.name, start + len(batch)):
+                    return None
+        return findings
+
+    async def _download(self, storage_paths: List[str], workdir: str) -> List[Optional[str]]:
+        """Fetch frames in parallel into workdir; None for frames no longer in storage"""
+        bodies = await asyncio.gather(*(self.storage.client.download(path) for path in storage_paths))
+        paths = []
+        for n, (storage_path, body) in enumerate(zip(storage_paths, bodies)):
+            if body is None:
+                paths.append(None)
+                continue
+            path = os.path.join(workdir, f"{n}{os.path.splitext(storage_path)[1] or '.jpg'}")
+            with open(path, "wb") as f:
+                f.write(body)
+            paths.append(path)
+        return paths
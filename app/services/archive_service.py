@@ -0,0 +1,261 @@
+"""
+Archive service - Hot/cold split of inspections by age
+Inspections that settled (completed or cancelled, and past their scheduled
+date) more than ARCHIVE_AFTER_DAYS ago are moved out of the hot tables, with
+their reports, findings, status events and frames, into one cold partition per
+year. The hot tables and their indexes then hold recent work only, which is
+all the customer and pilot views read.
+
+Postgres: <table>_archive is natively partitioned BY RANGE (period) with a
+<table>_archive_y<year> partition per year, so queries on the parent are
+pruned to the years asked for. Other databases: the same per-year tables,
+standalone, and reads UNION ALL the years in range.
+
+Reads that span a date range (exports, rollup and SLA rebuilds, lists with a
+date_from) go through with_archive(), which adds the cold years the range
+reaches; a range that starts inside the hot window never touches the archive.
+Lookups by id that miss the hot tables fall back to find() / cold(), so an
+archived inspection, its report, PDF and history stay reachable by id.
+"""
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Column, Date, Index, MetaData, Table, delete, func, insert, literal, select, text, union_all
+from sqlalchemy.orm import Session, aliased
+
+from app.models import (
+    AnalysisShard, ArchivePartition, Finding, Frame, Inspection, InspectionEvent, Report, UploadChunk,
+    UploadSession, VideoJob
+)
+from app.services.cache import TTLCache
+from app.services.heatmap_service import invalidate_inspection as invalidate_heatmap
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_CATALOG_TTL_SECONDS = float(os.getenv("ARCHIVE_CATALOG_TTL_SECONDS", "60"))
+
+# Moved together in this order and deleted in reverse (children first)
+ARCHIVED_MODELS = (Inspection, Report, Finding, InspectionEvent, Frame)
+SETTLED_STATUSES = ("completed", "cancelled")
+
+_metadata = MetaData()
+_tables_lock = threading.Lock()
+_catalog = TTLCache(maxsize=16, ttl=ARCHIVE_CATALOG_TTL_SECONDS)  # database URL -> {year: newest settled_at}
+
+def _naive(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def _key(model) -> str:
+    """Column tying a row to its inspection"""
+    return "id" if model is Inspection else "inspection_id"
+
+def archive_table(model, year: Optional[int] = None) -> Table:
+    """
+    Cold copy of a hot table: the partitioned parent <table>_archive, or the <table>_archive_y<year> table
+
+    Same columns, no foreign keys or unique constraints, plus period (Jan 1 of
+    the year the inspection settled) in the primary key.
+    """
+    name = f"{model.__tablename__}_archive" + (f"_y{year}" if year else "")
+    with _tables_lock:
+        table = _metadata.tables.get(name)
+        if table is None:
+            columns = [
+                Column(column.name, column.type, primary_key=column.primary_key, nullable=not column.primary_key)
+                for column in model.__table__.columns
+            ]
+            indexes = [Index(f"ix_{name}_{_key(model)}", _key(model))]
+            if model is Inspection:
+                indexes.append(Index(f"ix_{name}_customer_id", "customer_id"))
+            table = Table(
+                name, _metadata, *columns, Column("period", Date, primary_key=True), *indexes,
+                **({} if year else {"postgresql_partition_by": "RANGE (period)"})
+            )
+        return table
+
+class ArchiveService:
+    """Service class for moving settled inspections to cold storage and reading them back"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def partitions(self) -> Dict[int, datetime]:
+        """Archived years and the newest settled time in each (cached for ARCHIVE_CATALOG_TTL_SECONDS)"""
+        return _catalog.get_or_set(str(self.db.get_bind().url), lambda: dict(
+            self.db.execute(select(ArchivePartition.year, ArchivePartition.newest_settled_at)).all()
+        ))
+
+    def years(self, date_from: Optional[datetime] = None) -> List[int]:
+        """
+        Archived years holding inspections scheduled on or after date_from (all of them for None)
+
+        Inspections are filed under the later of their settle and scheduled
+        dates, so nothing scheduled after date_from sits in an earlier year
+        or in a year whose newest row settled before it.
+        """
+        partitions = self.partitions()
+        if date_from is None:
+            return sorted(partitions)
+        if not isinstance(date_from, datetime):
+            date_from = datetime.combine(date_from, datetime.min.time())
+        date_from = _naive(date_from)
+        return sorted(year for year, newest in partitions.items() if year >= date_from.year and newest >= date_from)
+
+    def with_archive(self, model, date_from: Optional[datetime] = None):
+        """
+        The model itself, or the model aliased over its hot rows plus the archived years date_from reaches
+
+        Usage:
+            I = ArchiveService(db).with_archive(Inspection, date_from)
+            select(I.id, I.location).where(I.customer_id == customer_id, I.scheduled_date >= date_from)
+        """
+        years = self.years(date_from)
+        if not years:
+            return model
+        hot = model.__table__
+        return aliased(model, union_all(select(hot), *self._cold(model, years)).subquery(f"{hot.name}_all"), adapt_on_names=True)
+
+    def cold(self, model):
+        """
+        The model aliased over its archived rows in every year, or None when nothing is archived
+
+        Usage:
+            F = ArchiveService(db).cold(Finding)
+            select(F.defect_class, func.count()).where(F.report_id == report_id).group_by(F.defect_class)
+        """
+        years = self.years()
+        if not years:
+            return None
+        selects = self._cold(model, years)
+        source = selects[0] if len(selects) == 1 else union_all(*selects)
+        return aliased(model, source.subquery(f"{model.__tablename__}_cold"), adapt_on_names=True)
+
+    def find(self, model, inspection_ids: Iterable[int]) -> list:
+        """
+        Archived rows of a model belonging to the given inspections, as detached read-only instances
+
+        One indexed query per call (none when nothing is archived); the hot
+        tables are not consulted, so call it for ids that missed them.
+        """
+        cold = self.cold(model)
+        inspection_ids = list(inspection_ids)
+        if cold is None or not inspection_ids:
+            return []
+        rows = self.db.scalars(select(cold).where(getattr(cold, _key(model)).in_(inspection_ids))).all()
+        for row in rows:
+            self.db.expunge(row)
+        return rows
+
+    def _cold(self, model, years: List[int]) -> list:
+        """One select of the model's archived columns per year (a single partition-pruned select on Postgres)"""
+        hot = model.__table__
+        if self.dialect == "postgresql":
+            parent = archive_table(model)
+            return [
+                select(*(parent.c[column.name] for column in hot.columns))
+                .where(parent.c.period.in_([date(year, 1, 1) for year in years]))
+            ]
+        return [select(*(archive_table(model, year).c[column.name] for column in hot.columns)) for year in years]
+
+    def archive(self, older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Move inspections settled before the cutoff into their year's partition, batch by batch
+
+        Each batch is one transaction (INSERT ... SELECT into the archive, then
+        DELETE from the hot tables), so an interrupted run leaves every
+        inspection wholly in one place or the other.
+
+        Args:
+            older_than_days: Age (since settling and since the scheduled date) to archive at
+            batch_size: Inspections moved per transaction
+            dry_run: Only count what would move
+
+        Returns:
+            Rows moved per table (inspections only, for a dry run)
+        """
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        settled = func.coalesce(Inspection.completed_at, Inspection.updated_at, Inspection.created_at)
+        due = func.coalesce(Inspection.scheduled_date, Inspection.created_at)
+        eligible = (Inspection.status.in_(SETTLED_STATUSES), settled < cutoff, due < cutoff)
+        if dry_run:
+            return {"inspections": self.db.scalar(select(func.count()).select_from(Inspection).where(*eligible))}
+
+        moved = {model.__tablename__: 0 for model in ARCHIVED_MODELS}
+        query = select(Inspection.id, settled, due).where(*eligible).order_by(Inspection.id).limit(batch_size)
+        after = 0
+        while True:
+            rows = self.db.execute(query.where(Inspection.id > after)).all()
+            if not rows:
+                break
+            after = rows[-1][0]
+            by_year = defaultdict(list)
+            newest = {}
+            for inspection_id, settled_at, due_at in rows:
+                settled_at = max(_naive(settled_at), _naive(due_at))
+                by_year[settled_at.year].append(inspection_id)
+                newest[settled_at.year] = max(newest.get(settled_at.year, settled_at), settled_at)
+            for year, ids in sorted(by_year.items()):
+                for table, count in self._move(year, ids).items():
+                    moved[table] += count
+                self._record(year, len(ids), newest[year])
+            self.db.commit()
+            ids = [row[0] for row in rows]
+            # Imported here: inspection_service reads through this module
+            from app.services.inspection_service import invalidate_inspections
+            invalidate_inspections(ids)
+            for inspection_id in ids:
+                invalidate_heatmap(inspection_id)
+        _catalog.clear()
+        return moved
+
+    def _ensure_partition(self, year: int):
+        connection = self.db.connection()
+        for model in ARCHIVED_MODELS:
+            if self.dialect == "postgresql":
+                parent = archive_table(model)
+                parent.create(connection, checkfirst=True)
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {parent.name}_y{year} PARTITION OF {parent.name} "
+                    f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+                ))
+            else:
+                archive_table(model, year).create(connection, checkfirst=True)
+
+    def _move(self, year: int, ids: List[int]) -> Dict[str, int]:
+        """Copy one year's share of a batch to the archive and delete it from the hot tables"""
+        self._ensure_partition(year)
+        period = literal(date(year, 1, 1), Date)
+        moved = {}
+        for model in ARCHIVED_MODELS:
+            hot = model.__table__
+            target = archive_table(model) if self.dialect == "postgresql" else archive_table(model, year)
+            result = self.db.execute(insert(target).from_select(
+                [column.name for column in hot.columns] + ["period"],
+                select(*hot.columns, period).where(hot.c[_key(model)].in_(ids))
+            ))
+            moved[hot.name] = result.rowcount
+
+        for model in reversed(ARCHIVED_MODELS):
+            self.db.execute(delete(model.__table__).where(model.__table__.c[_key(model)].in_(ids)))
+        # Resumable upload bookkeeping, analysis shards (after the frames that point at them) and video jobs
+        # are not kept for settled work; PDF renders stay, keyed by report id, so archived reports keep
+        # downloading without a re-render
+        self.db.execute(delete(AnalysisShard).where(AnalysisShard.inspection_id.in_(ids)))
+        self.db.execute(delete(VideoJob).where(VideoJob.inspection_id.in_(ids)))
+        sessions = select(UploadSession.id).where(UploadSession.inspection_id.in_(ids))
+        self.db.execute(delete(UploadChunk).where(UploadChunk.session_id.in_(sessions)))
+        self.db.execute(delete(UploadSession).where(UploadSession.inspection_id.in_(ids)))
+        return moved
+
+    def _record(self, year: int, count: int, newest: datetime):
+        partition = self.db.get(ArchivePartition, year)
+        if partition is None:
+            partition = ArchivePartition(year=year, inspections=0, newest_settled_at=newest)
+            self.db.add(partition)
+        partition.inspections += count
+        partition.newest_settled_at = max(partition.newest_settled_at, newest)
+        partition.archived_at = datetime.utcnow()
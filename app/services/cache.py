@@ -0,0 +1,121 @@
+"""
+In-process caches - bounded LRU with per-entry expiry
+Shared by services that memoise derived data (heatmap tiles, inspection rows).
+Each worker process holds its own copy, so the TTL also bounds how long
+another worker can serve data invalidated elsewhere. Every invalidation bumps
+the cache's generation; a value computed before one is not stored after it.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after ttl seconds
+
+    Args:
+        maxsize: Entries kept before the least recently used is evicted
+        ttl: Seconds an entry stays valid (0 disables expiry)
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value, version)
+        self._lock = threading.Lock()
+        self.generation = 0  # Bumped by every pop/discard_where/clear
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or (self.ttl and entry[0] < time.monotonic()):
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_versioned(self, key: Hashable) -> Tuple[Any, Optional[int]]:
+        """(value, version) of a live entry, or (None, None)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and entry[0] < time.monotonic()):
+                self.misses += 1
+                return None, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None, generation: Optional[int] = None) -> bool:
+        """
+        Store a value; a versioned one only if no live entry holds a newer version
+
+        Lets a writer's copy win over a reader that loaded the row before the
+        write but stores it after. Passing the generation read before computing
+        the value likewise refuses it if anything was invalidated meanwhile.
+
+        Returns:
+            Whether the value was stored
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            now = time.monotonic()
+            entry = self._data.get(key)
+            if (
+                version is not None and entry is not None and entry[2] is not None
+                and entry[2] > version and not (self.ttl and entry[0] < now)
+            ):
+                return False
+            self._data[key] = (now + self.ttl, value, version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Cached value, computing and storing it on a miss
+
+        The factory runs outside the lock; its result is returned either way but
+        only stored if no invalidation happened while it ran.
+        """
+        generation = self.generation
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, generation=generation)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            self.generation += 1
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches; returns how many were dropped"""
+        with self._lock:
+            self.generation += 1
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
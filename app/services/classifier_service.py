@@ -0,0 +1,155 @@
+"""
+Classifier service - YOLOv8 panel defect classifier for CPU analysis nodes
+The trained weights (YOLOv8 classification, see "ML model (RGB )") can run as
+the original FP32 PyTorch model, as an FP32 ONNX export (same precision, ONNX
+Runtime's graph optimisations) or as an OpenVINO INT8 model, selected per
+deployment with CLASSIFIER_PRECISION. Only int8 reduces precision.
+
+Exports are named after a digest of the weights they came from, so retrained
+weights get a fresh export instead of the old one being served.
+"""
+import hashlib
+import os
+import shutil
+from typing import List, Optional
+
+try:
+    from ultralytics import YOLO
+except ImportError:  # Only analysis nodes install the ML stack
+    YOLO = None
+
+CLASSIFIER_WEIGHTS = os.getenv("CLASSIFIER_WEIGHTS", "models/defect_cls.pt")
+CLASSIFIER_PRECISION = os.getenv("CLASSIFIER_PRECISION", "fp32")
+CLASSIFIER_IMGSZ = int(os.getenv("CLASSIFIER_IMGSZ", "224"))
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "16"))
+CLASSIFIER_THREADS = int(os.getenv("CLASSIFIER_THREADS", "0"))  # 0 = library default (all cores)
+# split_dataset/ root; INT8 export calibrates on its train/ images
+CLASSIFIER_DATASET = os.getenv("CLASSIFIER_DATASET", "split_dataset")
+
+# precision -> ultralytics export arguments (None = run the .pt weights directly)
+CLASSIFIER_PRECISIONS = {
+    "fp32": None,
+    "onnx": {"format": "onnx", "dynamic": True, "simplify": True},  # Still FP32, run by ONNX Runtime
+    "int8": {"format": "openvino", "int8": True, "dynamic": True},
+}
+
+CLASSIFIER_CLASSES = ["Bird_dropping", "Clean", "Dust", "Electrical", "Physical"]
+
+def _require_ultralytics():
+    if YOLO is None:
+        raise RuntimeError("Defect classification requires the ultralytics package")
+
+def weights_digest(weights: str) -> str:
+    """Short SHA-256 of a weights file, naming the exports made from it"""
+    digest = hashlib.sha256()
+    with open(weights, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+def export_model(
+    weights: str = CLASSIFIER_WEIGHTS,
+    precision: str = CLASSIFIER_PRECISION,
+    dataset: str = CLASSIFIER_DATASET,
+    imgsz: int = CLASSIFIER_IMGSZ,
+    force: bool = False
+) -> str:
+    """
+    Export the classifier for a precision mode, reusing an earlier export of the same weights
+
+    Args:
+        weights: Trained FP32 .pt weights
+        precision: One of CLASSIFIER_PRECISIONS
+        dataset: Calibration dataset root (INT8 only)
+        imgsz: Input size the model was trained at
+        force: Re-export even if an artifact for these weights exists
+
+    Returns:
+        Path of the model to load for this precision
+    """
+    if precision not in CLASSIFIER_PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}' (use one of {', '.join(CLASSIFIER_PRECISIONS)})")
+    options = CLASSIFIER_PRECISIONS[precision]
+    if options is None:
+        return weights
+
+    stem = os.path.splitext(weights)[0]
+    tag = f"{weights_digest(weights)}-{imgsz}"  # Different weights or input size -> different artifact
+    artifact = f"{stem}.{tag}.onnx" if options["format"] == "onnx" else f"{stem}.{tag}_int8_openvino_model"
+    if os.path.exists(artifact) and not force:
+        return artifact
+
+    _require_ultralytics()
+    extra = {"data": dataset} if options.get("int8") else {}
+    # ultralytics always writes next to the weights under a fixed name; move it to the tagged one
+    exported = YOLO(weights).export(imgsz=imgsz, batch=CLASSIFIER_BATCH_SIZE, **options, **extra)
+    if os.path.isdir(artifact):
+        shutil.rmtree(artifact)
+    os.replace(exported, artifact)
+    return artifact
+
+class DefectClassifier:
+    """Batched frame classification at the deployment's configured precision"""
+
+    def __init__(self, weights: str = CLASSIFIER_WEIGHTS, precision: str = CLASSIFIER_PRECISION, imgsz: int = CLASSIFIER_IMGSZ):
+        _require_ultralytics()
+        if CLASSIFIER_THREADS:
+            import torch
+            torch.set_num_threads(CLASSIFIER_THREADS)
+        self.precision = precision
+        self.imgsz = imgsz
+        self.model_path = export_model(weights, precision, imgsz=imgsz)
+        self.model = YOLO(self.model_path, task="classify")
+
+    def classify(self, images: List, batch_size: int = CLASSIFIER_BATCH_SIZE) -> List[dict]:
+        """
+        Classify frames
+
+        Args:
+            images: File paths or HxWx3 BGR arrays
+            batch_size: Frames per forward pass
+
+        Returns:
+            [{"defect_class", "confidence" (0-100)}] in input order
+        """
+        predictions = []
+        for start in range(0, len(images), batch_size):
+            results = self.model.predict(images[start:start + batch_size], imgsz=self.imgsz, verbose=False)
+            for result in results:
+                top1 = int(result.probs.top1)
+                predictions.append({
+                    "defect_class": result.names[top1],
+                    "confidence": round(float(result.probs.top1conf) * 100, 2)
+                })
+        return predictions
+
+    def warmup(self, runs: int = 2):
+        """Run dummy batches so first real requests don't pay graph compilation"""
+        import numpy as np
+        blank = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.classify([blank] * CLASSIFIER_BATCH_SIZE)
+
+_classifier = None
+
+def get_classifier() -> DefectClassifier:
+    """Process-wide classifier, loaded on first use"""
+    global _classifier
+    if _classifier is None:
+        _classifier = DefectClassifier()
+    return _classifier
+
+def confusion_counts(expected: List[str], predicted: List[str], classes: Optional[List[str]] = None) -> dict:
+    """Per-class support, recall and precision for a labelled prediction run"""
+    classes = classes or CLASSIFIER_CLASSES
+    stats = {}
+    for cls in classes:
+        tp = sum(1 for e, p in zip(expected, predicted) if e == cls and p == cls)
+        support = sum(1 for e in expected if e == cls)
+        predicted_n = sum(1 for p in predicted if p == cls)
+        stats[cls] = {
+            "support": support,
+            "recall": tp / support if support else None,
+            "precision": tp / predicted_n if predicted_n else None,
+        }
+    return stats
@@ -0,0 +1,171 @@
+"""
+Dashboard service - Home-screen payloads for customers and pilots in one request
+Each role's dashboard (counts, the next inspections and recent reports) is
+built from one read session with a few statements, independent aggregates
+folded into one of them, and cached per user for DASHBOARD_CACHE_TTL_SECONDS.
+Writes that change what a dashboard shows drop it: inspection writes drop
+their customer's and pilot's, batch writes (dispatch, sync, archive) drop all.
+The pending pool every pilot sees is cached once and shared.
+"""
+import os
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.database import REPLICA_MAX_LAG_SECONDS, engine
+from app.models import Inspection, Report
+from app.services.cache import TTLCache
+from app.services.storage_service import StorageService, get_storage_service
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "10000"))
+DASHBOARD_LIST_SIZE = int(os.getenv("DASHBOARD_LIST_SIZE", "5"))
+COST_SAVED_PER_INSPECTION = 500  # Placeholder: $ saved per completed drone inspection vs a manual one
+
+OPEN_STATUSES = ("pending", "scheduled")
+_PENDING_POOL = "pending"
+
+_cache = TTLCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL_SECONDS)  # user ID or _PENDING_POOL -> section
+# Keys dropped within the replica lag window: a rebuild read from a replica may predate the write, so it isn't cached
+_recently_invalidated = TTLCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=REPLICA_MAX_LAG_SECONDS)
+
+def invalidate_dashboards(user_ids: Optional[Iterable[Optional[int]]] = None):
+    """
+    Drop cached dashboards after a write: the given users' (None entries ignored), or everyone's
+
+    The shared pending pool is dropped either way.
+    """
+    if user_ids is None:
+        _cache.clear()
+        _recently_invalidated.set("*", True)
+        return
+    for key in [_PENDING_POOL, *(user_id for user_id in user_ids if user_id is not None)]:
+        _cache.pop(key)
+        _recently_invalidated.set(key, True)
+
+_INSPECTION_COLUMNS = (
+    Inspection.id, Inspection.location, Inspection.package, Inspection.status, Inspection.analysis_status,
+    Inspection.scheduled_date, Inspection.customer_id, Inspection.pilot_id, Inspection.latitude, Inspection.longitude,
+)
+
+class DashboardService:
+    """Service class for the per-role home-screen payloads"""
+
+    def __init__(self, db: Session, storage: StorageService = None):
+        self.db = db
+        self.storage = storage or get_storage_service()
+
+    def get_dashboard(self, user_id: int, role: str) -> dict:
+        """
+        The user's home-screen payload, from the cache when fresh
+
+        Args:
+            user_id: Current user ID
+            role: customer or pilot
+
+        Returns:
+            Customer: analytics, status_counts, upcoming inspections and recent_reports.
+            Pilot: counts, assigned inspections and the available (pending) pool.
+        """
+        if role == "customer":
+            return self._cached(user_id, lambda: self._customer(user_id))
+        return {**self._cached(user_id, lambda: self._pilot(user_id)), **self._cached(_PENDING_POOL, self._pending_pool)}
+
+    def _cached(self, key, build) -> dict:
+        section = _cache.get(key)
+        if section is None:
+            section = build()
+            # A replica may not have caught up with a write that just invalidated this key
+            lagging = self.db.get_bind() is not engine and (
+                _recently_invalidated.get(key) or _recently_invalidated.get("*")
+            )
+            if not lagging:
+                _cache.set(key, section)
+        return section
+
+    def _customer(self, customer_id: int) -> dict:
+        counts = self.db.execute(
+            select(
+                Inspection.status, func.count(),
+                func.min(case((Inspection.status == "pending", Inspection.scheduled_date)))
+            )
+            .where(Inspection.customer_id == customer_id)
+            .group_by(Inspection.status)
+        ).all()
+        upcoming = self.db.execute(
+            select(*_INSPECTION_COLUMNS)
+            .where(Inspection.customer_id == customer_id, Inspection.status.in_(OPEN_STATUSES))
+            .order_by(Inspection.scheduled_date.asc(), Inspection.id)
+            .limit(DASHBOARD_LIST_SIZE)
+        ).mappings().all()
+        reports = [dict(row) for row in self.db.execute(
+            select(
+                Report.id, Report.inspection_id, Report.title, Report.defect_classification, Report.confidence,
+                Report.image_url, Report.created_at, Inspection.location
+            )
+            .join(Inspection, Report.inspection_id == Inspection.id)
+            .where(Inspection.customer_id == customer_id)
+            .order_by(Report.created_at.desc(), Report.id.desc())
+            .limit(DASHBOARD_LIST_SIZE)
+        ).mappings()]
+        self._sign(reports)
+
+        status_counts = {status: count for status, count, _ in counts}
+        next_booking = min((first for _, _, first in counts if first is not None), default=None)
+        return {
+            "role": "customer",
+            "generated_at": datetime.utcnow(),
+            "analytics": {
+                "total_inspections": sum(status_counts.values()),
+                "completed": status_counts.get("completed", 0),
+                "cost_saved": status_counts.get("completed", 0) * COST_SAVED_PER_INSPECTION,
+                "next_booking_date": next_booking,
+            },
+            "status_counts": status_counts,
+            "upcoming": [dict(row) for row in upcoming],
+            "recent_reports": reports,
+        }
+
+    def _pilot(self, pilot_id: int) -> dict:
+        counts = self.db.execute(
+            select(
+                func.count(case((Inspection.status.in_(OPEN_STATUSES), 1))),
+                func.count(case((Inspection.status == "completed", 1))),
+                func.count(case((Inspection.analysis_status == "processing", 1))),
+            )
+            .where(Inspection.pilot_id == pilot_id)
+        ).one()
+        assigned = self.db.execute(
+            select(*_INSPECTION_COLUMNS)
+            .where(Inspection.pilot_id == pilot_id, Inspection.status.in_(OPEN_STATUSES))
+            .order_by(Inspection.scheduled_date.asc(), Inspection.id)
+            .limit(DASHBOARD_LIST_SIZE)
+        ).mappings().all()
+        return {
+            "role": "pilot",
+            "generated_at": datetime.utcnow(),
+            "counts": {"assigned": counts[0], "completed": counts[1], "analysis_processing": counts[2]},
+            "assigned": [dict(row) for row in assigned],
+        }
+
+    def _pending_pool(self) -> dict:
+        """Pending inspections open to every pilot, and how many there are (one statement)"""
+        rows = self.db.execute(
+            select(*_INSPECTION_COLUMNS, func.count().over().label("total"))
+            .where(Inspection.status == "pending")
+            .order_by(Inspection.scheduled_date.asc(), Inspection.id)
+            .limit(DASHBOARD_LIST_SIZE)
+        ).mappings().all()
+        return {
+            "available_count": rows[0]["total"] if rows else 0,
+            "available": [{key: value for key, value in row.items() if key != "total"} for row in rows],
+        }
+
+    def _sign(self, reports: List[dict]):
+        """Swap stored image paths for signed URLs, one batch for the list"""
+        pending = [report for report in reports if report["image_url"] and not report["image_url"].startswith("http")]
+        signed = self.storage.get_signed_urls([report["image_url"] for report in pending])
+        for report in pending:
+            report["image_url"] = signed.get(report["image_url"]) or report["image_url"]
@@ -0,0 +1,246 @@
+"""
+Dispatch service - Batch assignment of the pending backlog to available pilots
+Builds inspection x pilot cost matrices with NumPy (distance, schedule urgency,
+package tier), solves the assignment and applies it with one conditional
+executemany UPDATE.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Inspection, User
+from app.services.inspection_service import invalidate_inspections
+from app.services.history_service import make_event, record_transitions
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # Exact solving is optional; the greedy solver covers large batches
+    linear_sum_assignment = None
+
+PILOT_MAX_ACTIVE = int(os.getenv("PILOT_MAX_ACTIVE", "5"))  # Scheduled jobs a pilot may hold
+DISPATCH_MAX_DISTANCE_KM = float(os.getenv("DISPATCH_MAX_DISTANCE_KM", "500"))
+DISPATCH_CANDIDATES = 16  # Nearest pilots considered per inspection by the greedy solver
+EXACT_SOLVER_MAX_CELLS = 4_000_000  # inspections x pilot slots handed to linear_sum_assignment
+
+# Priority bonuses expressed in km of travel a job is "worth" skipping ahead of others
+TIER_BONUS_KM = {"Basic": 0.0, "Advanced": 25.0, "Premium": 50.0, "Elite": 100.0}
+URGENCY_BONUS_KM = 150.0  # Full bonus for jobs due now or overdue
+URGENCY_HORIZON_DAYS = 14.0
+
+EARTH_RADIUS_KM = 6371.0
+_ROW_CHUNK = 2048  # Inspection rows per distance block; bounds memory at 10k x 1k
+
+def _great_circle_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))).astype(np.float32)
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Pairwise great-circle distance between (n,) and (m,) coordinate arrays -> (n, m)"""
+    return _great_circle_km(lat1[:, None], lon1[:, None], lat2[None, :], lon2[None, :])
+
+def priority_bonus(packages, scheduled_dates, now: datetime) -> np.ndarray:
+    """Per-inspection bonus (km) from package tier and how soon the job is due"""
+    tier = np.array([TIER_BONUS_KM.get(p, 0.0) for p in packages], dtype=np.float32)
+    days_left = np.array([
+        (d.replace(tzinfo=None) - now).total_seconds() / 86400 if d else URGENCY_HORIZON_DAYS
+        for d in scheduled_dates
+    ], dtype=np.float32)
+    urgency = URGENCY_BONUS_KM * np.clip(1 - days_left / URGENCY_HORIZON_DAYS, 0, 1)
+    return tier + urgency
+
+def solve_greedy(
+    inspection_coords: np.ndarray,
+    pilot_coords: np.ndarray,
+    bonus: np.ndarray,
+    capacity: np.ndarray,
+    max_distance_km: float = DISPATCH_MAX_DISTANCE_KM,
+    candidates: int = DISPATCH_CANDIDATES
+) -> np.ndarray:
+    """
+    Capacity-aware greedy assignment over each inspection's nearest pilots
+
+    Distances are computed in row blocks and only the k nearest pilots per
+    inspection are kept, so memory is O(n * k). Candidate pairs are then
+    taken cheapest-first while pilots have capacity left.
+
+    Returns:
+        Pilot index per inspection, -1 where unassigned
+    """
+    n, m = len(inspection_coords), len(pilot_coords)
+    assignment = np.full(n, -1, dtype=np.int64)
+    if n == 0 or m == 0:
+        return assignment
+
+    k = min(candidates, m)
+    cand_pilot = np.empty((n, k), dtype=np.int64)
+    cand_dist = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, _ROW_CHUNK):
+        block = slice(start, min(start + _ROW_CHUNK, n))
+        dist = haversine_km(inspection_coords[block, 0], inspection_coords[block, 1], pilot_coords[:, 0], pilot_coords[:, 1])
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k] if k < m else np.tile(np.arange(m), (dist.shape[0], 1))
+        cand_pilot[block] = nearest
+        cand_dist[block] = np.take_along_axis(dist, nearest, axis=1)
+
+    rows = np.repeat(np.arange(n), k)
+    pilots = cand_pilot.ravel()
+    dist = cand_dist.ravel()
+    cost = dist - bonus[rows]
+    keep = dist <= max_distance_km
+    order = np.argsort(cost[keep], kind="stable")
+    rows, pilots = rows[keep][order], pilots[keep][order]
+
+    remaining = capacity.astype(np.int64).copy()
+    for row, pilot in zip(rows.tolist(), pilots.tolist()):
+        if assignment[row] < 0 and remaining[pilot] > 0:
+            assignment[row] = pilot
+            remaining[pilot] -= 1
+    return assignment
+
+def solve_exact(
+    inspection_coords: np.ndarray,
+    pilot_coords: np.ndarray,
+    bonus: np.ndarray,
+    capacity: np.ndarray,
+    max_distance_km: float = DISPATCH_MAX_DISTANCE_KM
+) -> np.ndarray:
+    """
+    Minimum-cost assignment via linear_sum_assignment over pilot capacity slots
+
+    Returns:
+        Pilot index per inspection, -1 where unassigned
+    """
+    n = len(inspection_coords)
+    assignment = np.full(n, -1, dtype=np.int64)
+    slots = np.repeat(np.arange(len(pilot_coords)), capacity.astype(np.int64))
+    if n == 0 or len(slots) == 0:
+        return assignment
+
+    dist = haversine_km(inspection_coords[:, 0], inspection_coords[:, 1], pilot_coords[:, 0], pilot_coords[:, 1])
+    cost = dist - bonus[:, None]
+    # Pairs out of range get a prohibitive cost and are dropped after solving
+    forbidden = dist > max_distance_km
+    cost[forbidden] = np.float32(1e9)
+    slot_cost = cost[:, slots]
+    rows, cols = linear_sum_assignment(slot_cost)
+    valid = ~forbidden[rows, slots[cols]]
+    assignment[rows[valid]] = slots[cols[valid]]
+    return assignment
+
+class DispatchService:
+    """Service class for batch pilot assignment"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def dispatch(self, solver: str = "auto", dry_run: bool = False, limit: Optional[int] = None) -> dict:
+        """
+        Assign pending inspections to pilots with free capacity
+
+        Args:
+            solver: "greedy", "exact" (needs scipy) or "auto"
+            dry_run: Compute the plan without writing it
+            limit: Cap on pending inspections considered (oldest scheduled first)
+
+        Returns:
+            Summary with counts, mean distance and the applied assignments
+        """
+        now = datetime.utcnow()
+        backlog = self.db.execute(
+            select(Inspection.id, Inspection.latitude, Inspection.longitude,
+                   Inspection.package, Inspection.scheduled_date)
+            .where(Inspection.status == "pending", Inspection.latitude.isnot(None), Inspection.longitude.isnot(None))
+            .order_by(Inspection.scheduled_date)
+            .limit(limit)
+        ).all()
+
+        active = (
+            select(Inspection.pilot_id, func.count().label("active"))
+            .where(Inspection.status == "scheduled")
+            .group_by(Inspection.pilot_id)
+            .subquery()
+        )
+        pilots = self.db.execute(
+            select(User.id, User.latitude, User.longitude, func.coalesce(active.c.active, 0))
+            .outerjoin(active, active.c.pilot_id == User.id)
+            .where(User.role == "pilot", User.latitude.isnot(None), User.longitude.isnot(None))
+        ).all()
+        pilots = [p for p in pilots if p[3] < PILOT_MAX_ACTIVE]
+
+        summary = {"pending": len(backlog), "available_pilots": len(pilots), "assigned": 0, "solver": solver}
+        if not backlog or not pilots:
+            summary["assignments"] = []
+            return summary
+
+        inspection_coords = np.array([(b.latitude, b.longitude) for b in backlog], dtype=np.float64)
+        pilot_coords = np.array([(p[1], p[2]) for p in pilots], dtype=np.float64)
+        capacity = np.array([PILOT_MAX_ACTIVE - p[3] for p in pilots], dtype=np.int64)
+        bonus = priority_bonus([b.package for b in backlog], [b.scheduled_date for b in backlog], now)
+
+        if solver == "auto":
+            fits = len(backlog) * int(capacity.sum()) <= EXACT_SOLVER_MAX_CELLS
+            solver = "exact" if linear_sum_assignment is not None and fits else "greedy"
+        if solver == "exact" and linear_sum_assignment is None:
+            raise RuntimeError("Exact dispatch requires scipy")
+        solve = solve_exact if solver == "exact" else solve_greedy
+        assignment = solve(inspection_coords, pilot_coords, bonus, capacity)
+
+        chosen = np.flatnonzero(assignment >= 0)
+        matched = pilot_coords[assignment[chosen]]
+        distances = _great_circle_km(
+            inspection_coords[chosen, 0], inspection_coords[chosen, 1], matched[:, 0], matched[:, 1]
+        )
+        plan = [
+            {"inspection_id": backlog[i].id, "pilot_id": pilots[assignment[i]][0], "distance_km": round(float(d), 1)}
+            for i, d in zip(chosen.tolist(), distances.tolist())
+        ]
+
+        summary["solver"] = solver
+        summary["assigned"] = len(plan) if dry_run else self._apply(plan, now)
+        summary["mean_distance_km"] = round(float(distances.mean()), 1) if len(distances) else None
+        summary["assignments"] = plan
+        return summary
+
+    def _apply(self, plan: list, now: datetime) -> int:
+        """
+        Write the plan with one executemany UPDATE
+
+        The status guard means jobs a pilot claimed manually in the meantime
+        are left alone.
+        """
+        if not plan:
+            return 0
+        statement = (
+            update(Inspection.__table__)
+            .where(and_(
+                Inspection.__table__.c.id == bindparam("b_inspection_id"),
+                Inspection.__table__.c.status == "pending"
+            ))
+            .values(pilot_id=bindparam("b_pilot_id"), status="scheduled", assigned_at=now)
+        )
+        result = self.db.connection().execute(statement, [
+            {"b_inspection_id": p["inspection_id"], "b_pilot_id": p["pilot_id"]} for p in plan
+        ])
+        self.db.commit()
+        invalidate_inspections(p["inspection_id"] for p in plan)
+
+        applied = plan
+        if 0 <= result.rowcount < len(plan):
+            # Some jobs were claimed meanwhile; log only the rows this update changed
+            mine = set(self.db.execute(
+                select(Inspection.id, Inspection.pilot_id).where(
+                    Inspection.id.in_([p["inspection_id"] for p in plan]), Inspection.assigned_at == now
+                )
+            ).tuples())
+            applied = [p for p in plan if (p["inspection_id"], p["pilot_id"]) in mine]
+        record_transitions(
+            make_event(p["inspection_id"], "scheduled", "pending", source="dispatch") for p in applied
+        )
+        return result.rowcount if result.rowcount >= 0 else len(plan)
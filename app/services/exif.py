@@ -0,0 +1,165 @@
+"""
+EXIF/XMP header reader for drone frames
+Walks the JPEG marker segments up to the start of scan and parses only the
+APP1 EXIF (GPS, timestamp) and XMP (DJI gimbal / altitude) payloads; pixel
+data is never read or decoded.
+"""
+import re
+import struct
+from datetime import datetime
+from typing import BinaryIO, Optional, Union
+
+_EXIF_HEADER = b"Exif\x00\x00"
+_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+
+_TAG_EXIF_IFD = 0x8769
+_TAG_GPS_IFD = 0x8825
+_TAG_DATETIME = 0x0132
+_TAG_DATETIME_ORIGINAL = 0x9003
+
+_GPS_LATITUDE_REF, _GPS_LATITUDE = 1, 2
+_GPS_LONGITUDE_REF, _GPS_LONGITUDE = 3, 4
+_GPS_ALTITUDE_REF, _GPS_ALTITUDE = 5, 6
+
+# TIFF type -> (struct code, size)
+_TYPES = {1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("L", 4), 5: ("LL", 8), 7: ("B", 1), 9: ("l", 4), 10: ("ll", 8)}
+
+_XMP_ATTRIBUTE = re.compile(rb'drone-dji:(\w+)="([^"]*)"')
+_XMP_ELEMENT = re.compile(rb"<drone-dji:(\w+)>([^<]*)</drone-dji:\1>")
+
+class _Tiff:
+    """Minimal TIFF IFD reader over an in-memory EXIF payload"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.endian = "<" if data[:2] == b"II" else ">"
+
+    def ifd(self, offset: int) -> dict:
+        entries = {}
+        if offset + 2 > len(self.data):
+            return entries
+        count = struct.unpack_from(self.endian + "H", self.data, offset)[0]
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            if entry + 12 > len(self.data):
+                break
+            tag, kind, n = struct.unpack_from(self.endian + "HHL", self.data, entry)
+            if kind in _TYPES:
+                entries[tag] = self._value(kind, n, entry + 8)
+        return entries
+
+    def _value(self, kind: int, n: int, field: int):
+        code, size = _TYPES[kind]
+        start = field if size * n <= 4 else struct.unpack_from(self.endian + "L", self.data, field)[0]
+        if start + size * n > len(self.data):
+            return None
+        if kind == 2:
+            return self.data[start:start + n].split(b"\x00", 1)[0].decode("ascii", "replace")
+        if kind in (5, 10):
+            pairs = struct.unpack_from(self.endian + code * n, self.data, start)
+            values = [pairs[i] / pairs[i + 1] if pairs[i + 1] else 0.0 for i in range(0, len(pairs), 2)]
+        else:
+            values = list(struct.unpack_from(self.endian + code * n, self.data, start))
+        return values[0] if n == 1 else values
+
+def _degrees(value, ref) -> Optional[float]:
+    if not isinstance(value, list) or len(value) != 3:
+        return None
+    degrees = value[0] + value[1] / 60 + value[2] / 3600
+    return -degrees if ref in ("S", "W") else degrees
+
+def _parse_exif(payload: bytes, metadata: dict):
+    tiff = _Tiff(payload)
+    ifd0 = tiff.ifd(struct.unpack_from(tiff.endian + "L", payload, 4)[0])
+
+    taken = ifd0.get(_TAG_DATETIME)
+    # IFD pointers must be single LONG offsets; skip ones stored as text, lists or unparsed values
+    if isinstance(ifd0.get(_TAG_EXIF_IFD), int):
+        taken = tiff.ifd(ifd0[_TAG_EXIF_IFD]).get(_TAG_DATETIME_ORIGINAL) or taken
+    if isinstance(taken, str):
+        try:
+            metadata["captured_at"] = datetime.strptime(taken.strip(), "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            pass
+
+    if isinstance(ifd0.get(_TAG_GPS_IFD), int):
+        gps = tiff.ifd(ifd0[_TAG_GPS_IFD])
+        metadata["latitude"] = _degrees(gps.get(_GPS_LATITUDE), gps.get(_GPS_LATITUDE_REF))
+        metadata["longitude"] = _degrees(gps.get(_GPS_LONGITUDE), gps.get(_GPS_LONGITUDE_REF))
+        altitude = gps.get(_GPS_ALTITUDE)
+        if isinstance(altitude, float):
+            metadata["altitude"] = -altitude if gps.get(_GPS_ALTITUDE_REF) == 1 else altitude
+
+def _parse_xmp(payload: bytes, metadata: dict):
+    fields = dict(_XMP_ATTRIBUTE.findall(payload))
+    fields.update(_XMP_ELEMENT.findall(payload))
+
+    def number(name):
+        try:
+            return float(fields[name]) if name in fields else None
+        except ValueError:
+            return None
+
+    for key, name in (
+        ("gimbal_pitch", b"GimbalPitchDegree"),
+        ("gimbal_yaw", b"GimbalYawDegree"),
+        ("relative_altitude", b"RelativeAltitude"),
+    ):
+        value = number(name)
+        if value is not None:
+            metadata[key] = value
+    if metadata.get("altitude") is None and number(b"AbsoluteAltitude") is not None:
+        metadata["altitude"] = number(b"AbsoluteAltitude")
+    # Some firmware only writes position into XMP ("GpsLongtitude" is DJI's spelling)
+    if metadata.get("latitude") is None:
+        metadata["latitude"] = number(b"GpsLatitude") or number(b"Latitude")
+        metadata["longitude"] = number(b"GpsLongtitude") or number(b"GpsLongitude") or number(b"Longitude")
+
+def read_frame_metadata(source: Union[str, BinaryIO]) -> dict:
+    """
+    Read capture metadata from a JPEG's header segments
+
+    Args:
+        source: File path or seekable binary file (read from its current position)
+
+    Returns:
+        Dict with any of latitude, longitude, altitude, relative_altitude,
+        gimbal_pitch, gimbal_yaw and captured_at; empty for non-JPEG input
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return read_frame_metadata(f)
+
+    metadata = {}
+    if source.read(2) != b"\xff\xd8":
+        return metadata
+
+    while True:
+        header = source.read(2)
+        if len(header) < 2 or header[0] != 0xFF:
+            break
+        marker = header[1]
+        while marker == 0xFF:  # Fill bytes
+            byte = source.read(1)
+            marker = byte[0] if byte else 0xD9
+        if marker in (0xDA, 0xD9):  # Start of scan / end of image: no more metadata
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        length_bytes = source.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack(">H", length_bytes)[0] - 2
+        if marker == 0xE1:
+            payload = source.read(length)
+            try:
+                if payload.startswith(_EXIF_HEADER):
+                    _parse_exif(payload[len(_EXIF_HEADER):], metadata)
+                elif payload.startswith(_XMP_HEADER):
+                    _parse_xmp(payload[len(_XMP_HEADER):], metadata)
+            except (struct.error, IndexError, ValueError, TypeError):
+                pass  # Corrupt metadata leaves the frame unlocated rather than failing the upload
+        else:
+            source.seek(length, 1)
+
+    return {k: v for k, v in metadata.items() if v is not None}
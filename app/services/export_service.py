@@ -0,0 +1,224 @@
+"""
+Export service - Streaming bulk export of a customer's inspections and reports
+Rows come off a server-side cursor in batches and are serialized as they
+arrive, so memory stays flat no matter how large the portfolio is. Ranges
+reaching back past the hot window include archived inspections.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from fastapi import HTTPException, status
+
+from app.models import Inspection, Report
+from app.services.archive_service import ArchiveService
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# (column name, SQL expression)
+EXPORT_COLUMNS = [
+    ("inspection_id", Inspection.id),
+    ("location", Inspection.location),
+    ("package", Inspection.package),
+    ("status", Inspection.status),
+    ("analysis_status", Inspection.analysis_status),
+    ("pilot_id", Inspection.pilot_id),
+    ("scheduled_date", Inspection.scheduled_date),
+    ("created_at", Inspection.created_at),
+    ("assigned_at", Inspection.assigned_at),
+    ("started_at", Inspection.started_at),
+    ("completed_at", Inspection.completed_at),
+    ("report_id", Report.id),
+    ("report_title", Report.title),
+    ("report_summary", Report.summary),
+    ("defect_classification", Report.defect_classification),
+    ("confidence", Report.confidence),
+    ("report_created_at", Report.created_at),
+]
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes are handed off after each row group"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+class ExportService:
+    """Service class for streaming exports"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def validate(self, export_format: str, compress: Optional[str]):
+        """
+        Reject unsupported format/compression before the response starts streaming
+
+        Raises:
+            HTTPException: 400 for unknown options or a missing optional dependency
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}"
+            )
+        if compress not in (None, "gzip"):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Compression must be 'gzip'")
+        if export_format == "parquet" and pq is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parquet export requires pyarrow on the server"
+            )
+
+    def rows(
+        self,
+        customer_id: int,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        status_filter: Optional[str] = None
+    ) -> Iterator[list]:
+        """
+        Stream export rows in batches from a server-side cursor
+
+        Yields:
+            Lists of up to EXPORT_BATCH_SIZE row tuples, ordered by inspection ID
+        """
+        archive = ArchiveService(self.db)
+        inspections = archive.with_archive(Inspection, date_from)
+        reports = archive.with_archive(Report, date_from)
+        source = {Inspection: inspections, Report: reports}
+        query = (
+            select(*[getattr(source[column.class_], column.key) for _, column in EXPORT_COLUMNS])
+            .select_from(inspections)
+            .outerjoin(reports, reports.inspection_id == inspections.id)
+            .where(inspections.customer_id == customer_id)
+        )
+        if date_from:
+            query = query.where(inspections.scheduled_date >= date_from)
+        if date_to:
+            query = query.where(inspections.scheduled_date < date_to)
+        if status_filter:
+            query = query.where(inspections.status == status_filter)
+        query = query.order_by(inspections.id).execution_options(
+            stream_results=True,
+            yield_per=EXPORT_BATCH_SIZE
+        )
+
+        result = self.db.execute(query)
+        try:
+            for batch in result.partitions():
+                yield batch
+        finally:
+            result.close()
+
+    def stream(self, batches: Iterator[list], export_format: str, compress: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Serialize row batches into the requested format
+
+        CSV and NDJSON can additionally be gzipped; Parquet uses its own
+        per-column compression instead.
+        """
+        if export_format == "parquet":
+            yield from self._parquet(batches, "gzip" if compress else "snappy")
+            return
+
+        encode = self._csv if export_format == "csv" else self._ndjson
+        if not compress:
+            yield from encode(batches)
+            return
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+        for chunk in encode(batches):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def _csv(self, batches) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([name for name, _ in EXPORT_COLUMNS])
+        for batch in batches:
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                for row in batch
+            )
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        tail = buffer.getvalue()
+        if tail:
+            yield tail.encode("utf-8")
+
+    def _ndjson(self, batches) -> Iterator[bytes]:
+        names = [name for name, _ in EXPORT_COLUMNS]
+        for batch in batches:
+            yield "".join(
+                json.dumps(dict(zip(names, row)), default=_json_default) + "\n"
+                for row in batch
+            ).encode("utf-8")
+
+    def _parquet(self, batches, compression: str) -> Iterator[bytes]:
+        schema = _arrow_schema()
+        sink = _Drain()
+        writer = pq.ParquetWriter(sink, schema, compression=compression)
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))  # One row group per batch
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+def _arrow_schema():
+    """Parquet schema derived from the SQL column types, so empty batches still type correctly"""
+    fields = []
+    for name, column in EXPORT_COLUMNS:
+        python_type = column.type.python_type
+        if python_type is int:
+            arrow_type = pa.int64()
+        elif python_type is datetime:
+            arrow_type = pa.timestamp("us", tz="UTC")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
@@ -0,0 +1,172 @@
+"""
+Frame service - Spatial index of captured drone frames
+Capture metadata is read from frame headers at upload time and stored with a
+Z-order key, so bounding-box and nearest-frame lookups per inspection are
+index range scans.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import Frame
+from app.services.dispatch_service import haversine_km
+from app.services.exif import read_frame_metadata
+
+FRAME_METADATA_WORKERS = int(os.getenv("FRAME_METADATA_WORKERS", "8"))
+NEAREST_START_RADIUS_M = 25.0
+NEAREST_MAX_RADIUS_M = float(os.getenv("NEAREST_MAX_RADIUS_M", "5000"))
+METERS_PER_DEGREE = 111_320.0
+
+FRAME_COLUMNS = (
+    "latitude", "longitude", "altitude", "relative_altitude", "gimbal_pitch", "gimbal_yaw", "captured_at",
+    "video_path", "video_offset",
+)
+
+def _spread_bits(value: int) -> int:
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+def geokey(latitude: float, longitude: float) -> int:
+    """
+    Morton code of a position (31 bits per axis, ~1 cm resolution)
+
+    Monotone in both coordinates, so every point inside a bounding box has a
+    key between the keys of the box's south-west and north-east corners.
+    """
+    scale = (1 << 31) - 1
+    lat = int((min(max(latitude, -90.0), 90.0) + 90.0) / 180.0 * scale)
+    lon = int((min(max(longitude, -180.0), 180.0) + 180.0) / 360.0 * scale)
+    return (_spread_bits(lat) << 1) | _spread_bits(lon)
+
+class FrameService:
+    """Service class for frame metadata ingest and spatial queries"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def read_metadata(sources: List[Union[str, object]]) -> List[dict]:
+        """
+        Read capture metadata from many frames' headers in parallel
+
+        Args:
+            sources: File paths or seekable binary files (rewound before reading)
+        """
+        def read(source):
+            if hasattr(source, "seek"):
+                source.seek(0)
+            return read_frame_metadata(source)
+
+        with ThreadPoolExecutor(max_workers=FRAME_METADATA_WORKERS) as pool:
+            return list(pool.map(read, sources))
+
+    def index_frames(self, inspection_id: int, frames: List[dict]) -> int:
+        """
+        Insert frame rows with one executemany (caller commits)
+
+        Args:
+            inspection_id: Inspection the frames belong to
+            frames: Dicts with storage_path, original_name and read_metadata() fields
+                (or video_path/video_offset for keyframes); files without any
+                metadata (not JPEG frames) are skipped
+
+        Returns:
+            Number of frames indexed
+        """
+        rows = []
+        for frame in frames:
+            if not any(frame.get(column) is not None for column in FRAME_COLUMNS):
+                continue
+            located = frame.get("latitude") is not None and frame.get("longitude") is not None
+            rows.append({
+                "inspection_id": inspection_id,
+                "storage_path": frame["storage_path"],
+                "original_name": frame.get("original_name"),
+                "geokey": geokey(frame["latitude"], frame["longitude"]) if located else None,
+                **{column: frame.get(column) for column in FRAME_COLUMNS},
+            })
+        if rows:
+            self.db.execute(insert(Frame), rows)
+        return len(rows)
+
+    def get_bounds(self, inspection_id: int) -> dict:
+        """Bounding box and count of an inspection's located frames"""
+        row = self.db.execute(
+            select(
+                func.count(Frame.id), func.min(Frame.latitude), func.min(Frame.longitude),
+                func.max(Frame.latitude), func.max(Frame.longitude)
+            ).where(Frame.inspection_id == inspection_id, Frame.geokey.isnot(None))
+        ).one()
+        return {"frames": row[0], "min_lat": row[1], "min_lon": row[2], "max_lat": row[3], "max_lon": row[4]}
+
+    def _in_box(self, inspection_id: int, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+        return select(Frame).where(
+            Frame.inspection_id == inspection_id,
+            Frame.geokey.between(geokey(min_lat, min_lon), geokey(max_lat, max_lon)),
+            Frame.latitude.between(min_lat, max_lat),
+            Frame.longitude.between(min_lon, max_lon),
+        )
+
+    def get_frames(
+        self,
+        inspection_id: int,
+        min_lat: Optional[float] = None,
+        min_lon: Optional[float] = None,
+        max_lat: Optional[float] = None,
+        max_lon: Optional[float] = None,
+        limit: int = 1000
+    ) -> List[Frame]:
+        """
+        Frames of an inspection, optionally only those inside a bounding box
+
+        Returns:
+            Frames ordered by capture time
+        """
+        if None in (min_lat, min_lon, max_lat, max_lon):
+            query = select(Frame).where(Frame.inspection_id == inspection_id)
+        else:
+            query = self._in_box(inspection_id, min_lat, min_lon, max_lat, max_lon)
+        return self.db.scalars(query.order_by(Frame.captured_at, Frame.id).limit(limit)).all()
+
+    def get_nearest(self, inspection_id: int, latitude: float, longitude: float, k: int = 1) -> List[Frame]:
+        """
+        The k frames closest to a point, searched in growing boxes around it
+
+        Each round queries the box of half-width `radius`; results are final
+        once k frames lie within `radius` (the box's inscribed circle).
+
+        Returns:
+            Frames ordered by distance, each with distance_m set (empty if none
+            lie within NEAREST_MAX_RADIUS_M)
+        """
+        radius = NEAREST_START_RADIUS_M
+        while True:
+            dlat = radius / METERS_PER_DEGREE
+            dlon = dlat / max(math.cos(math.radians(latitude)), 1e-6)
+            frames = self.db.scalars(self._in_box(
+                inspection_id, latitude - dlat, longitude - dlon, latitude + dlat, longitude + dlon
+            )).all()
+            if frames:
+                distances = haversine_km(
+                    np.array([latitude]), np.array([longitude]),
+                    np.array([f.latitude for f in frames]), np.array([f.longitude for f in frames])
+                )[0] * 1000
+                ranked = sorted(
+                    ((float(d), f) for d, f in zip(distances, frames) if d <= radius), key=lambda pair: pair[0]
+                )
+                if len(ranked) >= k or radius >= NEAREST_MAX_RADIUS_M:
+                    for distance, frame in ranked[:k]:
+                        frame.distance_m = round(distance, 1)
+                    return [frame for _, frame in ranked[:k]]
+            elif radius >= NEAREST_MAX_RADIUS_M:
+                return []
+            radius = min(radius * 4, NEAREST_MAX_RADIUS_M)
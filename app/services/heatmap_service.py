@@ -0,0 +1,165 @@
+"""
+Heatmap service - Defect density map tiles (z/x/y, Web Mercator) per inspection
+An inspection's findings are projected once into NumPy arrays; tiles are
+binned from those arrays on demand and kept in a bounded cache. Creating a
+report invalidates only that inspection's points and tiles.
+"""
+import json
+import math
+import os
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import DEFECT_CLASSES, Finding
+from app.services.cache import TTLCache
+
+TILE_SIZE = 256
+HEATMAP_CELL_PX = int(os.getenv("HEATMAP_CELL_PX", "16"))  # Aggregation cell edge in tile pixels
+HEATMAP_MAX_ZOOM = 22
+HEATMAP_CACHE_TTL_SECONDS = float(os.getenv("HEATMAP_CACHE_TTL_SECONDS", "300"))
+HEATMAP_FORMATS = {"png": "image/png", "geojson": "application/geo+json"}
+
+_points = TTLCache(maxsize=int(os.getenv("HEATMAP_POINT_CACHE_SIZE", "64")), ttl=HEATMAP_CACHE_TTL_SECONDS)
+_tiles = TTLCache(maxsize=int(os.getenv("HEATMAP_TILE_CACHE_SIZE", "4096")), ttl=HEATMAP_CACHE_TTL_SECONDS)
+_scales = TTLCache(maxsize=1024, ttl=HEATMAP_CACHE_TTL_SECONDS)
+
+def invalidate_inspection(inspection_id: int):
+    """Drop cached points and tiles of one inspection after its findings changed"""
+    _points.pop(inspection_id)
+    _tiles.discard_where(lambda key: key[0] == inspection_id)
+    _scales.discard_where(lambda key: key[0] == inspection_id)
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal RGBA PNG encoder (no imaging library needed)"""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # Leading filter byte 0 per row
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b"")
+
+def _tile_bounds(z: int, x: int, y: int, cell: int, cells: int) -> list:
+    """[west, south, east, north] of one cell inside a tile"""
+    n = 2 ** z * cells
+
+    def lon(ix):
+        return ix / n * 360 - 180
+
+    def lat(iy):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * iy / n))))
+
+    col, row = cell % cells, cell // cells
+    gx, gy = x * cells + col, y * cells + row
+    return [lon(gx), lat(gy + 1), lon(gx + 1), lat(gy)]
+
+class HeatmapService:
+    """Service class for defect heatmap tiles"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _load_points(self, inspection_id: int):
+        """Findings of an inspection as normalised Mercator x/y and class index arrays"""
+        def load():
+            rows = self.db.execute(
+                select(Finding.latitude, Finding.longitude, Finding.defect_class).where(
+                    Finding.inspection_id == inspection_id,
+                    Finding.latitude.isnot(None), Finding.longitude.isnot(None)
+                )
+            ).all()
+            lat = np.clip(np.array([r[0] for r in rows], dtype=np.float64), -85.05112878, 85.05112878)
+            lon = np.array([r[1] for r in rows], dtype=np.float64)
+            xs = (lon + 180.0) / 360.0
+            ys = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+            index = {name: i for i, name in enumerate(DEFECT_CLASSES)}
+            classes = np.array([index.get(r[2], -1) for r in rows], dtype=np.int16)
+            return xs, ys, classes
+        return _points.get_or_set(inspection_id, load)
+
+    def _cells(self, points, z: int, defect_class: Optional[str]):
+        """Global cell column/row and class of every (matching) point at zoom z"""
+        xs, ys, classes = points
+        if defect_class:
+            keep = classes == DEFECT_CLASSES.index(defect_class)
+            xs, ys, classes = xs[keep], ys[keep], classes[keep]
+        n = 2 ** z * (TILE_SIZE // HEATMAP_CELL_PX)
+        gx = np.minimum((xs * n).astype(np.int64), n - 1)
+        gy = np.minimum((ys * n).astype(np.int64), n - 1)
+        return gx, gy, classes
+
+    def _scale(self, inspection_id: int, points, z: int, defect_class: Optional[str]) -> int:
+        """Busiest cell count at this zoom, so colours match across neighbouring tiles"""
+        def compute():
+            gx, gy, _ = self._cells(points, z, defect_class)
+            if len(gx) == 0:
+                return 1
+            _, counts = np.unique(gx * (2 ** (z + 8)) + gy, return_counts=True)
+            return int(counts.max())
+        return _scales.get_or_set((inspection_id, z, defect_class), compute)
+
+    def get_tile(self, inspection_id: int, z: int, x: int, y: int, fmt: str = "png", defect_class: Optional[str] = None) -> bytes:
+        """
+        One heatmap tile
+
+        Args:
+            inspection_id: Inspection whose findings are mapped
+            z, x, y: Slippy-map tile address
+            fmt: "png" (raster heat) or "geojson" (cell polygons with per-class counts)
+            defect_class: Only map one class
+
+        Returns:
+            Encoded tile body
+        """
+        key = (inspection_id, z, x, y, fmt, defect_class)
+        generation = _tiles.generation  # A tile rendered from points invalidated meanwhile isn't kept
+        tile = _tiles.get(key)
+        if tile is None:
+            tile = self._render(inspection_id, z, x, y, fmt, defect_class)
+            _tiles.set(key, tile, generation=generation)
+        return tile
+
+    def _render(self, inspection_id: int, z: int, x: int, y: int, fmt: str, defect_class: Optional[str]) -> bytes:
+        points = self._load_points(inspection_id)
+        cells = TILE_SIZE // HEATMAP_CELL_PX
+        gx, gy, classes = self._cells(points, z, defect_class)
+        inside = (gx >= x * cells) & (gx < (x + 1) * cells) & (gy >= y * cells) & (gy < (y + 1) * cells)
+        local = (gy[inside] - y * cells) * cells + (gx[inside] - x * cells)
+
+        if fmt == "geojson":
+            counts = np.zeros((cells * cells, len(DEFECT_CLASSES)), dtype=np.int64)
+            known = classes[inside] >= 0
+            np.add.at(counts, (local[known], classes[inside][known]), 1)
+            features = [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Polygon", "coordinates": [[
+                        [w, s], [e, s], [e, n], [w, n], [w, s]
+                    ]]},
+                    "properties": {
+                        "total": int(counts[cell].sum()),
+                        **{name: int(counts[cell, i]) for i, name in enumerate(DEFECT_CLASSES) if counts[cell, i]},
+                    },
+                }
+                for cell in np.flatnonzero(counts.sum(axis=1)).tolist()
+                for w, s, e, n in [_tile_bounds(z, x, y, cell, cells)]
+            ]
+            return json.dumps({"type": "FeatureCollection", "features": features}).encode()
+
+        totals = np.bincount(local, minlength=cells * cells).reshape(cells, cells)
+        t = np.log1p(totals) / math.log1p(self._scale(inspection_id, points, z, defect_class))
+        rgba = np.zeros((cells, cells, 4), dtype=np.uint8)
+        occupied = totals > 0
+        rgba[..., 0] = 255
+        rgba[..., 1] = (255 * (1 - t)).astype(np.uint8)  # Yellow -> red as density rises
+        rgba[..., 3] = np.where(occupied, 90 + 165 * t, 0).astype(np.uint8)
+        rgba[~occupied] = 0
+        pixels = np.repeat(np.repeat(rgba, HEATMAP_CELL_PX, axis=0), HEATMAP_CELL_PX, axis=1)
+        return encode_png(pixels)
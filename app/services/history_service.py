@@ -0,0 +1,312 @@
+"""
+History service - Append-only log of inspection status transitions
+Transitions are recorded after the request's own transaction commits and are
+handed to a background writer thread, which inserts them in batches with its
+own session. The request path only appends to an in-memory queue.
+
+Delivery is at-least-once: a batch leaves the buffer only after its INSERT
+commits, batches failing for transient reasons are retried with backoff, and
+every event carries a UUID so a retried batch that had in fact committed is not
+stored twice. A batch that can never commit (an integrity or data error, such
+as an event for an inspection deleted or archived meanwhile) is split until the
+offending events are isolated; those are dead-lettered (logged and kept in
+HistoryWriter.dead_letters) and the rest are written. The buffer is bounded;
+when it is full, callers wait up to HISTORY_ENQUEUE_TIMEOUT_SECONDS and then
+write their event inline. Callers on the event loop never wait: their overflow
+is written on a worker thread.
+"""
+import asyncio
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import InspectionEvent
+from app.services.archive_service import ArchiveService
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WRITER_MODE = os.getenv("HISTORY_WRITER_MODE", "async")  # async, inline or off
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "10000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "0.2"))
+HISTORY_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT_SECONDS", "1"))
+HISTORY_RETRY_MAX_SECONDS = 30.0
+HISTORY_DEAD_LETTER_SIZE = int(os.getenv("HISTORY_DEAD_LETTER_SIZE", "1000"))  # Unstorable events kept for inspection
+
+_STOP = object()
+
+def make_event(
+    inspection_id: int,
+    to_value: str,
+    from_value: Optional[str] = None,
+    actor_id: Optional[int] = None,
+    source: str = "status",
+    field: str = "status"
+) -> dict:
+    """One transition row, stamped with its id and time now"""
+    return {
+        "event_id": str(uuid.uuid4()),
+        "inspection_id": inspection_id,
+        "field": field,
+        "from_value": from_value,
+        "to_value": to_value,
+        "actor_id": actor_id,
+        "source": source,
+        "occurred_at": datetime.utcnow(),
+    }
+
+def write_events(db: Session, events: List[dict]) -> int:
+    """
+    Insert events with one executemany and commit, skipping ids already stored
+
+    Returns:
+        Number of rows inserted
+    """
+    try:
+        db.execute(insert(InspectionEvent), events)
+        db.commit()
+        return len(events)
+    except SQLAlchemyError:
+        db.rollback()
+        # A redelivered batch may already be (partly) stored; insert only what's missing
+        stored = set(db.scalars(
+            select(InspectionEvent.event_id).where(InspectionEvent.event_id.in_([e["event_id"] for e in events]))
+        ))
+        if not stored:
+            raise
+        missing = [e for e in events if e["event_id"] not in stored]
+        if missing:
+            db.execute(insert(InspectionEvent), missing)
+        db.commit()
+        return len(missing)
+
+class HistoryWriter:
+    """
+    Bounded buffer of events plus the thread that flushes it in batches
+
+    Args:
+        session_factory: Creates the writer's own sessions
+        buffer_size: Events held before producers are pushed back
+        batch_size: Most events per INSERT
+        flush_interval: Seconds the first event of a batch may wait for company
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        buffer_size: int = HISTORY_BUFFER_SIZE,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._deadline = None  # Set by close(): retrying stops being worth it after this
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.inline_writes = 0
+        self.dead_lettered = 0
+        self.dead_letters = deque(maxlen=HISTORY_DEAD_LETTER_SIZE)  # Most recent events that could never be stored
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._deadline = None
+                    self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, events: Iterable[dict]):
+        """
+        Buffer events for the writer thread
+
+        Blocks while the buffer is full; after HISTORY_ENQUEUE_TIMEOUT_SECONDS
+        the remaining events are written on the caller's thread instead. On an
+        event loop thread (async routes) it never blocks: a full buffer sends
+        the overflow to the loop's default executor.
+        """
+        self._ensure_started()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        overflow = []
+        for event in events:
+            if overflow:
+                overflow.append(event)
+                continue
+            try:
+                if loop is None:
+                    self._queue.put(event, timeout=HISTORY_ENQUEUE_TIMEOUT_SECONDS)
+                else:
+                    self._queue.put_nowait(event)
+            except queue.Full:
+                overflow.append(event)
+        if overflow:
+            self.inline_writes += len(overflow)
+            if loop is None:
+                self._write_inline(overflow)
+            else:
+                loop.run_in_executor(None, self._write_inline, overflow)
+
+    def _write_inline(self, events: List[dict]):
+        db = self.session_factory()
+        try:
+            self.written += write_events(db, events)
+        except SQLAlchemyError:
+            # The transition itself is committed; keep the events recoverable from the log
+            logger.exception("Could not write %d inspection events: %r", len(events), events)
+        finally:
+            db.close()
+
+    def _next_batch(self) -> tuple:
+        """Block for the first event, then gather more until full or the interval ends"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _flush(self, batch: List[dict]):
+        """Write a batch, retrying transient failures with jittered backoff until it commits"""
+        attempt = 0
+        while True:
+            db = self.session_factory()
+            rejected = None
+            try:
+                self.written += write_events(db, batch)
+                self.batches += 1
+                return
+            except (IntegrityError, DataError) as e:
+                rejected = e  # Retrying can't help: some event in the batch will never be accepted
+            except SQLAlchemyError as e:
+                attempt += 1
+                self.retries += 1
+                logger.warning("Inspection event batch failed (attempt %d), retrying: %s", attempt, e)
+            finally:
+                db.close()
+            if rejected is not None:
+                self._isolate(batch, rejected)
+                return
+            delay = random.uniform(0, min(HISTORY_RETRY_MAX_SECONDS, 0.1 * 2 ** attempt))
+            if self._deadline is not None and time.monotonic() + delay > self._deadline:
+                logger.error("Giving up on %d inspection events at shutdown: %r", len(batch), batch)
+                return
+            time.sleep(delay)
+
+    def _isolate(self, batch: List[dict], error: SQLAlchemyError):
+        """Write a rejected batch in halves until the events at fault are alone, and dead-letter those"""
+        if len(batch) == 1:
+            self.dead_lettered += 1
+            self.dead_letters.append(batch[0])
+            logger.error("Dead-lettering inspection event that can't be stored (%s): %r", error.orig, batch[0])
+            return
+        middle = len(batch) // 2
+        self._flush(batch[:middle])
+        self._flush(batch[middle:])
+
+    def _run(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._flush(batch)
+            if stop:
+                return
+
+    def close(self, timeout: float = 10.0):
+        """Flush everything buffered so far and stop the thread, retrying failures for up to timeout seconds"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._deadline = time.monotonic() + timeout
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self._queue.qsize(), "written": self.written, "batches": self.batches,
+            "retries": self.retries, "inline_writes": self.inline_writes, "dead_lettered": self.dead_lettered,
+        }
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_history_writer() -> HistoryWriter:
+    """The process-wide writer (its thread starts with the first event)"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = HistoryWriter()
+    return _writer
+
+def close_history_writer():
+    if _writer is not None:
+        _writer.close()
+
+def record_transitions(events: Iterable[dict]):
+    """
+    Log committed transitions according to HISTORY_WRITER_MODE
+
+    Call only after the transaction making the change has committed.
+    """
+    events = list(events)
+    if not events or HISTORY_WRITER_MODE == "off":
+        return
+    if HISTORY_WRITER_MODE == "inline":
+        db = SessionLocal()
+        try:
+            write_events(db, events)
+        finally:
+            db.close()
+        return
+    get_history_writer().submit(events)
+
+class HistoryService:
+    """Service class for reading the transition log"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_history(self, inspection_id: int, limit: int = 500) -> List[InspectionEvent]:
+        """
+        Transitions of one inspection, oldest first
+
+        Events reach the table within about HISTORY_FLUSH_INTERVAL_SECONDS of
+        the change; redelivered events are stored once. An archived
+        inspection's events are read from the archive.
+        """
+        events = self.db.scalars(
+            select(InspectionEvent)
+            .where(InspectionEvent.inspection_id == inspection_id)
+            .order_by(InspectionEvent.occurred_at, InspectionEvent.id)
+            .limit(limit)
+        ).all()
+        if events:
+            return events
+        archived = ArchiveService(self.db).find(InspectionEvent, [inspection_id])
+        return sorted(archived, key=lambda event: (event.occurred_at, event.id))[:limit]
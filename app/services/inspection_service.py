@@ -2,13 +2,83 @@
 Inspection service - Business logic for inspection management
 Separates database operations from API routing
 """
+import os
+from sqlalchemy import func, inspect as sa_inspect, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+from app.database import REPLICA_MAX_LAG_SECONDS, engine
 from app.models import Inspection
+from app.services.archive_service import ArchiveService
 from app.schemas import InspectionCreate
+from app.services.cache import TTLCache
+from app.services.dashboard_service import invalidate_dashboards
+from app.services.history_service import make_event, record_transitions
+from app.streaming import STREAM_BATCH_SIZE
 from fastapi import HTTPException, status
 
+# Per-process read-through cache of inspection rows (0 disables it). Entries carry
+# the row version: an older copy never replaces a newer one, and every cache hit is
+# confirmed with a one-column SELECT of the current version, so a row changed by
+# another worker process is reloaded instead of served stale. What it saves is
+# loading and building the full row, not the round trip.
+INSPECTION_CACHE_TTL_SECONDS = float(os.getenv("INSPECTION_CACHE_TTL_SECONDS", "0"))
+INSPECTION_CACHE_SIZE = int(os.getenv("INSPECTION_CACHE_SIZE", "10000"))
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))  # Most ids one batch read may ask for
+
+# version/updated_at are set by the UPDATE itself, so in-memory copies would be stale; sync reads them from the table
+_COLUMNS = [attr.key for attr in sa_inspect(Inspection).column_attrs if attr.key not in ("version", "updated_at")]
+_cache = TTLCache(maxsize=INSPECTION_CACHE_SIZE, ttl=INSPECTION_CACHE_TTL_SECONDS)
+# Rows dropped within the replica lag window: a replica read may predate the write, so it isn't cached
+_recently_invalidated = TTLCache(maxsize=INSPECTION_CACHE_SIZE, ttl=REPLICA_MAX_LAG_SECONDS)
+
+def invalidate_inspections(inspection_ids: Iterable[int], user_ids: Optional[Iterable[Optional[int]]] = None):
+    """
+    Drop cached rows after a write made outside InspectionService (reports, dispatch)
+
+    Dashboards of user_ids are dropped too; everyone's when the affected users aren't known.
+    """
+    for inspection_id in inspection_ids:
+        _cache.pop(inspection_id)
+        _recently_invalidated.set(inspection_id, True)
+    invalidate_dashboards(user_ids)
+
+def visible_to(user_id: int, role: str, entity=Inspection):
+    """
+    Filter for the inspections a user may see (None: no restriction)
+    
+    Customers see their own inspections; pilots see pending ones or those assigned to them.
+    entity may be an alias of Inspection, such as ArchiveService.with_archive's.
+    """
+    if role == "customer":
+        return entity.customer_id == user_id
+    if role == "pilot":
+        return (entity.pilot_id == user_id) | (entity.status == "pending")
+    return None
+
+def batch_ids(ids: List[int]) -> List[int]:
+    """
+    Validate the ID list of a batch read (duplicates dropped, order kept)
+    
+    Raises:
+        HTTPException: 400 if more than BATCH_MAX_IDS distinct IDs are given
+    """
+    unique = list(dict.fromkeys(ids))
+    if len(unique) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BATCH_MAX_IDS} ids per request"
+        )
+    return unique
+
+def _snapshot(inspection: Inspection) -> dict:
+    return {key: getattr(inspection, key) for key in _COLUMNS}
+
+def _detached(snapshot: dict) -> Inspection:
+    """Read-only copy of a cached row, never attached to a session"""
+    return Inspection(**snapshot)
+
 class InspectionService:
     """Service class for inspection-related operations"""
     
@@ -31,6 +101,8 @@ class InspectionService:
             location=data.location,
             scheduled_date=data.scheduled_date,
             package=data.package,
+            latitude=data.latitude,
+            longitude=data.longitude,
             status="pending",
             analysis_status="not_started"  # Will be added to model
         )
@@ -38,6 +110,9 @@ class InspectionService:
         self.db.add(inspection)
         self.db.commit()
         self.db.refresh(inspection)
+        if INSPECTION_CACHE_TTL_SECONDS:
+            _cache.set(inspection.id, _snapshot(inspection), version=inspection.version)
+        invalidate_dashboards([customer_id])
         
         return inspection
     
@@ -45,7 +120,8 @@ class InspectionService:
         self, 
         user_id: int, 
         role: str, 
-        status_filter: Optional[str] = None
+        status_filter: Optional[str] = None,
+        date_from: Optional[datetime] = None
     ) -> List[Inspection]:
         """
         List inspections based on user role
@@ -54,33 +130,71 @@ class InspectionService:
             user_id: Current user ID
             role: User role (customer/pilot)
             status_filter: Optional status filter
+            date_from: Only inspections scheduled on or after this date, archived ones included
         
         Returns:
             List of Inspection objects
         """
-        query = self.db.query(Inspection)
+        entity, criteria = self._list_criteria(user_id, role, status_filter, date_from)
+        return self.db.query(entity).filter(*criteria).order_by(entity.created_at.desc()).all()
+    
+    def iter_inspections(
+        self,
+        user_id: int,
+        role: str,
+        status_filter: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        batch_size: int = STREAM_BATCH_SIZE
+    ) -> Iterator[List[dict]]:
+        """
+        The list_inspections rows in batches off a server-side cursor, for streaming
         
-        if role == "customer":
-            # Customers see only their own inspections
-            query = query.filter(Inspection.customer_id == user_id)
-        elif role == "pilot":
-            # Pilots see pending inspections or ones assigned to them
-            query = query.filter(
-                (Inspection.pilot_id == user_id) | 
-                (Inspection.status == "pending")
-            )
+        Rows are plain column mappings rather than Inspection objects, so a long
+        list doesn't accumulate in the session while it streams.
         
+        Yields:
+            Lists of up to batch_size row mappings, newest first
+        """
+        entity, criteria = self._list_criteria(user_id, role, status_filter, date_from)
+        query = (
+            select(*[getattr(entity, key) for key in _COLUMNS])
+            .where(*criteria)
+            .order_by(entity.created_at.desc())
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        result = self.db.execute(query)
+        try:
+            for batch in result.mappings().partitions():
+                yield batch
+        finally:
+            result.close()
+    
+    def _list_criteria(self, user_id: int, role: str, status_filter: Optional[str], date_from: Optional[datetime]) -> tuple:
+        """The entity to list from (hot rows, plus the archived years date_from reaches) and its filters"""
+        entity = ArchiveService(self.db).with_archive(Inspection, date_from) if date_from else Inspection
+        criteria = []
+        scope = visible_to(user_id, role, entity)
+        if scope is not None:
+            criteria.append(scope)
         if status_filter:
-            query = query.filter(Inspection.status == status_filter)
-        
-        return query.order_by(Inspection.created_at.desc()).all()
+            criteria.append(entity.status == status_filter)
+        if date_from:
+            # The archive files rows by the later of settling and this date, so the two agree on what date_from reaches
+            criteria.append(func.coalesce(entity.scheduled_date, entity.created_at) >= date_from)
+        return entity, criteria
     
-    def get_inspection(self, inspection_id: int) -> Inspection:
+    def get_inspection(self, inspection_id: int, fresh: bool = False) -> Inspection:
         """
         Get a single inspection by ID
         
+        Rows already loaded in this request's session are reused without SQL.
+        Reads may also be answered from the cache (version-checked); those copies are
+        detached, so anything that modifies the row must pass fresh=True.
+        Reads that miss the hot table fall back to the archive (read-only copies).
+        
         Args:
             inspection_id: Inspection ID
+            fresh: Return a session-attached row from the database (for writes)
         
         Returns:
             Inspection object
@@ -88,9 +202,22 @@ class InspectionService:
         Raises:
             HTTPException: 404 if not found
         """
-        inspection = self.db.query(Inspection).filter(
-            Inspection.id == inspection_id
-        ).first()
+        loaded = self.db.identity_map.get(identity_key(Inspection, inspection_id))
+        if loaded is not None and not sa_inspect(loaded).expired:
+            return loaded
+        
+        if not fresh and INSPECTION_CACHE_TTL_SECONDS:
+            snapshot, version = _cache.get_versioned(inspection_id)
+            if snapshot is not None:
+                if self._current([inspection_id], {inspection_id: version}):
+                    return _detached(snapshot)
+                _cache.pop(inspection_id)  # Written by another worker since it was cached
+        
+        inspection = self.db.get(Inspection, inspection_id)
+        if inspection is None and not fresh:
+            inspection = next(iter(ArchiveService(self.db).find(Inspection, [inspection_id])), None)
+            if inspection is not None:
+                return inspection
         
         if not inspection:
             raise HTTPException(
@@ -98,8 +225,44 @@ class InspectionService:
                 detail=f"Inspection {inspection_id} not found"
             )
         
+        self._remember(inspection)
         return inspection
     
+    def _current(self, inspection_ids: List[int], versions: Dict[int, Optional[int]]) -> List[int]:
+        """Which cached rows are still current: those whose version is at least the table's (one statement)"""
+        stored = dict(self.db.execute(
+            select(Inspection.id, Inspection.version).where(Inspection.id.in_(inspection_ids))
+        ).all())
+        return [
+            inspection_id for inspection_id in inspection_ids
+            if inspection_id in stored and versions[inspection_id] is not None and versions[inspection_id] >= stored[inspection_id]
+        ]
+
+    def _remember(self, inspection: Inspection):
+        """Read-through: cache a row just loaded, unless it comes from a replica that may lag a recent invalidation"""
+        if not INSPECTION_CACHE_TTL_SECONDS:
+            return
+        if self.db.get_bind() is not engine and _recently_invalidated.get(inspection.id):
+            return
+        _cache.set(inspection.id, _snapshot(inspection), version=inspection.version)
+    
+    def _commit(self, inspection: Inspection) -> Inspection:
+        """
+        Commit a modified inspection and write the new row through to the cache
+        
+        An UPDATE leaves the row exactly as held in memory, so the returned copy
+        is built from that state instead of reloading it after the commit. Its
+        version is the loaded one plus the bump the UPDATE makes, which keeps
+        copies loaded before the write from replacing it.
+        """
+        snapshot = _snapshot(inspection)
+        version = inspection.version + (1 if self.db.is_modified(inspection) else 0)
+        self.db.commit()
+        if INSPECTION_CACHE_TTL_SECONDS:
+            _cache.set(snapshot["id"], snapshot, version=version)
+        invalidate_dashboards([snapshot["customer_id"], snapshot["pilot_id"]])
+        return _detached(snapshot)
+    
     def assign_pilot(self, inspection_id: int, pilot_id: int) -> Inspection:
         """
         Assign a pilot to an inspection
@@ -114,7 +277,7 @@ class InspectionService:
         Raises:
             HTTPException: If inspection not found or already assigned
         """
-        inspection = self.get_inspection(inspection_id)
+        inspection = self.get_inspection(inspection_id, fresh=True)
         
         if inspection.status != "pending":
             raise HTTPException(
@@ -126,23 +289,23 @@ class InspectionService:
         inspection.status = "scheduled"
         inspection.assigned_at = datetime.utcnow()  # Will be added to model
         
-        self.db.commit()
-        self.db.refresh(inspection)
-        
-        return inspection
+        updated = self._commit(inspection)
+        record_transitions([make_event(inspection_id, "scheduled", "pending", pilot_id, "assign")])
+        return updated
     
-    def update_status(self, inspection_id: int, new_status: str) -> Inspection:
+    def update_status(self, inspection_id: int, new_status: str, actor_id: Optional[int] = None) -> Inspection:
         """
         Update inspection status
         
         Args:
             inspection_id: Inspection ID
             new_status: New status value
+            actor_id: User making the change (recorded in the status history)
         
         Returns:
             Updated Inspection object
         """
-        inspection = self.get_inspection(inspection_id)
+        inspection = self.get_inspection(inspection_id, fresh=True)
         
         # Validate status transitions
         valid_statuses = ["pending", "scheduled", "completed", "cancelled"]
@@ -152,12 +315,142 @@ class InspectionService:
                 detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
             )
         
+        previous = inspection.status
         inspection.status = new_status
         
         if new_status == "completed":
             inspection.completed_at = datetime.utcnow()  # Will be added to model
         
-        self.db.commit()
-        self.db.refresh(inspection)
+        updated = self._commit(inspection)
+        if previous != new_status:
+            record_transitions([make_event(inspection_id, new_status, previous, actor_id, "status")])
+        return updated
+    
+    def get_inspections(self, inspection_ids: List[int]) -> Dict[int, Inspection]:
+        """
+        Get many inspections by ID with at most one IN query
+        
+        Rows in this session or the cache (once their versions are confirmed) are
+        reused; only the rest are selected, and those missing from the hot table are looked up in the archive.
+        
+        Returns:
+            Dict of ID -> Inspection for the IDs that exist
+        """
+        found = {}
+        missing = []
+        cached = {}
+        for inspection_id in inspection_ids:
+            loaded = self.db.identity_map.get(identity_key(Inspection, inspection_id))
+            if loaded is not None and not sa_inspect(loaded).expired:
+                found[inspection_id] = loaded
+                continue
+            snapshot, version = _cache.get_versioned(inspection_id) if INSPECTION_CACHE_TTL_SECONDS else (None, None)
+            if snapshot is not None:
+                cached[inspection_id] = (snapshot, version)
+            else:
+                missing.append(inspection_id)
+        
+        if cached:
+            current = set(self._current(list(cached), {i: version for i, (_, version) in cached.items()}))
+            for inspection_id, (snapshot, _) in cached.items():
+                if inspection_id in current:
+                    found[inspection_id] = _detached(snapshot)
+                else:
+                    _cache.pop(inspection_id)
+                    missing.append(inspection_id)
+        
+        if missing:
+            for inspection in self.db.scalars(select(Inspection).where(Inspection.id.in_(missing))):
+                found[inspection.id] = inspection
+                self._remember(inspection)
+            archived = [inspection_id for inspection_id in missing if inspection_id not in found]
+            for inspection in ArchiveService(self.db).find(Inspection, archived):
+                found[inspection.id] = inspection
+        return found
+    
+    @staticmethod
+    def visibility_error(inspection: Inspection, user_id: int, role: str) -> Optional[str]:
+        """Why the user may not view this inspection (None if they may)"""
+        if role == "customer" and inspection.customer_id != user_id:
+            return "Not your inspection"
+        if role == "pilot" and inspection.pilot_id != user_id and inspection.status != "pending":
+            return "Not assigned to you"
+        return None
+    
+    def get_visible_inspection(self, inspection_id: int, user_id: int, role: str) -> Inspection:
+        """
+        Get an inspection the user may view
+        
+        Customers see their own inspections; pilots see assigned or pending ones.
+        
+        Raises:
+            HTTPException: 404 if not found, 403 if not visible to the user
+        """
+        inspection = self.get_inspection(inspection_id)
+        
+        error = self.visibility_error(inspection, user_id, role)
+        if error:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=error)
         
         return inspection
+    
+    def get_visible_inspections(self, inspection_ids: List[int], user_id: int, role: str) -> List[dict]:
+        """
+        Batch form of get_visible_inspection: one query, one result per ID
+        
+        Returns:
+            Items in request order with id, status_code (200/403/404) and
+            inspection or detail
+        """
+        found = self.get_inspections(inspection_ids)
+        items = []
+        for inspection_id in inspection_ids:
+            inspection = found.get(inspection_id)
+            if inspection is None:
+                items.append({"id": inspection_id, "status_code": status.HTTP_404_NOT_FOUND,
+                              "detail": f"Inspection {inspection_id} not found"})
+                continue
+            error = self.visibility_error(inspection, user_id, role)
+            if error:
+                items.append({"id": inspection_id, "status_code": status.HTTP_403_FORBIDDEN, "detail": error})
+            else:
+                items.append({"id": inspection_id, "status_code": status.HTTP_200_OK, "inspection": inspection})
+        return items
+    
+    def get_assigned_inspection(self, inspection_id: int, pilot_id: int) -> Inspection:
+        """
+        Get an inspection the given pilot is assigned to, ready to be modified
+        
+        Raises:
+            HTTPException: 404 if not found, 403 if assigned to someone else
+        """
+        inspection = self.get_inspection(inspection_id, fresh=True)
+        if inspection.pilot_id != pilot_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not assigned to this inspection"
+            )
+        return inspection
+    
+    def record_upload(self, inspection: Inspection, folder: str) -> Inspection:
+        """
+        Record uploaded raw images and queue the inspection for analysis
+        
+        Args:
+            inspection: Inspection the images belong to
+            folder: Storage folder holding the raw images
+        
+        Returns:
+            Updated Inspection object
+        """
+        previous = inspection.analysis_status
+        inspection.raw_images_path = folder
+        inspection.analysis_status = "processing"
+        inspection.started_at = datetime.utcnow()
+        
+        updated = self._commit(inspection)
+        if previous != "processing":
+            record_transitions([make_event(
+                updated.id, "processing", previous, updated.pilot_id, "upload", field="analysis_status"
+            )])
+        return updated
@@ -0,0 +1,398 @@
+"""
+Report PDF service - Downloadable inspection reports rendered in the background
+A PDF (summary, per-class finding counts, thumbnails of the strongest defects)
+is rendered once per version of a report: the render is keyed on the report's
+and inspection's versions plus the layout revision, and the file is stored
+under the SHA-256 of its bytes. Repeat downloads are served from storage; a
+new render only happens when the report, its inspection or the layout changes.
+A failed render is kept, and its error returned, for REPORT_PDF_RETRY_FAILED_SECONDS
+before the next request may start it again, up to REPORT_PDF_MAX_ATTEMPTS times.
+
+Thumbnails are derivatives stored next to the frames (derivatives/thumbs/...),
+made with Pillow when it is installed; without it, frames small enough are
+embedded as they are. The PDF itself is written directly (Helvetica text,
+rectangles and DCT-encoded JPEGs), so no PDF library is needed.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import struct
+import textwrap
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Finding, Inspection, Report, ReportRender
+from app.services.archive_service import ArchiveService
+from app.services.inspection_service import InspectionService
+from app.services.storage_client import run_sync
+from app.services.storage_service import StorageService, get_storage_service
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails need Pillow; without it only small frames are embedded, unscaled
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+REPORT_PDF_LAYOUT = "1"  # Bump when the layout changes so every report re-renders
+REPORT_PDF_MAX_THUMBNAILS = int(os.getenv("REPORT_PDF_MAX_THUMBNAILS", "12"))
+REPORT_PDF_THUMBNAIL_PX = int(os.getenv("REPORT_PDF_THUMBNAIL_PX", "320"))
+REPORT_PDF_MAX_IMAGE_BYTES = int(os.getenv("REPORT_PDF_MAX_IMAGE_BYTES", str(512 * 1024)))  # Unscaled embeds (no Pillow)
+REPORT_PDF_RENDER_TIMEOUT_SECONDS = float(os.getenv("REPORT_PDF_RENDER_TIMEOUT_SECONDS", "300"))  # Then a stalled render is restarted
+REPORT_PDF_RETRY_FAILED_SECONDS = float(os.getenv("REPORT_PDF_RETRY_FAILED_SECONDS", "300"))  # Cooldown after a failed render
+REPORT_PDF_MAX_ATTEMPTS = int(os.getenv("REPORT_PDF_MAX_ATTEMPTS", "3"))  # Renders per report version before giving up
+REPORT_PDF_RETRY_AFTER_SECONDS = 3
+REPORT_PDF_URL_SECONDS = int(os.getenv("REPORT_PDF_URL_SECONDS", "600"))
+
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int, int]]:
+    """(width, height, components) from a JPEG's frame header, or None if it isn't one"""
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # Fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # Markers without a length
+            offset += 2
+            continue
+        if marker in _SOF_MARKERS:
+            if offset + 10 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height, data[offset + 9]
+        offset += 2 + struct.unpack(">H", data[offset + 2:offset + 4])[0]
+    return None
+
+def make_thumbnail(data: bytes, size: int = REPORT_PDF_THUMBNAIL_PX) -> Optional[bytes]:
+    """JPEG fitting in size x size (the frame itself if small enough and Pillow is missing)"""
+    if Image is None:
+        return data if len(data) <= REPORT_PDF_MAX_IMAGE_BYTES and jpeg_dimensions(data) else None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("RGB", (size, size))  # JPEGs decode straight at a reduced scale
+            image = image.convert("RGB")
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=80, optimize=True)
+            return out.getvalue()
+    except (OSError, ValueError):  # Not an image Pillow can read
+        return None
+
+class PdfWriter:
+    """
+    Minimal PDF 1.4 writer: A4 pages of Helvetica text, filled rectangles and JPEG images
+
+    Output carries no timestamps or ids, so the same content always gives the same bytes.
+    """
+
+    WIDTH, HEIGHT = 595, 842  # A4 in points
+
+    def __init__(self):
+        self.pages = []  # Content stream operators per page
+        self.images = []  # (width, height, components, JPEG bytes)
+
+    def add_page(self):
+        self.pages.append([])
+
+    def text(self, x: float, y: float, value: str, size: int = 10, bold: bool = False):
+        escaped = value.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        self.pages[-1].append(b"BT /%s %d Tf %.1f %.1f Td (%s) Tj ET" % (b"F2" if bold else b"F1", size, x, y, escaped))
+
+    def rect(self, x: float, y: float, width: float, height: float, rgb: Tuple[float, float, float] = (0, 0, 0)):
+        self.pages[-1].append(b"%.3f %.3f %.3f rg %.1f %.1f %.1f %.1f re f" % (*rgb, x, y, width, height))
+
+    def image(self, jpeg: bytes, x: float, y: float, width: float, height: float) -> bool:
+        """Draw a JPEG centred in the box, aspect kept; False if it can't be embedded"""
+        size = jpeg_dimensions(jpeg)
+        if size is None or size[2] not in (1, 3):
+            return False
+        w, h, components = size
+        scale = min(width / w, height / h)
+        self.images.append((w, h, components, jpeg))
+        self.pages[-1].append(b"q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q" % (
+            w * scale, h * scale, x + (width - w * scale) / 2, y + (height - h * scale) / 2, len(self.images) - 1
+        ))
+        return True
+
+    def build(self) -> bytes:
+        objects = []  # Object n is objects[n - 1]
+
+        def add(body: bytes) -> int:
+            objects.append(body)
+            return len(objects)
+
+        def stream(entries: bytes, data: bytes) -> bytes:
+            return b"<< %s /Length %d >>\nstream\n%s\nendstream" % (entries, len(data), data)
+
+        catalog, pages = add(b""), add(b"")  # Filled in once the pages are known
+        fonts = {
+            name: add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base)
+            for name, base in ((b"F1", b"Helvetica"), (b"F2", b"Helvetica-Bold"))
+        }
+        images = [
+            add(stream(
+                b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s /BitsPerComponent 8 /Filter /DCTDecode"
+                % (w, h, b"DeviceRGB" if components == 3 else b"DeviceGray"), data
+            ))
+            for w, h, components, data in self.images
+        ]
+        resources = b"<< /Font << %s >> /XObject << %s >> >>" % (
+            b" ".join(b"/%s %d 0 R" % item for item in fonts.items()),
+            b" ".join(b"/Im%d %d 0 R" % item for item in enumerate(images)),
+        )
+        kids = []
+        for operators in self.pages:
+            content = add(stream(b"/Filter /FlateDecode", zlib.compress(b"\n".join(operators), 6)))
+            kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>" % (
+                pages, self.WIDTH, self.HEIGHT, resources, content
+            )))
+        objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages
+        objects[pages - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+        return bytes(out)
+
+def _when(value: Optional[datetime]) -> str:
+    return value.strftime("%Y-%m-%d %H:%M") if value else "-"
+
+class ReportPdfService:
+    """Service class for PDF inspection reports"""
+
+    def __init__(self, db: Session, storage: StorageService = None):
+        self.db = db
+        self.storage = storage or get_storage_service()
+
+    @staticmethod
+    def version_key(report: Report, inspection: Inspection) -> str:
+        return f"r{report.version}.i{inspection.version}.l{REPORT_PDF_LAYOUT}"
+
+    def request_render(self, inspection_id: int, user_id: int, role: str) -> Tuple[ReportRender, bool]:
+        """
+        The render of the report's current version, claimed for rendering if missing or stalled
+
+        A failed render is only claimed again once REPORT_PDF_RETRY_FAILED_SECONDS
+        have passed and it has been tried fewer than REPORT_PDF_MAX_ATTEMPTS times;
+        until then it is returned as it is, error included.
+
+        Returns:
+            (render, started): started is True when the caller must queue render_report_pdf_job
+
+        Raises:
+            HTTPException: 404 if the inspection has no report, 403 if the user may not view it
+        """
+        row = self.db.execute(
+            select(Report, Inspection)
+            .join(Inspection, Inspection.id == Report.inspection_id)
+            .where(Report.inspection_id == inspection_id)
+        ).first()
+        if row is None:
+            archive = ArchiveService(self.db)
+            reports = archive.find(Report, [inspection_id])
+            inspections = archive.find(Inspection, [inspection_id]) if reports else []
+            row = (reports[0], inspections[0]) if inspections else None
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Report for inspection {inspection_id} not found")
+        report, inspection = row
+        error = InspectionService.visibility_error(inspection, user_id, role)
+        if error:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=error)
+
+        key = self.version_key(report, inspection)
+        query = select(ReportRender).where(ReportRender.report_id == report.id, ReportRender.version_key == key)
+        render = self.db.scalar(query)
+        now = datetime.utcnow()
+        if render is None:
+            render = ReportRender(report_id=report.id, version_key=key, status="rendering", attempts=1, started_at=now)
+            self.db.add(render)
+            try:
+                self.db.commit()
+            except IntegrityError:  # Another request claimed it first
+                self.db.rollback()
+                return self.db.scalar(query), False
+            return render, True
+
+        stalled = now - render.started_at > timedelta(seconds=REPORT_PDF_RENDER_TIMEOUT_SECONDS)
+        if render.status == "ready" or (render.status == "rendering" and not stalled):
+            return render, False
+        if render.status == "failed":
+            retry_at = self.retry_at(render)
+            if retry_at is None or now < retry_at:
+                return render, False
+        # Failed and cooled down, or stalled: claim it again, unless a concurrent request just did
+        claimed = self.db.execute(
+            update(ReportRender)
+            .where(ReportRender.id == render.id, ReportRender.started_at == render.started_at)
+            .values(status="rendering", error=None, attempts=ReportRender.attempts + 1, started_at=now)
+        ).rowcount
+        self.db.commit()
+        self.db.refresh(render)
+        return render, bool(claimed)
+
+    @staticmethod
+    def retry_at(render: ReportRender) -> Optional[datetime]:
+        """
+        When a failed render may be started again
+
+        Returns:
+            The time the cooldown ends (possibly past), or None once the attempts are used up
+        """
+        if (render.attempts or 1) >= REPORT_PDF_MAX_ATTEMPTS:
+            return None
+        return (render.completed_at or render.started_at) + timedelta(seconds=REPORT_PDF_RETRY_FAILED_SECONDS)
+
+    def render(self, render_id: int) -> ReportRender:
+        """
+        Build the PDF for a claimed render and store it under the SHA-256 of its bytes
+
+        Returns:
+            The render, now ready
+        """
+        render = self.db.get(ReportRender, render_id)
+        report = self.db.get(Report, render.report_id)
+        F = Finding
+        if report is not None:
+            inspection = self.db.get(Inspection, report.inspection_id)
+        else:  # Archived: read the report, inspection and findings from the archive
+            archive = ArchiveService(self.db)
+            R, F = archive.cold(Report), archive.cold(Finding)
+            report = self.db.scalars(select(R).where(R.id == render.report_id)).one()
+            inspection = archive.find(Inspection, [report.inspection_id])[0]
+        counts = self.db.execute(
+            select(F.defect_class, func.count(), func.avg(F.confidence))
+            .where(F.report_id == report.id)
+            .group_by(F.defect_class)
+            .order_by(func.count().desc(), F.defect_class)
+        ).all()
+        strongest = self.db.execute(
+            select(F.defect_class, F.confidence, F.frame_path, F.latitude, F.longitude)
+            .where(F.report_id == report.id, F.frame_path.isnot(None))
+            .order_by(func.coalesce(F.confidence, -1).desc(), F.id)
+            .limit(REPORT_PDF_MAX_THUMBNAILS)
+        ).all()
+        thumbnails = self._thumbnails([finding.frame_path for finding in strongest])
+
+        pdf = self._layout(report, inspection, counts, strongest, thumbnails)
+        path = f"reports/pdf/{hashlib.sha256(pdf).hexdigest()}.pdf"
+        run_sync(self.storage.client.upload, path, lambda: pdf, "application/pdf", len(pdf))
+        render.status, render.storage_path, render.size = "ready", path, len(pdf)
+        render.completed_at = datetime.utcnow()
+        self.db.commit()
+        return render
+
+    def _thumbnails(self, frame_paths: List[str]) -> Dict[str, bytes]:
+        """Thumbnail bytes per frame, from stored derivatives or made (and stored) from the frames"""
+        client = self.storage.client
+        derivatives = {
+            path: f"derivatives/thumbs/{REPORT_PDF_THUMBNAIL_PX}/{hashlib.sha256(path.encode()).hexdigest()}.jpg"
+            for path in dict.fromkeys(frame_paths)
+        }
+
+        async def download_all(paths):
+            return await asyncio.gather(*(client.download(path) for path in paths))
+
+        found = dict(zip(derivatives, run_sync(download_all, list(derivatives.values()))))
+        missing = [path for path, data in found.items() if data is None]
+        made = {}
+        for path, original in zip(missing, run_sync(download_all, missing) if missing else []):
+            thumbnail = make_thumbnail(original) if original else None
+            if thumbnail is not None:
+                found[path] = made[derivatives[path]] = thumbnail
+
+        if made and Image is not None:  # Without Pillow the "thumbnail" is the frame itself; nothing to store
+            async def upload_all():
+                await asyncio.gather(*(
+                    client.upload(path, lambda data=data: data, "image/jpeg", len(data)) for path, data in made.items()
+                ))
+            run_sync(upload_all)
+        return {path: data for path, data in found.items() if data is not None}
+
+    def _layout(self, report: Report, inspection: Inspection, counts: list, strongest: list, thumbnails: Dict[str, bytes]) -> bytes:
+        pdf = PdfWriter()
+        pdf.add_page()
+        pdf.text(50, 790, "Drone inspection report", size=18, bold=True)
+        pdf.text(50, 765, report.title, size=13, bold=True)
+        y = 740
+        for label, value in (
+            ("Location", inspection.location),
+            ("Package", inspection.package or "-"),
+            ("Scheduled", _when(inspection.scheduled_date)),
+            ("Completed", _when(inspection.completed_at)),
+            ("Inspection", f"#{inspection.id}  (report #{report.id})"),
+            ("Classification", f"{report.defect_classification or '-'}"
+                               + (f"  ({report.confidence}% confidence)" if report.confidence is not None else "")),
+        ):
+            pdf.text(50, y, label, bold=True)
+            pdf.text(150, y, value)
+            y -= 16
+
+        if report.summary:
+            y -= 10
+            pdf.text(50, y, "Summary", size=12, bold=True)
+            for line in textwrap.wrap(report.summary, 95):
+                y -= 14
+                pdf.text(50, y, line)
+
+        y -= 30
+        total = sum(count for _, count, _ in counts)
+        pdf.text(50, y, f"Findings by class ({total} total)", size=12, bold=True)
+        widest = max((count for _, count, _ in counts), default=0)
+        for defect_class, count, confidence in counts:
+            y -= 20
+            pdf.text(50, y, defect_class)
+            pdf.rect(150, y - 2, 300 * count / widest, 12, (0.85, 0.33, 0.1))
+            pdf.text(460, y, f"{count}" + (f"  avg {confidence:.0f}%" if confidence is not None else ""))
+        if not counts:
+            pdf.text(50, y - 20, "No defects were found.")
+
+        shown = [finding for finding in strongest if finding.frame_path in thumbnails]
+        for i, finding in enumerate(shown):
+            if i % 12 == 0:
+                pdf.add_page()
+                pdf.text(50, 790, "Strongest defects", size=14, bold=True)
+            column, row = i % 3, (i % 12) // 3
+            x, y = 50 + column * 170, 620 - row * 185
+            if pdf.image(thumbnails[finding.frame_path], x, y, 160, 140):
+                caption = f"{finding.defect_class}" + (f" {finding.confidence}%" if finding.confidence is not None else "")
+                pdf.text(x, y - 14, caption, size=9, bold=True)
+                if finding.latitude is not None and finding.longitude is not None:
+                    pdf.text(x, y - 26, f"{finding.latitude:.5f}, {finding.longitude:.5f}", size=8)
+        return pdf.build()
+
+def render_report_pdf_job(render_id: int):
+    """Background task: render one claimed PDF with its own session, marking it failed on error"""
+    db = SessionLocal()
+    try:
+        ReportPdfService(db).render(render_id)
+    except Exception as e:
+        logger.exception("PDF render %s failed", render_id)
+        db.rollback()
+        db.execute(
+            update(ReportRender).where(ReportRender.id == render_id)
+            .values(status="failed", error=str(e)[:500], completed_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
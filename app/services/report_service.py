@@ -1,36 +1,53 @@
 """
 Report service - Business logic for inspection reports and analytics
 """
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.models import Report, Inspection
+from datetime import datetime
+from typing import Iterator, List, Optional
+from app.models import Report, Inspection, Finding
 from app.schemas import ReportCreate
 from fastapi import HTTPException, status
 
-from app.services.storage_service import StorageService
+from app.services.storage_service import StorageService, get_storage_service
+from app.services.archive_service import ArchiveService
+from app.services.dashboard_service import COST_SAVED_PER_INSPECTION
+from app.services.trend_service import TrendService
+from app.services.inspection_service import invalidate_inspections
+from app.services.history_service import make_event, record_transitions
+from app.services.heatmap_service import invalidate_inspection as invalidate_heatmap
+from app.streaming import STREAM_BATCH_SIZE
 
 class ReportService:
     """Service class for report-related operations"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, storage: StorageService = None):
         self.db = db
-        self.storage = StorageService()
+        self.storage = storage or get_storage_service()
         
-    def _inject_signed_url(self, report: Report):
-        """Helper to inject signed URL if image_url is a storage path"""
-        if report and report.image_url and not report.image_url.startswith("http"):
-            report.image_url = self.storage.get_signed_url(report.image_url)
-        return report
+    def _inject_signed_urls(self, reports: List[Report]) -> List[Report]:
+        """Helper to swap storage paths in image_url for signed URLs (one batch for all reports)"""
+        pending = [r for r in reports if r.image_url and not r.image_url.startswith("http")]
+        signed = self.storage.get_signed_urls([r.image_url for r in pending])
+        for report in pending:
+            report.image_url = signed.get(report.image_url) or report.image_url
+        return reports
     
-    def create_report(self, data: ReportCreate) -> Report:
+    def create_report(self, data: ReportCreate, actor_id: Optional[int] = None, automated: bool = False) -> Report:
         """
         Create a new report for an inspection
         
         Args:
             data: Report creation data
+            actor_id: User submitting the analysis results (recorded in the status history)
+            automated: Written by the analysis merge rather than submitted
             
         Returns:
             Created Report object
+            
+        Raises:
+            HTTPException: 404 if the inspection doesn't exist, 409 if it already has a report
         """
         # Verify inspection exists
         inspection = self.db.query(Inspection).filter(Inspection.id == data.inspection_id).first()
@@ -41,7 +58,9 @@ class ReportService:
             )
             
         # Update inspection status to completed
+        previous = inspection.status
         inspection.status = "completed"
+        users = [inspection.customer_id, inspection.pilot_id]  # Dashboards to drop; read before the commit expires the row
         
         # Create report record
         new_report = Report(
@@ -50,33 +69,144 @@ class ReportService:
             summary=data.summary,
             defect_classification=data.defect_classification,
             image_url=data.image_url,
-            confidence=data.confidence
+            confidence=data.confidence,
+            automated=automated
         )
         
         self.db.add(new_report)
+        try:
+            self.db.flush()
+        except IntegrityError:
+            # A retried submission without an Idempotency-Key hits the unique inspection_id
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Report for inspection {data.inspection_id} already exists"
+            )
+        
+        # Findings go in as one executemany; nothing needs their generated IDs
+        if data.findings:
+            self.db.execute(insert(Finding), [
+                {"report_id": new_report.id, "inspection_id": inspection.id, **finding.model_dump()}
+                for finding in data.findings
+            ])
+        TrendService(self.db).record_report(new_report, inspection, [f.defect_class for f in data.findings])
+        
         self.db.commit()
         self.db.refresh(new_report)
+        invalidate_inspections([data.inspection_id], users)
+        if previous != "completed":
+            record_transitions([make_event(data.inspection_id, "completed", previous, actor_id, "report")])
+        if data.findings:
+            invalidate_heatmap(data.inspection_id)
         
         return new_report
         
     def get_report_by_inspection(self, inspection_id: int) -> Report:
         """
-        Get report for a specific inspection
+        Get report for a specific inspection (from the archive once it has been archived)
         """
         report = self.db.query(Report).filter(Report.inspection_id == inspection_id).first()
+        if not report:
+            report = next(iter(ArchiveService(self.db).find(Report, [inspection_id])), None)
         if not report:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Report for inspection {inspection_id} not found"
             )
-        return self._inject_signed_url(report)
+        return self._inject_signed_urls([report])[0]
+        
+    def get_reports_by_inspections(self, inspection_ids: List[int], user_id: int, role: str) -> List[dict]:
+        """
+        Reports of many inspections with one query and one signing batch
+        
+        Customers may only read reports of their own inspections, as with the
+        single-report endpoint.
+        
+        Returns:
+            Items in request order with inspection_id, status_code (200/403/404)
+            and report or detail
+        """
+        rows = self.db.execute(
+            select(Report, Inspection.customer_id)
+            .join(Inspection, Inspection.id == Report.inspection_id)
+            .where(Report.inspection_id.in_(inspection_ids))
+        ).all()
+        found = {report.inspection_id: (report, customer_id) for report, customer_id in rows}
+        archived = [inspection_id for inspection_id in inspection_ids if inspection_id not in found]
+        if archived:
+            archive = ArchiveService(self.db)
+            reports = archive.find(Report, archived)
+            owners = {i.id: i.customer_id for i in archive.find(Inspection, [r.inspection_id for r in reports])}
+            found.update({report.inspection_id: (report, owners.get(report.inspection_id)) for report in reports})
+        
+        items = []
+        for inspection_id in inspection_ids:
+            if inspection_id not in found:
+                items.append({"inspection_id": inspection_id, "status_code": status.HTTP_404_NOT_FOUND,
+                              "detail": f"Report for inspection {inspection_id} not found"})
+                continue
+            report, customer_id = found[inspection_id]
+            if role == "customer" and customer_id != user_id:
+                items.append({"inspection_id": inspection_id, "status_code": status.HTTP_403_FORBIDDEN,
+                              "detail": "Not your report"})
+            else:
+                items.append({"inspection_id": inspection_id, "status_code": status.HTTP_200_OK, "report": report})
         
-    def get_customer_reports(self, customer_id: int) -> List[Report]:
+        self._inject_signed_urls([item["report"] for item in items if "report" in item])
+        return items
+    
+    def get_customer_reports(self, customer_id: int, date_from: Optional[datetime] = None) -> List[Report]:
         """
         List all reports for a specific customer
+        
+        With date_from, only reports of inspections scheduled on or after it,
+        archived ones included.
+        """
+        R, criteria = self._customer_criteria(customer_id, date_from)
+        reports = self.db.scalars(select(R).where(*criteria)).all()
+        return self._inject_signed_urls(reports)
+    
+    def iter_customer_reports(
+        self, customer_id: int, date_from: Optional[datetime] = None, batch_size: int = STREAM_BATCH_SIZE
+    ) -> Iterator[List[dict]]:
         """
-        reports = self.db.query(Report).join(Inspection).filter(Inspection.customer_id == customer_id).all()
-        return [self._inject_signed_url(r) for r in reports]
+        A customer's reports in batches off a server-side cursor, for streaming
+        
+        Each batch's image paths are signed in one round, as the list is.
+        
+        Yields:
+            Lists of up to batch_size report dicts
+        """
+        R, criteria = self._customer_criteria(customer_id, date_from)
+        query = (
+            select(*(getattr(R, column.key) for column in Report.__table__.columns))
+            .where(*criteria)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        result = self.db.execute(query)
+        try:
+            for batch in result.mappings().partitions():
+                rows = [dict(row) for row in batch]
+                pending = [row for row in rows if row["image_url"] and not row["image_url"].startswith("http")]
+                signed = self.storage.get_signed_urls([row["image_url"] for row in pending])
+                for row in pending:
+                    row["image_url"] = signed.get(row["image_url"]) or row["image_url"]
+                yield rows
+        finally:
+            result.close()
+        
+    def _customer_criteria(self, customer_id: int, date_from: Optional[datetime]) -> tuple:
+        """Report entity to list from (reaching into the archive for date_from) and the customer's filters"""
+        if not date_from:
+            R, I = Report, Inspection
+        else:
+            archive = ArchiveService(self.db)
+            R, I = archive.with_archive(Report, date_from), archive.with_archive(Inspection, date_from)
+        owned = [I.customer_id == customer_id]
+        if date_from:
+            owned.append(func.coalesce(I.scheduled_date, I.created_at) >= date_from)
+        return R, [R.inspection_id.in_(select(I.id).where(*owned))]
         
     def get_analytics(self, customer_id: int) -> dict:
         """
@@ -88,8 +218,7 @@ class ReportService:
             Inspection.status == "completed"
         ).count()
         
-        # Placeholder cost saving calculation
-        cost_saved = completed_inspections * 500  # $500 saved per manual inspection
+        cost_saved = completed_inspections * COST_SAVED_PER_INSPECTION
         
         next_booking = self.db.query(Inspection).filter(
             Inspection.customer_id == customer_id,
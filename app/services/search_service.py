@@ -0,0 +1,175 @@
+"""
+Search service - Full-text and typeahead search over inspections and their reports
+Query words must all appear, the last one as a prefix (typeahead), in either
+the site location or the report text (title, summary, defect classification). Postgres uses the
+tsvector GIN indexes (and pg_trgm ILIKE for typeahead), SQLite the FTS5 table kept
+in sync by triggers (see SEARCH_DDL in models); other databases fall back to
+unindexed LIKE. Results are newest first and paged by id (keyset).
+"""
+import re
+from datetime import date, datetime, time
+from typing import List, Optional
+
+from sqlalchemy import and_, column, func, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+
+from app.models import Inspection, Report
+from app.services.inspection_service import visible_to
+
+SEARCH_MAX_TERMS = 8
+_fts = table("search_fts", column("rowid"), column("location"))
+
+def search_terms(query: str) -> List[str]:
+    """Lower-cased word tokens (punctuation and underscores split words, as in the indexes)"""
+    return re.findall(r"[^\W_]+", query.lower())[:SEARCH_MAX_TERMS]
+
+def _location_doc():
+    return func.to_tsvector(literal_column("'simple'"), func.coalesce(Inspection.location, literal_column("''")))
+
+def _report_doc():
+    blank = literal_column("''")
+    return func.to_tsvector(
+        literal_column("'simple'"),
+        func.coalesce(Report.title, blank).op("||")(literal_column("' '"))
+        .op("||")(func.coalesce(Report.summary, blank)).op("||")(literal_column("' '"))
+        .op("||")(func.coalesce(Report.defect_classification, blank))
+    )
+
+class SearchService:
+    """Service class for inspection search"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def _fts_query(self, terms: List[str], user_id: int, role: str, status: Optional[str], columns: str) -> str:
+        """FTS5 MATCH expression: terms on the given columns, role and status as scope tokens"""
+        words = " AND ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        parts = [" OR ".join(f"{name} : ({words})" for name in columns.split())]
+        if role == "customer":
+            parts.append(f"scope : c{user_id}")
+        elif role == "pilot":
+            parts.append(f"scope : (p{user_id} OR spending)")
+        if status:
+            parts.append(f"scope : s{''.join(search_terms(status))}")
+        return " AND ".join(f"({part})" for part in parts)
+
+    def search(
+        self,
+        query: str,
+        user_id: int,
+        role: str,
+        status: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        cursor: Optional[int] = None,
+        limit: int = 20
+    ) -> dict:
+        """
+        Inspections whose location or report matches every term of the query
+
+        Args:
+            query: Free text; the last word matches as a prefix
+            user_id, role: Caller (results are limited to what they may see)
+            status: Only inspections in this status
+            date_from, date_to: Scheduled date range (inclusive)
+            cursor: next_cursor of the previous page
+            limit: Page size
+
+        Returns:
+            Dict with results (newest first) and next_cursor (None on the last page)
+        """
+        terms = search_terms(query)
+        if not terms:
+            return {"results": [], "next_cursor": None}
+
+        fields = (
+            Inspection.id, Inspection.location, Inspection.status, Inspection.package,
+            Inspection.scheduled_date, Inspection.created_at, Inspection.analysis_status,
+            Report.id.label("report_id"), Report.title.label("report_title"), Report.defect_classification,
+        )
+        if self.dialect == "sqlite":
+            match = literal_column("search_fts").op("MATCH")(
+                self._fts_query(terms, user_id, role, status, "location report")
+            )
+            statement = (
+                select(*fields).select_from(_fts)
+                .join(Inspection, Inspection.id == _fts.c.rowid)
+                .outerjoin(Report, Report.inspection_id == Inspection.id)
+                .where(match)
+            )
+            key = _fts.c.rowid
+        else:
+            statement = (
+                select(*fields).outerjoin(Report, Report.inspection_id == Inspection.id)
+                .where(self._match(terms))
+            )
+            scope = visible_to(user_id, role)
+            if scope is not None:
+                statement = statement.where(scope)
+            if status:
+                statement = statement.where(Inspection.status == status)
+            key = Inspection.id
+
+        if date_from:
+            statement = statement.where(Inspection.scheduled_date >= datetime.combine(date_from, time.min))
+        if date_to:
+            statement = statement.where(Inspection.scheduled_date <= datetime.combine(date_to, time.max))
+        if cursor is not None:
+            statement = statement.where(key < cursor)
+
+        rows = self.db.execute(statement.order_by(key.desc()).limit(limit + 1)).mappings().all()
+        results = [dict(row) for row in rows[:limit]]
+        return {
+            "results": results,
+            "next_cursor": results[-1]["id"] if len(rows) > limit else None,
+        }
+
+    def _match(self, terms: List[str]):
+        """Postgres tsquery match (each side uses its GIN index), or LIKE elsewhere"""
+        if self.dialect == "postgresql":
+            tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(terms[:-1] + [f"{terms[-1]}:*"]))
+            return or_(
+                _location_doc().op("@@")(tsquery),
+                Inspection.id.in_(select(Report.inspection_id).where(_report_doc().op("@@")(tsquery))),
+            )
+        report_text = func.lower(
+            func.coalesce(Report.title, "") + " " + func.coalesce(Report.summary, "") + " "
+            + func.coalesce(Report.defect_classification, "")
+        )
+        return or_(
+            and_(*(func.lower(Inspection.location).like(f"%{term}%") for term in terms)),
+            and_(*(report_text.like(f"%{term}%") for term in terms)),
+        )
+
+    def suggest(self, prefix: str, user_id: int, role: str, limit: int = 10) -> List[str]:
+        """
+        Distinct site locations for typeahead
+
+        Args:
+            prefix: What the user has typed so far (the last word matches as a prefix)
+            user_id, role: Caller (only sites they may see are suggested)
+            limit: Most suggestions returned
+
+        Returns:
+            Location names
+        """
+        terms = search_terms(prefix)
+        if not terms:
+            return []
+
+        if self.dialect == "sqlite":
+            match = literal_column("search_fts").op("MATCH")(self._fts_query(terms, user_id, role, None, "location"))
+            statement = select(_fts.c.location).where(match).distinct().limit(limit)
+            return list(self.db.scalars(statement))
+
+        # Word substrings; ILIKE is served by the pg_trgm index on Postgres
+        statement = (
+            select(Inspection.location).distinct()
+            .where(and_(*(Inspection.location.ilike(f"%{term}%") for term in terms)))
+            .order_by(Inspection.location)
+        )
+        scope = visible_to(user_id, role)
+        if scope is not None:
+            statement = statement.where(scope)
+        return list(self.db.scalars(statement.limit(limit)))
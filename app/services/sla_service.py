@@ -0,0 +1,252 @@
+"""
+SLA service - Turnaround percentiles for the inspection workflow stages
+(created -> assigned -> started -> completed) per package tier and region.
+
+Percentiles are not additive, so they are computed over the raw timestamps in
+one pass and stored in sla_summaries for every month, package and region
+combination (plus "all" rollups). On Postgres the whole refresh is one
+INSERT ... SELECT using percentile_cont with GROUPING SETS; other databases
+fetch the timestamp columns once and group them with NumPy. Reads only touch
+the summary table.
+"""
+import os
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import Integer, and_, case, cast, delete, func, insert, literal, select, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Inspection, SlaSummary
+from app.services.archive_service import ArchiveService
+
+SLA_REFRESH_SECONDS = float(os.getenv("SLA_REFRESH_SECONDS", "900"))
+SLA_REGION_GRID_DEGREES = int(os.getenv("SLA_REGION_GRID_DEGREES", "5"))  # Region = grid cell of this size
+SLA_PERCENTILES = (0.5, 0.9, 0.99)
+
+# stage -> (start column, end column)
+SLA_STAGES = {
+    "created_assigned": ("created_at", "assigned_at"),
+    "assigned_started": ("assigned_at", "started_at"),
+    "started_completed": ("started_at", "completed_at"),
+}
+SLA_GROUPINGS = ("none", "package", "region", "package_region")
+ALL = "all"
+
+_refresh_lock = threading.Lock()
+
+def region_label(latitude: Optional[float], longitude: Optional[float], grid: int = SLA_REGION_GRID_DEGREES) -> str:
+    """South-west corner of the grid cell holding a site, e.g. "25,70" """
+    if latitude is None or longitude is None:
+        return "unknown"
+    return f"{int(np.floor(latitude / grid)) * grid},{int(np.floor(longitude / grid)) * grid}"
+
+def group_percentiles(groups: np.ndarray, values: np.ndarray, quantiles=SLA_PERCENTILES) -> tuple:
+    """
+    Per-group count, mean and percentiles (linear interpolation, as percentile_cont)
+
+    Args:
+        groups: Non-negative group code per value
+        values: Values to summarise
+
+    Returns:
+        (codes, counts, means, [percentile array per quantile]) for groups present
+    """
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    codes, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    means = np.add.reduceat(values, starts) / counts
+    percentiles = []
+    for q in quantiles:
+        position = starts + q * (counts - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        percentiles.append(values[low] + (values[high] - values[low]) * (position - low))
+    return codes, counts, means, percentiles
+
+class SlaService:
+    """Service class for workflow turnaround analytics"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def refresh(self) -> int:
+        """
+        Recompute the whole summary, archived inspections included (one transaction; readers see old or new rows)
+
+        Returns:
+            Number of summary rows written
+        """
+        now = datetime.utcnow()
+        inspections = ArchiveService(self.db).with_archive(Inspection)
+        self.db.execute(delete(SlaSummary))
+        if self.dialect == "postgresql":
+            written = self._refresh_postgres(inspections, now)
+        else:
+            rows = self._summarise(inspections, now)
+            if rows:
+                self.db.execute(insert(SlaSummary), rows)
+            written = len(rows)
+        self.db.commit()
+        return written
+
+    def _refresh_postgres(self, inspections, now: datetime) -> int:
+        grid = SLA_REGION_GRID_DEGREES
+        region = case(
+            (inspections.latitude.is_(None) | inspections.longitude.is_(None), literal("unknown")),
+            else_=func.concat(
+                cast(func.floor(inspections.latitude / grid), Integer) * grid, ",",
+                cast(func.floor(inspections.longitude / grid), Integer) * grid
+            )
+        )
+        durations = []
+        for stage, (start_name, end_name) in SLA_STAGES.items():
+            start, end = getattr(inspections, start_name), getattr(inspections, end_name)
+            durations.append(
+                select(
+                    literal(stage).label("stage"),
+                    func.to_char(end, "YYYY-MM").label("period"),
+                    func.coalesce(inspections.package, "unknown").label("package"),
+                    region.label("region"),
+                    func.extract("epoch", end - start).label("seconds"),
+                ).where(and_(start.isnot(None), end.isnot(None), end >= start))
+            )
+        d = union_all(*durations).subquery()
+
+        def percentile(q):
+            return func.percentile_cont(q).within_group(d.c.seconds)
+
+        summary = select(
+            d.c.stage,
+            func.coalesce(d.c.period, ALL),
+            func.coalesce(d.c.package, ALL),
+            func.coalesce(d.c.region, ALL),
+            func.count(),
+            func.avg(d.c.seconds),
+            *(percentile(q) for q in SLA_PERCENTILES),
+            literal(now),
+        ).group_by(func.grouping_sets(*(
+            tuple_(d.c.stage, *columns)
+            for columns in _grouping_columns([d.c.period, d.c.package, d.c.region])
+        )))
+        result = self.db.execute(insert(SlaSummary).from_select([
+            "stage", "period", "package", "region", "count", "mean_seconds",
+            "p50_seconds", "p90_seconds", "p99_seconds", "refreshed_at",
+        ], summary))
+        return result.rowcount
+
+    def _summarise(self, inspections, now: datetime) -> List[dict]:
+        """NumPy fallback: fetch the timestamps once and group every combination in memory"""
+        rows = self.db.execute(
+            select(
+                inspections.package, inspections.latitude, inspections.longitude, inspections.created_at,
+                inspections.assigned_at, inspections.started_at, inspections.completed_at
+            ).where(inspections.assigned_at.isnot(None))
+        ).all()
+        if not rows:
+            return []
+        packages = np.array([r[0] or "unknown" for r in rows], dtype=object)
+        regions = np.array([region_label(r[1], r[2]) for r in rows], dtype=object)
+        times = {
+            name: np.array([_naive(r[3 + i]) for r in rows], dtype="datetime64[s]")
+            for i, name in enumerate(("created_at", "assigned_at", "started_at", "completed_at"))
+        }
+
+        summary = []
+        for stage, (start_name, end_name) in SLA_STAGES.items():
+            start, end = times[start_name], times[end_name]
+            valid = ~np.isnat(start) & ~np.isnat(end)
+            valid[valid] = end[valid] >= start[valid]
+            if not valid.any():
+                continue
+            seconds = (end[valid] - start[valid]).astype(np.float64)
+            periods = np.datetime_as_string(end[valid], unit="M")
+            labels, codes = zip(*(
+                np.unique(values.astype(str), return_inverse=True)
+                for values in (periods, packages[valid], regions[valid])
+            ))
+            sizes = [len(l) + 1 for l in labels]  # Code 0 stands for "all"
+            for keep in _grouping_columns([0, 1, 2]):
+                combined = np.zeros(len(seconds), dtype=np.int64)
+                for dim in range(3):
+                    combined = combined * sizes[dim] + (codes[dim] + 1 if dim in keep else 0)
+                keys, counts, means, percentiles = group_percentiles(combined, seconds)
+                for j, key in enumerate(keys.tolist()):
+                    parts = []
+                    for dim in (2, 1, 0):
+                        key, code = divmod(key, sizes[dim])
+                        parts.append(str(labels[dim][code - 1]) if code else ALL)
+                    region, package, period = parts
+                    summary.append({
+                        "stage": stage, "period": period, "package": package, "region": region,
+                        "count": int(counts[j]), "mean_seconds": float(means[j]),
+                        **{
+                            f"p{round(q * 100)}_seconds": float(p[j])
+                            for q, p in zip(SLA_PERCENTILES, percentiles)
+                        },
+                        "refreshed_at": now,
+                    })
+        return summary
+
+    def get_summary(self, period: str = ALL, group_by: str = "none") -> dict:
+        """
+        Stored percentiles for one period (or every month), at one breakdown
+
+        Args:
+            period: "all", a month "YYYY-MM", or "monthly" for every month
+            group_by: none, package, region or package_region
+
+        Returns:
+            Dict with refreshed_at and rows per stage (seconds)
+        """
+        query = select(SlaSummary).where(
+            SlaSummary.package == ALL if group_by in ("none", "region") else SlaSummary.package != ALL,
+            SlaSummary.region == ALL if group_by in ("none", "package") else SlaSummary.region != ALL,
+        )
+        if period == "monthly":
+            query = query.where(SlaSummary.period != ALL)
+        else:
+            query = query.where(SlaSummary.period == period)
+        rows = self.db.scalars(
+            query.order_by(SlaSummary.stage, SlaSummary.period, SlaSummary.package, SlaSummary.region)
+        ).all()
+
+        stages = {stage: [] for stage in SLA_STAGES}
+        for row in rows:
+            stages[row.stage].append({
+                "period": row.period, "package": row.package, "region": row.region, "count": row.count,
+                "mean": row.mean_seconds, "p50": row.p50_seconds, "p90": row.p90_seconds, "p99": row.p99_seconds,
+            })
+        return {
+            "refreshed_at": min((row.refreshed_at for row in rows), default=None),
+            "period": period,
+            "group_by": group_by,
+            "stages": stages,
+        }
+
+    def last_refreshed(self) -> Optional[datetime]:
+        return self.db.scalar(select(func.min(SlaSummary.refreshed_at)))
+
+def _grouping_columns(columns: list) -> List[tuple]:
+    """Every subset of (period, package, region): the grouping sets that are stored"""
+    return [
+        tuple(column for i, column in enumerate(columns) if mask & (1 << i))
+        for mask in range(1 << len(columns))
+    ]
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+def refresh_sla_job():
+    """Background task: rebuild the summary unless another refresh is already running"""
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    db = SessionLocal()
+    try:
+        SlaService(db).refresh()
+    finally:
+        db.close()
+        _refresh_lock.release()
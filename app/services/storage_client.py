@@ -0,0 +1,315 @@
+"""
+Storage client - Application-lifetime async HTTP client for the Supabase Storage API
+One pooled keep-alive client (HTTP/2 when h2 is installed) is shared by every
+request. Transfers run in parallel under a semaphore and retry transient
+failures with jittered exponential backoff.
+"""
+import asyncio
+import os
+import random
+import shutil
+from typing import AsyncIterator, Callable, Dict, List, Optional, Union
+
+import anyio
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx negotiates HTTP/2 only when h2 is importable)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "16"))  # Transfers in flight per process
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", "32"))
+STORAGE_MAX_RETRIES = int(os.getenv("STORAGE_MAX_RETRIES", "4"))
+STORAGE_TIMEOUT_SECONDS = float(os.getenv("STORAGE_TIMEOUT_SECONDS", "60"))
+STORAGE_BACKOFF_BASE_SECONDS = 0.2
+STORAGE_BACKOFF_MAX_SECONDS = 10.0
+SIGN_BATCH_SIZE = 100  # Paths per batch sign request
+UPLOAD_PART_SIZE = 1024 * 1024  # Bytes read per step when streaming a file body
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Field mode keeps objects on local disk until the sync engine pushes them
+FIELD_STORAGE_DIR = os.getenv("FIELD_STORAGE_DIR", "field-storage" if os.getenv("FIELD_MODE") == "on" else "")
+CONTENT_TYPE_SUFFIX = ".content-type"  # Sidecar holding a local object's Content-Type
+
+Body = Union[bytes, AsyncIterator[bytes], None]
+
+class StorageError(Exception):
+    """Raised when a storage request still fails after all retries"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status  # HTTP status of the last attempt, if one was received
+
+class StorageClient:
+    """
+    Pooled async client for one storage project and bucket
+
+    With local_dir (FIELD_STORAGE_DIR) objects are written under that directory
+    instead. With neither it runs in mock mode: nothing is sent and signed URLs
+    point at a placeholder host, as in local development.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        key: Optional[str] = None,
+        bucket: Optional[str] = None,
+        max_concurrency: int = STORAGE_MAX_CONCURRENCY,
+        local_dir: Optional[str] = None
+    ):
+        self.url = (url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        self.key = key if key is not None else os.getenv("SUPABASE_KEY", "")
+        self.bucket = bucket or os.getenv("SUPABASE_BUCKET", "inspection-images")
+        self.max_concurrency = max_concurrency
+        self.local_dir = local_dir if local_dir is not None else FIELD_STORAGE_DIR
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def mock(self) -> bool:
+        return not self.url and not self.local_dir
+
+    def local_path(self, storage_path: str) -> str:
+        """File backing an object in local mode"""
+        return os.path.join(self.local_dir, *storage_path.split("/"))
+
+    async def _write_local(self, storage_path: str, body: Callable[[], Body], content_type: str) -> str:
+        path = self.local_path(storage_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = body()
+        async with await anyio.open_file(path + ".part", "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                await f.write(data)
+            elif data is not None:
+                async for chunk in data:
+                    await f.write(chunk)
+        async with await anyio.open_file(path + CONTENT_TYPE_SUFFIX, "w") as f:
+            await f.write(content_type)
+        os.replace(path + ".part", path)
+        return storage_path
+
+    def _http(self) -> httpx.AsyncClient:
+        # httpx pools are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.url}/storage/v1",
+                headers={"Authorization": f"Bearer {self.key}", "apikey": self.key},
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=STORAGE_MAX_CONNECTIONS,
+                    max_keepalive_connections=STORAGE_MAX_CONNECTIONS,
+                    keepalive_expiry=60
+                ),
+                timeout=httpx.Timeout(STORAGE_TIMEOUT_SECONDS, connect=10)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        """Close the pool if it belongs to the running loop"""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    async def _request(self, method: str, path: str, body: Callable[[], Body] = None, **kwargs) -> httpx.Response:
+        """
+        Send one request under the concurrency limit, retrying transient failures
+
+        Args:
+            body: Factory returning a fresh request body per attempt (streams can't be replayed)
+
+        Raises:
+            StorageError: Non-retryable status, or retries exhausted
+        """
+        client = self._http()
+        status = None
+        async with self._semaphore:
+            for attempt in range(STORAGE_MAX_RETRIES + 1):
+                try:
+                    response = await client.request(
+                        method, path, content=body() if body else None, **kwargs
+                    )
+                    if response.status_code < 400:
+                        return response
+                    status = response.status_code
+                    error = f"{method} {path}: HTTP {status} {response.text[:200]}"
+                    if status not in RETRY_STATUSES:
+                        raise StorageError(error, status)
+                except httpx.TransportError as e:
+                    error = f"{method} {path}: {e!r}"
+                if attempt < STORAGE_MAX_RETRIES:
+                    # Full jitter keeps parallel transfers from retrying in lockstep
+                    delay = min(STORAGE_BACKOFF_MAX_SECONDS, STORAGE_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                    await asyncio.sleep(random.uniform(0, delay))
+        raise StorageError(error, status)
+
+    async def upload(
+        self,
+        storage_path: str,
+        body: Callable[[], Body],
+        content_type: str = "application/octet-stream",
+        size: Optional[int] = None
+    ) -> str:
+        """
+        Upload one object
+
+        Args:
+            storage_path: Object path inside the bucket
+            body: Factory returning bytes or an async byte iterator
+            content_type: Stored Content-Type
+            size: Content-Length when known (avoids chunked transfer encoding)
+
+        Returns:
+            The storage path
+        """
+        if self.local_dir:
+            return await self._write_local(storage_path, body, content_type)
+        if self.mock:
+            return storage_path
+        headers = {"Content-Type": content_type, "x-upsert": "true"}
+        if size is not None:
+            headers["Content-Length"] = str(size)
+        await self._request("POST", f"/object/{self.bucket}/{storage_path}", body=body, headers=headers)
+        return storage_path
+
+    async def upload_file(self, storage_path: str, local_path: str, content_type: str = "application/octet-stream") -> str:
+        """Stream a local file to storage without reading it into memory"""
+        async def chunks():
+            async with await anyio.open_file(local_path, "rb") as f:
+                while chunk := await f.read(UPLOAD_PART_SIZE):
+                    yield chunk
+
+        return await self.upload(storage_path, chunks, content_type, size=os.path.getsize(local_path))
+
+    async def download(self, storage_path: str) -> Optional[bytes]:
+        """
+        Read one object into memory (derivatives and frames, not videos)
+
+        Returns:
+            The object's bytes, or None if it doesn't exist (always None in mock mode)
+        """
+        if self.local_dir:
+            path = self.local_path(storage_path)
+            if not os.path.exists(path):
+                return None
+            async with await anyio.open_file(path, "rb") as f:
+                return await f.read()
+        if self.mock:
+            return None
+        try:
+            response = await self._request("GET", f"/object/authenticated/{self.bucket}/{storage_path}")
+        except StorageError as e:
+            if e.status in (400, 404):  # Supabase answers 400 for a missing object
+                return None
+            raise
+        return response.content
+
+    async def download_file(self, storage_path: str, local_path: str) -> bool:
+        """
+        Stream one object into a local file without holding it in memory (videos)
+
+        Not retried here: callers run it from a job that is retried as a whole.
+
+        Returns:
+            False if the object doesn't exist (always in mock mode)
+        """
+        if self.local_dir:
+            source = self.local_path(storage_path)
+            if not os.path.exists(source):
+                return False
+            await anyio.to_thread.run_sync(shutil.copyfile, source, local_path)
+            return True
+        if self.mock:
+            return False
+        client = self._http()
+        async with self._semaphore:
+            async with client.stream("GET", f"/object/authenticated/{self.bucket}/{storage_path}") as response:
+                if response.status_code in (400, 404):  # Supabase answers 400 for a missing object
+                    return False
+                if response.status_code >= 400:
+                    raise StorageError(f"GET {storage_path}: HTTP {response.status_code}", response.status_code)
+                async with await anyio.open_file(local_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(UPLOAD_PART_SIZE):
+                        await f.write(chunk)
+        return True
+
+    async def sign_many(self, storage_paths: List[str], expires_in: int = 3600) -> Dict[str, Optional[str]]:
+        """
+        Signed download URLs for many objects, batched and signed in parallel
+
+        Returns:
+            Mapping of path to signed URL (None where the object could not be signed)
+        """
+        paths = list(dict.fromkeys(storage_paths))
+        if self.local_dir:
+            return {p: f"file://{os.path.abspath(self.local_path(p))}" for p in paths}
+        if self.mock:
+            return {p: f"https://mock-storage.supabase.co/{p}?token=dummy" for p in paths}
+
+        async def sign_batch(batch):
+            response = await self._request(
+                "POST", f"/object/sign/{self.bucket}", json={"expiresIn": expires_in, "paths": batch}
+            )
+            return response.json()
+
+        batches = [paths[i:i + SIGN_BATCH_SIZE] for i in range(0, len(paths), SIGN_BATCH_SIZE)]
+        signed = dict.fromkeys(paths)
+        for results in await asyncio.gather(*(sign_batch(b) for b in batches)):
+            for item in results:
+                if item.get("signedURL") and not item.get("error"):
+                    signed[item["path"]] = f"{self.url}/storage/v1{item['signedURL']}"
+        return signed
+
+_storage_client = None
+
+def get_storage_client() -> StorageClient:
+    """The process-wide storage client"""
+    global _storage_client
+    if _storage_client is None:
+        _storage_client = StorageClient()
+    return _storage_client
+
+async def close_storage_client():
+    """Release pooled connections (application shutdown)"""
+    if _storage_client is not None:
+        await _storage_client.aclose()
+
+def run_sync(async_fn, *args):
+    """
+    Call a storage coroutine from synchronous code
+
+    Sync FastAPI routes run in AnyIO worker threads and hand the call back to
+    the server's event loop, reusing its pool. Scripts without a loop get a
+    short-lived one whose connections are closed afterwards.
+
+    Raises:
+        RuntimeError: when called on an event loop thread (an async def route);
+            await the coroutine there instead, or move the call into run_in_threadpool
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass  # No loop on this thread: a worker thread or a script
+    else:
+        raise RuntimeError(
+            f"run_sync({getattr(async_fn, '__qualname__', async_fn)}) called on the event loop thread; "
+            "await it directly or call it through run_in_threadpool"
+        )
+    try:
+        anyio.from_thread.check_cancelled()  # Raises outside AnyIO worker threads
+    except RuntimeError:
+        async def once():
+            try:
+                return await async_fn(*args)
+            finally:
+                await close_storage_client()
+        return asyncio.run(once())
+    return anyio.from_thread.run(async_fn, *args)
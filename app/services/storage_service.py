@@ -1,29 +1,131 @@
 import os
-# Mocking supabase client to avoid complex build dependency issues for now
-# from supabase import create_client, Client
-from fastapi import UploadFile
+import asyncio
+import shutil
+from typing import Dict, Iterable, List, Optional
+from fastapi import HTTPException, UploadFile, status
+import tempfile
 import uuid
 
+from app.services.storage_client import StorageClient, StorageError, UPLOAD_PART_SIZE, get_storage_client, run_sync
+
+# Resumable uploads are assembled here before being committed to the bucket
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "vyooma-uploads"))
+
 class StorageService:
-    """Service class for interacting with Storage (Semi-mocked to avoid pyroaring build issues)"""
-    
-    def __init__(self):
-        # We'll use manual HTTP requests or just log for now
-        self.url = os.getenv("SUPABASE_URL")
-        self.key = os.getenv("SUPABASE_KEY")
-        self.bucket_name = os.getenv("SUPABASE_BUCKET", "inspection-images")
-        self.supabase = None # SDK client placeholder
-    
+    """Service class for interacting with Storage through the shared StorageClient (mocked when SUPABASE_URL is unset)"""
+
+    def __init__(self, client: StorageClient = None):
+        self.client = client or get_storage_client()
+        self.bucket_name = self.client.bucket
+
     async def upload_inspection_images(self, inspection_id: int, files: list[UploadFile]):
-        """Upload implementation (currently logging due to SDK build issues)"""
-        print(f"MOCK UPLOAD: {len(files)} files for inspection {inspection_id}")
-        # In production after environment fix, we would use the SDK or httpx here
-        return {
-            "folder": f"inspections/{inspection_id}/raw",
-            "files": [{"original_name": f.filename, "storage_path": f"inspections/{inspection_id}/raw/{uuid.uuid4()}"} for f in files]
-        }
-    
-    def get_signed_url(self, storage_path: str, expires_in: int = 3600):
-        """Mock signed URL generator"""
-        # Return a dummy URL for now so the UI doesn't break
-        return f"https://mock-storage.supabase.co/{storage_path}?token=dummy"
+        """Upload every file in parallel into the inspection's raw folder"""
+        folder = f"inspections/{inspection_id}/raw"
+        if self.client.mock:
+            print(f"MOCK UPLOAD: {len(files)} files for inspection {inspection_id}")
+
+        async def upload(f: UploadFile):
+            async def body():
+                await f.seek(0)
+                while chunk := await f.read(UPLOAD_PART_SIZE):
+                    yield chunk
+            storage_path = f"{folder}/{uuid.uuid4()}"
+            await self.client.upload(storage_path, body, f.content_type or "application/octet-stream", size=f.size)
+            return {"original_name": f.filename, "storage_path": storage_path}
+
+        try:
+            stored = await asyncio.gather(*(upload(f) for f in files))
+        except StorageError as e:
+            return {"error": f"Storage upload failed: {e}"}
+        return {"folder": folder, "files": stored}
+
+    def get_signed_url(self, storage_path: str, expires_in: int = 3600) -> Optional[str]:
+        """Signed download URL for one object"""
+        return self.get_signed_urls([storage_path], expires_in)[storage_path]
+
+    def get_signed_urls(self, storage_paths: List[str], expires_in: int = 3600) -> Dict[str, Optional[str]]:
+        """
+        Signed download URLs for many objects in one round of batch requests
+
+        Blocking: from an async def route, await self.client.sign_many instead.
+        """
+        if not storage_paths:
+            return {}
+        try:
+            return run_sync(self.client.sign_many, storage_paths, expires_in)
+        except StorageError as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Storage signing failed: {e}")
+
+    def staging_path(self, upload_id: str) -> str:
+        """Local file backing a resumable upload session"""
+        return os.path.join(UPLOAD_STAGING_DIR, upload_id)
+
+    def allocate_upload(self, upload_id: str, size: int) -> str:
+        """Create a sparse staging file of the declared size so chunks can land at any offset"""
+        os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+        path = self.staging_path(upload_id)
+        with open(path, "wb") as f:
+            f.truncate(size)
+        return path
+
+    def discard_upload(self, upload_id: str):
+        """Remove the staging file of an expired or committed session"""
+        try:
+            os.remove(self.staging_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def stage_copy(self, source) -> str:
+        """Copy an open upload into the staging area (for post-response processing)"""
+        os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+        path = self.staging_path(str(uuid.uuid4()))
+        source.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(source, out, UPLOAD_PART_SIZE)
+        return path
+
+    def commit_uploads(self, inspection_id: int, uploads: List[tuple], keep: Iterable[str] = ()) -> List[dict]:
+        """
+        Stream fully received staging files into the inspection's raw folder, in parallel
+
+        Blocking, like get_signed_urls: call it from sync code or through run_in_threadpool.
+
+        Args:
+            inspection_id: Inspection owning the files
+            uploads: (upload_id, filename) pairs
+            keep: Upload IDs whose staging file the caller will process and delete itself
+
+        Returns:
+            [{original_name, storage_path}] in the order given
+        """
+        if not uploads:
+            return []
+
+        async def commit_all():
+            async def commit(upload_id, filename):
+                storage_path = f"inspections/{inspection_id}/raw/{uuid.uuid4()}"
+                if self.client.mock:
+                    print(f"MOCK UPLOAD: {filename} ({os.path.getsize(self.staging_path(upload_id))} bytes) -> {storage_path}")
+                else:
+                    await self.client.upload_file(storage_path, self.staging_path(upload_id))
+                return {"original_name": filename, "storage_path": storage_path}
+            return await asyncio.gather(*(commit(u, f) for u, f in uploads))
+
+        try:
+            stored = run_sync(commit_all)
+        except StorageError as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Storage upload failed: {e}")
+        keep = set(keep)
+        for upload_id, _ in uploads:
+            if upload_id not in keep:
+                self.discard_upload(upload_id)
+        return stored
+
+_storage_service = None
+
+def get_storage_service() -> StorageService:
+    """Shared StorageService bound to the process-wide client"""
+    global _storage_service
+    if _storage_service is None:
+        _storage_service = StorageService()
+    return _storage_service
@@ -0,0 +1,541 @@
+"""
+Sync service - Offline field mode
+A field laptop runs this backend with FIELD_MODE=on against a local WAL-mode
+SQLite store holding the pilot's assigned inspections; uploaded files stay under
+FIELD_STORAGE_DIR. When a link is available, SyncEngine exchanges changes with
+the central API in gzip-compressed JSON batches:
+
+- push: changed inspection columns (with the central version they were based
+  on), status-history events and new reports with their findings, then the
+  stored files through the central upload endpoint
+- pull: the pilot's inspections changed since the last pull (keyset paged)
+
+The central SyncService merges pushed inspections three ways: a column the
+central row still holds at its base value takes the field value, a column both
+sides changed to different values is a conflict and keeps the central value.
+The field then takes the central row, so both ends agree after every sync.
+
+The laptop never holds the central signing key. Pulled users arrive without a
+password and sign in locally once one is set (admin.py field-login); those
+tokens are signed with the field key (app.auth). The pilot's central token is
+only sent on the outbound sync calls.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, and_, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Finding, Inspection, InspectionEvent, Report, SyncCursor, SyncRecord, User
+from app.schemas import SyncInspectionChange, SyncPush
+from app.services.history_service import write_events
+from app.services.inspection_service import invalidate_inspections
+from app.services.report_service import ReportService
+from app.services.storage_client import CONTENT_TYPE_SUFFIX, get_storage_client
+
+logger = logging.getLogger(__name__)
+
+FIELD_SYNC_URL = os.getenv("FIELD_SYNC_URL", "")  # Central API base URL, e.g. https://api.example.com
+FIELD_SYNC_TOKEN = os.getenv("FIELD_SYNC_TOKEN", "")  # The pilot's access token for the central API
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "500"))  # Rows of each kind per push request
+SYNC_PULL_PAGE_SIZE = int(os.getenv("SYNC_PULL_PAGE_SIZE", "1000"))
+SYNC_UPLOAD_BATCH_FILES = int(os.getenv("SYNC_UPLOAD_BATCH_FILES", "20"))
+SYNC_UPLOAD_BATCH_BYTES = int(os.getenv("SYNC_UPLOAD_BATCH_BYTES", str(64 * 1024 * 1024)))
+SYNC_MAX_BATCH_BYTES = int(os.getenv("SYNC_MAX_BATCH_BYTES", str(32 * 1024 * 1024)))  # Decompressed request limit
+SYNC_MAX_RETRIES = int(os.getenv("SYNC_MAX_RETRIES", "5"))
+SYNC_TIMEOUT_SECONDS = float(os.getenv("SYNC_TIMEOUT_SECONDS", "120"))
+# Rows committed late with an earlier updated_at than the cursor are caught by re-reading this window
+SYNC_PULL_OVERLAP_SECONDS = 300
+
+# Columns a pilot's field copy may change; everything else is central-owned
+SYNC_COLUMNS = ("status", "analysis_status", "started_at", "completed_at", "raw_images_path", "processed_images_path")
+INSPECTION_STATUSES = ("pending", "scheduled", "completed", "cancelled")
+ANALYSIS_STATUSES = ("not_started", "processing", "completed", "failed")
+_ROW_COLUMNS = [column.name for column in Inspection.__table__.columns if column.name != "updated_at"]
+_DATETIME_COLUMNS = {column.name for column in Inspection.__table__.columns if isinstance(column.type, DateTime)}
+_REPORT_FIELDS = ("inspection_id", "title", "summary", "defect_classification", "image_url", "confidence")
+_FINDING_FIELDS = ("defect_class", "confidence", "frame_path", "latitude", "longitude")
+
+def _json_value(value):
+    """Datetimes as naive-UTC ISO strings, so field and central copies compare equal"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    return value
+
+def _column_value(name: str, value):
+    if name in _DATETIME_COLUMNS and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+def _naive(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def _valid_change(name: str, value) -> bool:
+    """Whether a pushed value fits its synced column (statuses from their sets, ISO datetimes, strings)"""
+    if name == "status":
+        return value in INSPECTION_STATUSES
+    if name == "analysis_status":
+        return value in ANALYSIS_STATUSES
+    if value is None:
+        return True
+    if not isinstance(value, str):
+        return False
+    if name in _DATETIME_COLUMNS:
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            return False
+    return True
+
+def row_values(inspection: Inspection) -> dict:
+    """Inspection as synced (JSON-safe, without updated_at)"""
+    return {name: _json_value(getattr(inspection, name)) for name in _ROW_COLUMNS}
+
+def encode_batch(payload: dict, compress: bool = True) -> bytes:
+    body = json.dumps(payload, default=_json_value, separators=(",", ":")).encode()
+    return gzip.compress(body, compresslevel=6) if compress else body
+
+def decode_batch(body: bytes, encoding: Optional[str]) -> dict:
+    """
+    Parse a (possibly gzip-encoded) JSON batch
+
+    Raises:
+        HTTPException: 413 if it inflates past SYNC_MAX_BATCH_BYTES, 400 if it isn't valid
+    """
+    try:
+        if encoding == "gzip":
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = inflater.decompress(body, SYNC_MAX_BATCH_BYTES + 1)
+        if len(body) > SYNC_MAX_BATCH_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Sync batch too large")
+        payload = json.loads(body)
+    except (zlib.error, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Sync batch is not valid (gzip) JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Sync batch must be a JSON object")
+    return payload
+
+class SyncService:
+    """Central side of field sync: serves changes to pilots and merges what they push"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def changes(self, pilot_id: int, after: Optional[str] = None, limit: int = SYNC_PULL_PAGE_SIZE) -> dict:
+        """
+        The pilot's inspections changed after a cursor, oldest change first
+
+        Args:
+            pilot_id: Pilot pulling
+            after: cursor of the previous page ("<updated_at>|<id>"), None for everything
+            limit: Rows per page
+
+        Returns:
+            Dict with inspections, users they reference (no credentials),
+            assigned (ids still open for the pilot), cursor and more
+        """
+        query = select(Inspection).where(Inspection.pilot_id == pilot_id)
+        if after:
+            try:
+                stamp, _, last_id = after.rpartition("|")
+                key = (datetime.fromisoformat(stamp), int(last_id))
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync cursor")
+            query = query.where(or_(
+                Inspection.updated_at > key[0],
+                and_(Inspection.updated_at == key[0], Inspection.id > key[1])
+            ))
+        rows = self.db.scalars(query.order_by(Inspection.updated_at, Inspection.id).limit(limit + 1)).all()
+        page = rows[:limit]
+
+        assigned = list(self.db.scalars(
+            select(Inspection.id).where(
+                Inspection.pilot_id == pilot_id, Inspection.status.notin_(("completed", "cancelled"))
+            )
+        ))
+        user_ids = {pilot_id} | {row.customer_id for row in page}
+        users = self.db.execute(
+            select(User.id, User.name, User.email, User.role).where(User.id.in_(user_ids))
+        ).mappings().all()
+
+        last = page[-1] if page else None
+        return {
+            "inspections": [{**row_values(row), "updated_at": _json_value(row.updated_at)} for row in page],
+            "users": [dict(user) for user in users],
+            "assigned": assigned,
+            "cursor": f"{_json_value(last.updated_at)}|{last.id}" if last else after,
+            "more": len(rows) > limit,
+        }
+
+    def apply_push(self, pilot_id: int, payload: SyncPush) -> dict:
+        """
+        Merge a field batch into the central database
+
+        Args:
+            pilot_id: Pilot pushing (only their assigned inspections are accepted)
+            payload: Validated batch: inspection change sets, events and reports
+
+        Returns:
+            Per-inspection result with the merged central row and any conflicts,
+            events stored, and the central id (or error) per pushed report
+        """
+        items, events, reports = payload.inspections, payload.events, payload.reports
+
+        ids = {item.id for item in items} | {event.inspection_id for event in events}
+        ids |= {report.inspection_id for report in reports}
+        owned = {
+            row.id: row for row in self.db.scalars(
+                select(Inspection).where(Inspection.id.in_(ids), Inspection.pilot_id == pilot_id).with_for_update()
+            )
+        } if ids else {}
+
+        results = []
+        changed = []
+        for item in items:
+            row = owned.get(item.id)
+            if row is None:
+                results.append({"id": item.id, "result": "rejected", "detail": "Not assigned to you"})
+                continue
+            conflicts = self._merge(row, item)
+            changed.append(row)
+            results.append({"id": row.id, "result": "conflict" if conflicts else "applied", "conflicts": conflicts})
+
+        stored = 0
+        accepted = [
+            {
+                "event_id": event.event_id, "inspection_id": event.inspection_id,
+                "field": (event.field or "status")[:50], "from_value": event.from_value,
+                "to_value": event.to_value[:50], "actor_id": pilot_id,
+                "source": f"field:{event.source or 'status'}"[:50],
+                "occurred_at": _naive(event.occurred_at),
+            }
+            for event in events
+            if event.inspection_id in owned
+        ]
+        self.db.commit()  # Merged rows first: write_events rolls back to recover from redelivered events
+        if accepted:
+            stored = write_events(self.db, accepted)
+
+        report_results = []
+        for report in reports:
+            if report.inspection_id not in owned:
+                report_results.append({"local_id": report.local_id, "status_code": 403, "detail": "Not assigned to you"})
+                continue
+            try:
+                created = ReportService(self.db).create_report(report, actor_id=pilot_id)
+                report_results.append({"local_id": report.local_id, "status_code": 201, "id": created.id})
+            except HTTPException as e:
+                self.db.rollback()
+                report_results.append({"local_id": report.local_id, "status_code": e.status_code, "detail": e.detail})
+
+        invalidate_inspections(owned)
+        merged = {row.id: row_values(row) for row in self.db.scalars(
+            select(Inspection).where(Inspection.id.in_([r["id"] for r in results if r["result"] != "rejected"]))
+            .execution_options(populate_existing=True)
+        )} if changed else {}
+        for result in results:
+            if result["id"] in merged:
+                result["row"] = merged[result["id"]]
+        return {
+            "inspections": results,
+            "events": {"received": len(events), "stored": stored},
+            "reports": report_results,
+        }
+
+    @staticmethod
+    def _merge(row: Inspection, item: SyncInspectionChange) -> Dict[str, dict]:
+        """Apply a field change set to a central row; returns the conflicting columns"""
+        current = row_values(row)
+        base = item.base
+        unchanged_since_base = row.version == item.base_version
+        conflicts = {}
+        for name, value in item.changes.items():
+            if name not in SYNC_COLUMNS or current[name] == value:
+                continue
+            if not _valid_change(name, value):
+                conflicts[name] = {"base": base.get(name), "field": value, "central": current[name], "detail": "invalid value"}
+                continue
+            if unchanged_since_base or current[name] == base.get(name):
+                setattr(row, name, _column_value(name, value))
+            else:
+                conflicts[name] = {"base": base.get(name), "field": value, "central": current[name]}
+        return conflicts
+
+class SyncError(Exception):
+    """Raised when the central API can't be reached or rejects a sync request after all retries"""
+
+class SyncEngine:
+    """
+    Field side of sync: pushes the local store's changes to the central API and pulls the pilot's work
+
+    Args:
+        db: Session on the local field store
+        base_url: Central API base URL (FIELD_SYNC_URL)
+        token: The pilot's central access token (FIELD_SYNC_TOKEN), sent only to the central API
+        client: httpx.Client to use (one with keep-alive is created otherwise)
+    """
+
+    def __init__(self, db: Session, base_url: str = FIELD_SYNC_URL, token: str = FIELD_SYNC_TOKEN, client: httpx.Client = None):
+        if not base_url or not token:
+            raise SyncError("FIELD_SYNC_URL and FIELD_SYNC_TOKEN must be set")
+        self.db = db
+        self.client = client or httpx.Client(base_url=base_url.rstrip("/"), timeout=SYNC_TIMEOUT_SECONDS)
+        self.headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
+        self.storage = get_storage_client()
+        self.stats = {"requests": 0, "bytes_sent": 0, "bytes_received": 0}
+
+    def run(self) -> dict:
+        """
+        One full sync: push rows, push files, pull
+
+        Returns:
+            Counts of what moved, conflicts and rejections, and round trips used
+        """
+        self.stats = {"requests": 0, "bytes_sent": 0, "bytes_received": 0}
+        result = {**self.push(), **self.push_objects(), **self.pull()}
+        return {**result, **self.stats}
+
+    def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send with retries on transport errors and 5xx (flaky field links)"""
+        for attempt in range(SYNC_MAX_RETRIES + 1):
+            try:
+                response = self.client.request(method, path, **kwargs)
+                self.stats["requests"] += 1
+                self.stats["bytes_sent"] += len(response.request.content or b"")
+                self.stats["bytes_received"] += len(response.content)
+                if response.status_code < 500:
+                    return response
+                error = f"{method} {path}: HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = f"{method} {path}: {e!r}"
+            if attempt < SYNC_MAX_RETRIES:
+                time.sleep(random.uniform(0, min(30.0, 0.5 * 2 ** attempt)))
+        raise SyncError(error)
+
+    def _cursor(self, name: str) -> Optional[str]:
+        cursor = self.db.get(SyncCursor, name)
+        return cursor.value if cursor else None
+
+    def _set_cursor(self, name: str, value: Optional[str]):
+        cursor = self.db.get(SyncCursor, name) or SyncCursor(name=name)
+        cursor.value = value
+        self.db.add(cursor)
+
+    def _records(self, kind: str) -> Dict[str, SyncRecord]:
+        return {r.local_id: r for r in self.db.scalars(select(SyncRecord).where(SyncRecord.kind == kind))}
+
+    def _take_central(self, row: dict, local: Optional[Inspection], record: Optional[SyncRecord]) -> SyncRecord:
+        """Make the local row equal to the central one and remember it as the merge base"""
+        if local is None:
+            local = Inspection(id=row["id"])
+            self.db.add(local)
+        for name in _ROW_COLUMNS:
+            if name not in ("id", "version"):
+                setattr(local, name, _column_value(name, row.get(name)))
+        if record is None:
+            record = SyncRecord(kind="inspection", local_id=str(row["id"]))
+            self.db.add(record)
+        record.base_version = row["version"]
+        record.base_values = json.dumps({name: row.get(name) for name in SYNC_COLUMNS})
+        record.synced_at = datetime.utcnow()
+        self.db.flush()
+        self.db.refresh(local, ["version"])
+        record.synced_version = local.version
+        return record
+
+    def push(self) -> dict:
+        """Send changed inspections, new events and new reports, SYNC_BATCH_SIZE of each per request"""
+        records = self._records("inspection")
+        pushed_reports = self._records("report")
+        changes = []
+        for inspection in self.db.scalars(select(Inspection)):
+            record = records.get(str(inspection.id))
+            if record is None or inspection.version == record.synced_version:
+                continue
+            base = json.loads(record.base_values or "{}")
+            values = row_values(inspection)
+            changed = {name: values[name] for name in SYNC_COLUMNS if values[name] != base.get(name)}
+            if changed:
+                changes.append({"id": inspection.id, "base_version": record.base_version, "base": base, "changes": changed})
+            else:
+                record.synced_version = inspection.version
+
+        events_after = int(self._cursor("events_pushed") or 0)
+        events = [
+            {c: _json_value(getattr(e, c)) for c in ("id", "event_id", "inspection_id", "field", "from_value", "to_value", "source", "occurred_at")}
+            for e in self.db.scalars(select(InspectionEvent).where(InspectionEvent.id > events_after).order_by(InspectionEvent.id))
+        ]
+        reports = [r for r in self.db.scalars(select(Report).order_by(Report.id)) if str(r.id) not in pushed_reports]
+        findings = {}
+        if reports:
+            for finding in self.db.scalars(select(Finding).where(Finding.report_id.in_([r.id for r in reports]))):
+                findings.setdefault(finding.report_id, []).append({f: getattr(finding, f) for f in _FINDING_FIELDS})
+
+        counts = {"pushed_inspections": 0, "pushed_events": 0, "pushed_reports": 0, "conflicts": [], "rejected": []}
+        batches = max(len(changes), len(events), len(reports))
+        for start in range(0, batches, SYNC_BATCH_SIZE):
+            batch_events = events[start:start + SYNC_BATCH_SIZE]
+            batch_reports = reports[start:start + SYNC_BATCH_SIZE]
+            body = encode_batch({
+                "inspections": changes[start:start + SYNC_BATCH_SIZE],
+                "events": batch_events,
+                "reports": [
+                    {"local_id": r.id, **{f: getattr(r, f) for f in _REPORT_FIELDS}, "findings": findings.get(r.id, [])}
+                    for r in batch_reports
+                ],
+            })
+            response = self._request("POST", "/api/v1/sync/push", content=body, headers={
+                **self.headers, "Content-Encoding": "gzip", "Content-Type": "application/json",
+                # A retried batch whose response was lost is answered from the central idempotency store
+                "Idempotency-Key": hashlib.sha256(body).hexdigest(),
+            })
+            if response.status_code != 200:
+                raise SyncError(f"Push rejected: HTTP {response.status_code} {response.text[:200]}")
+            result = response.json()
+
+            for item in result["inspections"]:
+                if "row" in item:
+                    self._take_central(item["row"], self.db.get(Inspection, item["id"]), records.get(str(item["id"])))
+                    counts["pushed_inspections"] += 1
+                if item.get("conflicts"):
+                    counts["conflicts"].append({"id": item["id"], "columns": item["conflicts"]})
+                if item["result"] == "rejected":
+                    counts["rejected"].append({"id": item["id"], "detail": item.get("detail")})
+            for item in result["reports"]:
+                if item["status_code"] in (201, 409):  # 409: the central database already has a report for it
+                    self.db.add(SyncRecord(kind="report", local_id=str(item["local_id"]), remote_id=item.get("id"), synced_at=datetime.utcnow()))
+                    counts["pushed_reports"] += item["status_code"] == 201
+                if item["status_code"] != 201:
+                    counts["rejected"].append({"report": item["local_id"], "detail": item.get("detail")})
+            if batch_events:
+                self._set_cursor("events_pushed", str(batch_events[-1]["id"]))
+                counts["pushed_events"] += result["events"]["stored"]
+            self.db.commit()
+        self.db.commit()
+        return counts
+
+    def _pending_objects(self) -> Dict[int, List[str]]:
+        """Locally stored raw files not pushed yet, by inspection"""
+        root = os.path.join(self.storage.local_dir, "inspections")
+        if not self.storage.local_dir or not os.path.isdir(root):
+            return {}
+        done = self._records("object")
+        pending = {}
+        for inspection_dir in sorted(os.listdir(root)):
+            raw = os.path.join(root, inspection_dir, "raw")
+            if not inspection_dir.isdigit() or not os.path.isdir(raw):
+                continue
+            for name in sorted(os.listdir(raw)):
+                storage_path = f"inspections/{inspection_dir}/raw/{name}"
+                if name.endswith((CONTENT_TYPE_SUFFIX, ".part")) or storage_path in done:
+                    continue
+                pending.setdefault(int(inspection_dir), []).append(storage_path)
+        return pending
+
+    def push_objects(self) -> dict:
+        """Send stored files through the central upload endpoint, several per request"""
+        counts = {"pushed_files": 0, "pushed_bytes": 0, "skipped_files": 0}
+        for inspection_id, paths in self._pending_objects().items():
+            batches, batch, size = [], [], 0
+            for path in paths:
+                file_size = os.path.getsize(self.storage.local_path(path))
+                if batch and (len(batch) >= SYNC_UPLOAD_BATCH_FILES or size + file_size > SYNC_UPLOAD_BATCH_BYTES):
+                    batches.append(batch)
+                    batch, size = [], 0
+                batch.append(path)
+                size += file_size
+            batches.append(batch)
+
+            for batch in batches:
+                files = []
+                for path in batch:
+                    local = self.storage.local_path(path)
+                    try:
+                        with open(local + CONTENT_TYPE_SUFFIX) as f:
+                            content_type = f.read().strip() or "application/octet-stream"
+                    except FileNotFoundError:
+                        content_type = "application/octet-stream"
+                    name = os.path.basename(path) + (mimetypes.guess_extension(content_type) or "")
+                    files.append(("files", (name, open(local, "rb"), content_type)))
+                try:
+                    response = self._request(
+                        "POST", f"/api/v1/inspections/{inspection_id}/upload", files=files,
+                        headers={**self.headers, "Idempotency-Key": hashlib.sha256("\n".join(batch).encode()).hexdigest()}
+                    )
+                finally:
+                    for _, (_, handle, _) in files:
+                        handle.close()
+                if response.status_code != 200:
+                    logger.warning("Upload of %d files for inspection %d rejected: HTTP %d %s",
+                                   len(batch), inspection_id, response.status_code, response.text[:200])
+                    counts["skipped_files"] += len(batch)
+                    break
+                for path in batch:
+                    self.db.add(SyncRecord(kind="object", local_id=path, synced_at=datetime.utcnow()))
+                    counts["pushed_bytes"] += os.path.getsize(self.storage.local_path(path))
+                counts["pushed_files"] += len(batch)
+                self.db.commit()
+        return counts
+
+    def pull(self) -> dict:
+        """Take the pilot's central changes (local rows with unpushed changes are kept) and drop finished work"""
+        records = self._records("inspection")
+        cursor = self._cursor("pull")
+        after = None
+        if cursor:
+            stamp, _, _ = cursor.rpartition("|")
+            after = f"{(datetime.fromisoformat(stamp) - timedelta(seconds=SYNC_PULL_OVERLAP_SECONDS)).isoformat()}|0"
+
+        counts = {"pulled_inspections": 0, "kept_local": 0, "dropped_inspections": 0}
+        assigned = set()
+        while True:
+            response = self._request("GET", "/api/v1/sync/changes", params={"after": after} if after else None, headers=self.headers)
+            if response.status_code != 200:
+                raise SyncError(f"Pull rejected: HTTP {response.status_code} {response.text[:200]}")
+            page = response.json()
+            for user in page["users"]:
+                if self.db.get(User, user["id"]) is None:
+                    # No usable password until one is set locally (admin.py field-login)
+                    self.db.add(User(**user, password="!"))
+            assigned = set(page["assigned"])
+            for row in page["inspections"]:
+                local = self.db.get(Inspection, row["id"])
+                if local is None and row["id"] not in assigned:
+                    continue  # Finished work not held here
+                record = records.get(str(row["id"]))
+                if local is not None and record is not None and local.version != record.synced_version:
+                    counts["kept_local"] += 1  # Merged on the next push
+                    continue
+                records[str(row["id"])] = self._take_central(row, local, record)
+                counts["pulled_inspections"] += 1
+            after = page["cursor"]
+            if page["inspections"]:
+                self._set_cursor("pull", after)
+            self.db.commit()
+            if not page["more"]:
+                break
+
+        pushed_reports = self._records("report")
+        unpushed = {r.inspection_id for r in self.db.scalars(select(Report)) if str(r.id) not in pushed_reports}
+        for inspection in self.db.scalars(select(Inspection).where(Inspection.id.notin_(assigned))).all():
+            record = records.get(str(inspection.id))
+            if record is None or inspection.version != record.synced_version or inspection.id in unpushed:
+                continue
+            self.db.delete(inspection)
+            self.db.delete(record)
+            counts["dropped_inspections"] += 1
+        self.db.commit()
+        return counts
@@ -0,0 +1,251 @@
+"""
+Synthetic data generator - Bulk realistic users, inspections, reports and findings
+Used for load testing and benchmarking. Rows are built in batches and written
+with COPY on Postgres (psycopg2) or multi-row INSERTs everywhere else.
+"""
+import csv
+import io
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from app.auth import hash_password
+from app.models import User, Inspection, Report, Finding, DEFECT_CLASSES
+
+BATCH_SIZE = 10000
+SYNTHETIC_PASSWORD = "password123"
+
+PACKAGES = (["Basic", "Advanced", "Premium", "Elite"], [40, 30, 20, 10])
+STATUSES = (["completed", "scheduled", "pending", "cancelled"], [60, 15, 15, 10])
+DEFECT_WEIGHTS = [25, 40, 15, 20]  # Aligned with DEFECT_CLASSES
+
+# (region, latitude, longitude) - solar-heavy regions
+REGIONS = [
+    ("Rajasthan", 26.9, 73.0),
+    ("Gujarat", 23.0, 72.0),
+    ("Karnataka", 14.5, 76.0),
+    ("Tamil Nadu", 10.8, 78.5),
+    ("Telangana", 17.4, 78.5),
+    ("Andhra Pradesh", 15.5, 79.0),
+    ("Maharashtra", 19.0, 75.5),
+    ("Madhya Pradesh", 23.5, 78.0),
+]
+
+class SyntheticDataGenerator:
+    """Generates and bulk-loads synthetic data with explicit, pre-allocated IDs"""
+
+    def __init__(self, db: Session, seed: int = 42, batch_size: int = BATCH_SIZE):
+        self.db = db
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = datetime.utcnow()
+        self.use_copy = db.get_bind().dialect.driver == "psycopg2"
+
+    def generate(self, users: int, inspections: int, pilot_ratio: float = 0.1, findings_per_report: float = 8.0) -> dict:
+        """
+        Generate and insert a full synthetic dataset
+
+        Args:
+            users: Number of users (customers + pilots)
+            inspections: Number of inspections spread over the customers
+            pilot_ratio: Fraction of users that are pilots
+            findings_per_report: Mean number of findings per completed inspection
+
+        Returns:
+            Dict of inserted row counts per table
+        """
+        pilots = max(1, int(users * pilot_ratio))
+        customers = max(1, users - pilots)
+
+        user_start = self._next_id(User)
+        customer_ids = range(user_start, user_start + customers)
+        pilot_ids = range(user_start + customers, user_start + customers + pilots)
+        counts = {"users": self._load(User, self._users(user_start, customers, pilots))}
+        self.db.commit()
+
+        counts["inspections"] = 0
+        counts["reports"] = 0
+        counts["findings"] = 0
+        inspection_id = self._next_id(Inspection)
+        report_id = self._next_id(Report)
+        finding_id = self._next_id(Finding)
+
+        # Heavy-tailed portfolio sizes: a few customers own most of the sites
+        cum_weights = list(itertools.accumulate(self.random.paretovariate(1.2) for _ in customer_ids))
+        sites = {cid: self._site() for cid in customer_ids}
+
+        remaining = inspections
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            owners = self.random.choices(customer_ids, cum_weights=cum_weights, k=size)
+            inspection_rows, report_rows, finding_rows = [], [], []
+            for customer_id in owners:
+                row = self._inspection(inspection_id, customer_id, sites[customer_id], pilot_ids)
+                inspection_rows.append(row)
+                if row["status"] == "completed":
+                    report_rows.append(self._report(report_id, row))
+                    for _ in range(self._poisson(findings_per_report)):
+                        finding_rows.append(self._finding(finding_id, report_id, row, sites[customer_id]))
+                        finding_id += 1
+                    report_id += 1
+                inspection_id += 1
+
+            counts["inspections"] += self._load(Inspection, [inspection_rows])
+            counts["reports"] += self._load(Report, [report_rows])
+            counts["findings"] += self._load(Finding, [finding_rows])
+            self.db.commit()
+            remaining -= size
+
+        self._reset_sequences([User, Inspection, Report, Finding])
+        return counts
+
+    # --- Row builders ---------------------------------------------------------------
+
+    def _users(self, start: int, customers: int, pilots: int) -> Iterator[List[dict]]:
+        # One hash shared by every synthetic user; PBKDF2 per row would dominate runtime
+        password = hash_password(SYNTHETIC_PASSWORD)
+        batch = []
+        for offset in range(customers + pilots):
+            user_id = start + offset
+            role = "customer" if offset < customers else "pilot"
+            _, lat, lon = self.random.choice(REGIONS)
+            batch.append({
+                "id": user_id,
+                "name": f"Synthetic {role.title()} {user_id}",
+                "email": f"{role}{user_id}@synthetic.vyooma.test",
+                "password": password,
+                "role": role,
+                "created_at": self.now - timedelta(days=self.random.uniform(0, 1095)),
+                "latitude": lat + self.random.uniform(-2, 2) if role == "pilot" else None,
+                "longitude": lon + self.random.uniform(-2, 2) if role == "pilot" else None,
+            })
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _site(self) -> tuple:
+        region, lat, lon = self.random.choice(REGIONS)
+        return (
+            f"{region} Solar Park {self.random.randint(1, 999)}",
+            lat + self.random.uniform(-1.5, 1.5),
+            lon + self.random.uniform(-1.5, 1.5),
+        )
+
+    def _inspection(self, inspection_id: int, customer_id: int, site: tuple, pilot_ids: range) -> dict:
+        status = self.random.choices(*STATUSES)[0]
+        created_at = self.now - timedelta(days=self.random.uniform(0, 1095))
+        row = {
+            "id": inspection_id,
+            "customer_id": customer_id,
+            "pilot_id": None,
+            "status": status,
+            "location": site[0],
+            "scheduled_date": created_at + timedelta(days=self.random.uniform(1, 30)),
+            "package": self.random.choices(*PACKAGES)[0],
+            "created_at": created_at,
+            "latitude": site[1],
+            "longitude": site[2],
+            "assigned_at": None,
+            "started_at": None,
+            "completed_at": None,
+            "analysis_status": "not_started",
+            "raw_images_path": None,
+            "processed_images_path": None,
+        }
+        if status in ("scheduled", "completed"):
+            row["pilot_id"] = self.random.choice(pilot_ids)
+            row["assigned_at"] = created_at + timedelta(hours=self.random.lognormvariate(2.5, 1.0))
+        if status == "completed":
+            row["started_at"] = row["assigned_at"] + timedelta(hours=self.random.lognormvariate(3.5, 0.8))
+            row["completed_at"] = row["started_at"] + timedelta(hours=self.random.lognormvariate(1.5, 0.6))
+            row["analysis_status"] = "completed"
+            row["raw_images_path"] = f"inspections/{inspection_id}/raw"
+        return row
+
+    def _report(self, report_id: int, inspection: dict) -> dict:
+        defect = self.random.choices(DEFECT_CLASSES, weights=DEFECT_WEIGHTS)[0]
+        return {
+            "id": report_id,
+            "inspection_id": inspection["id"],
+            "title": f"{inspection['package']} inspection - {inspection['location']}",
+            "summary": f"Automated analysis found predominantly {defect.replace('_', ' ').lower()} defects.",
+            "defect_classification": defect,
+            "image_url": None,
+            "confidence": self._confidence(),
+            "created_at": inspection["completed_at"],
+        }
+
+    def _finding(self, finding_id: int, report_id: int, inspection: dict, site: tuple) -> dict:
+        return {
+            "id": finding_id,
+            "report_id": report_id,
+            "inspection_id": inspection["id"],
+            "defect_class": self.random.choices(DEFECT_CLASSES, weights=DEFECT_WEIGHTS)[0],
+            "confidence": self._confidence(),
+            "frame_path": f"inspections/{inspection['id']}/raw/frame_{self.random.randint(0, 9999):05d}.jpg",
+            "latitude": site[1] + self.random.gauss(0, 0.002),
+            "longitude": site[2] + self.random.gauss(0, 0.002),
+            "created_at": inspection["completed_at"],
+        }
+
+    def _confidence(self) -> int:
+        return max(30, min(99, int(self.random.gauss(82, 9))))
+
+    def _poisson(self, mean: float) -> int:
+        # Knuth's method is fine for the small means used here
+        limit, k, p = math.exp(-mean), 0, 1.0
+        while True:
+            p *= self.random.random()
+            if p <= limit:
+                return k
+            k += 1
+
+    # --- Bulk loading ---------------------------------------------------------------
+
+    def _next_id(self, model) -> int:
+        return (self.db.query(func.max(model.id)).scalar() or 0) + 1
+
+    def _load(self, model, batches) -> int:
+        """Insert batches of row dicts with COPY or executemany multi-row INSERTs"""
+        total = 0
+        for rows in batches:
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(model.__table__.name, rows)
+            else:
+                self.db.execute(insert(model.__table__), rows)
+            total += len(rows)
+        return total
+
+    def _copy(self, table: str, rows: List[dict]):
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if row[c] is None else row[c] for c in columns])
+        buffer.seek(0)
+        cursor = self.db.connection().connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+
+    def _reset_sequences(self, models):
+        """Explicit IDs bypass Postgres sequences, so move them past the new rows"""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return
+        for model in models:
+            table = model.__table__.name
+            self.db.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+            ))
+        self.db.commit()
@@ -0,0 +1,195 @@
+"""
+Trend service - Monthly defect rollups per customer, site and defect class
+Rollups are incremented as reports are created and can be rebuilt in bulk, so
+trend queries never touch raw findings.
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import Date, cast, delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models import DefectRollup, Finding, Inspection, Report
+from app.services.archive_service import ArchiveService
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+def _month_bucket(column, dialect: str):
+    """SQL expression truncating a timestamp to the first day of its month"""
+    if dialect == "postgresql":
+        return cast(func.date_trunc("month", column), Date)
+    if dialect == "mysql":
+        return cast(func.date_format(column, "%Y-%m-01"), Date)
+    return func.strftime("%Y-%m-01", column)
+
+class TrendService:
+    """Service class for defect trend rollups"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def record_report(self, report: Report, inspection: Inspection, defect_classes: List[str]):
+        """
+        Add a new report's defects to its month/site rollups (caller commits)
+
+        Args:
+            report: Newly created report
+            inspection: The report's inspection (customer and site)
+            defect_classes: Class of each finding; a report without findings
+                counts its defect_classification once
+        """
+        counts = Counter(defect_classes)
+        if not counts and report.defect_classification:
+            counts[report.defect_classification] = 1
+        if not counts:
+            return
+
+        month = month_start(report.created_at or datetime.utcnow())
+        rows = [
+            {
+                "customer_id": inspection.customer_id,
+                "month": month,
+                "location": inspection.location,
+                "defect_class": defect_class,
+                "count": count,
+            }
+            for defect_class, count in counts.items()
+        ]
+        self._upsert(rows)
+
+    def _upsert(self, rows: List[dict]):
+        key = ["customer_id", "month", "location", "defect_class"]
+        if self.dialect in ("postgresql", "sqlite"):
+            if self.dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(DefectRollup).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=key,
+                set_={"count": DefectRollup.count + statement.excluded["count"]}
+            )
+            self.db.execute(statement)
+        elif self.dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+            statement = dialect_insert(DefectRollup).values(rows)
+            self.db.execute(statement.on_duplicate_key_update(
+                count=DefectRollup.count + statement.inserted["count"]
+            ))
+        else:
+            for row in rows:
+                updated = self.db.query(DefectRollup).filter_by(
+                    **{k: row[k] for k in key}
+                ).update({"count": DefectRollup.count + row["count"]}, synchronize_session=False)
+                if not updated:
+                    self.db.add(DefectRollup(**row))
+
+    def rebuild(self, customer_id: Optional[int] = None) -> int:
+        """
+        Recompute rollups from reports and findings (archived ones included) with one INSERT ... SELECT
+
+        Args:
+            customer_id: Limit the rebuild to one customer (default: everyone)
+
+        Returns:
+            Number of rollup rows written
+        """
+        archive = ArchiveService(self.db)
+        inspections, reports, findings = (archive.with_archive(model) for model in (Inspection, Report, Finding))
+        month = _month_bucket(reports.created_at, self.dialect)
+
+        from_findings = (
+            select(
+                inspections.customer_id.label("customer_id"),
+                month.label("month"),
+                inspections.location.label("location"),
+                findings.defect_class.label("defect_class"),
+                func.count().label("count"),
+            )
+            .select_from(findings)
+            .join(reports, reports.id == findings.report_id)
+            .join(inspections, inspections.id == findings.inspection_id)
+            .group_by(inspections.customer_id, month, inspections.location, findings.defect_class)
+        )
+        has_findings = select(findings.id).where(findings.report_id == reports.id).exists()
+        from_reports = (
+            select(
+                inspections.customer_id.label("customer_id"),
+                month.label("month"),
+                inspections.location.label("location"),
+                reports.defect_classification.label("defect_class"),
+                func.count().label("count"),
+            )
+            .select_from(reports)
+            .join(inspections, inspections.id == reports.inspection_id)
+            .where(reports.defect_classification.isnot(None), ~has_findings)
+            .group_by(inspections.customer_id, month, inspections.location, reports.defect_classification)
+        )
+        clear = delete(DefectRollup)
+        if customer_id is not None:
+            from_findings = from_findings.where(inspections.customer_id == customer_id)
+            from_reports = from_reports.where(inspections.customer_id == customer_id)
+            clear = clear.where(DefectRollup.customer_id == customer_id)
+
+        # A report's findings and its fallback classification never overlap, so summing is safe
+        combined = union_all(from_findings, from_reports).subquery()
+        totals = select(
+            combined.c.customer_id, combined.c.month, combined.c.location,
+            combined.c.defect_class, func.sum(combined.c["count"])
+        ).group_by(combined.c.customer_id, combined.c.month, combined.c.location, combined.c.defect_class)
+
+        self.db.execute(clear)
+        result = self.db.execute(
+            insert(DefectRollup).from_select(
+                ["customer_id", "month", "location", "defect_class", "count"], totals
+            )
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def get_trends(
+        self,
+        customer_id: int,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        by_site: bool = False,
+        defect_class: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Monthly defect counts for a customer, answered from the rollup table
+
+        Args:
+            customer_id: Customer to report on
+            date_from: First month included
+            date_to: Last month included
+            by_site: Break counts down per location as well as class
+            defect_class: Restrict to one class
+
+        Returns:
+            List of {month, defect_class, count[, location]} ordered by month
+        """
+        columns = [DefectRollup.month, DefectRollup.defect_class]
+        if by_site:
+            columns.insert(1, DefectRollup.location)
+
+        query = select(*columns, func.sum(DefectRollup.count).label("count")).where(
+            DefectRollup.customer_id == customer_id
+        )
+        if date_from:
+            query = query.where(DefectRollup.month >= month_start(date_from))
+        if date_to:
+            query = query.where(DefectRollup.month <= month_start(date_to))
+        if defect_class:
+            query = query.where(DefectRollup.defect_class == defect_class)
+        query = query.group_by(*columns).order_by(*columns)
+
+        trends = []
+        for row in self.db.execute(query):
+            item = dict(row._mapping)
+            item["month"] = item["month"].strftime("%Y-%m")
+            item["count"] = int(item["count"])
+            trends.append(item)
+        return trends
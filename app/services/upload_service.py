@@ -0,0 +1,354 @@
+"""
+Upload service - Resumable chunked uploads for large flight datasets
+Clients create a session per file, PATCH chunks at byte offsets (in any order,
+in parallel) and finalize once every byte has arrived. A chunk row claims its
+offset before its bytes are copied in, and counts as received once they are.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.models import Inspection, UploadSession, UploadChunk
+from app.services.frame_service import FrameService
+from app.services.video_service import VIDEO_INGEST_MODE, is_video
+from app.services.storage_service import StorageService, get_storage_service
+
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "48"))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 ** 3)))  # 20 GB per file
+MAX_CHUNK_SIZE = int(os.getenv("MAX_CHUNK_SIZE", str(64 * 1024 ** 2)))  # 64 MB per PATCH
+UPLOAD_CHUNK_CLAIM_SECONDS = int(os.getenv("UPLOAD_CHUNK_CLAIM_SECONDS", "300"))  # Then a chunk stuck mid-write may be resent
+
+class UploadService:
+    """Service class for resumable upload sessions"""
+
+    def __init__(self, db: Session, storage: StorageService = None):
+        self.db = db
+        self.storage = storage or get_storage_service()
+
+    def create_session(self, inspection: Inspection, pilot_id: int, filename: str, size: int) -> UploadSession:
+        """
+        Open an upload session and allocate its staging file
+
+        Args:
+            inspection: Inspection receiving the file
+            pilot_id: Uploading pilot
+            filename: Original file name
+            size: Total file size in bytes
+
+        Returns:
+            Created UploadSession object
+        """
+        if size <= 0 or size > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File size must be between 1 and {MAX_UPLOAD_SIZE} bytes"
+            )
+
+        # Opportunistic garbage collection keeps the staging area bounded
+        self.purge_expired()
+
+        session = UploadSession(
+            id=str(uuid.uuid4()),
+            inspection_id=inspection.id,
+            pilot_id=pilot_id,
+            filename=filename,
+            size=size,
+            offset=0,
+            status="open",
+            expires_at=datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+        )
+        self.storage.allocate_upload(session.id, size)
+
+        self.db.add(session)
+        self.db.commit()
+        self.db.refresh(session)
+
+        return session
+
+    def get_session(self, inspection_id: int, upload_id: str, pilot_id: int) -> UploadSession:
+        """
+        Get an open upload session owned by the pilot
+
+        Raises:
+            HTTPException: 404 if unknown or expired, 403 if owned by someone else
+        """
+        session = self.db.query(UploadSession).filter(
+            UploadSession.id == upload_id,
+            UploadSession.inspection_id == inspection_id
+        ).first()
+
+        if not session or _as_naive(session.expires_at) < datetime.utcnow():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Upload {upload_id} not found or expired"
+            )
+        if session.pilot_id != pilot_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your upload")
+
+        return session
+
+    async def write_chunk(
+        self,
+        session: UploadSession,
+        offset: int,
+        body: AsyncIterator[bytes],
+        checksum: str = None,
+        length: Optional[int] = None
+    ) -> UploadSession:
+        """
+        Receive one chunk and write it into the staging file at its offset
+
+        The body is spooled to a scratch file first. Once its size, range and
+        checksum have been accepted, the offset is claimed in the chunk table
+        and only the claimant copies the bytes into place, so a rejected or
+        losing chunk never touches bytes recorded as received. File and
+        database work runs in the threadpool, off the event loop.
+
+        Args:
+            session: Open upload session
+            offset: Byte offset of the chunk within the file
+            body: Request body stream
+            checksum: Optional "sha256 <hex>" digest of the chunk
+            length: Declared chunk size (Content-Length), checked before reading the body
+
+        Returns:
+            Updated UploadSession (offset = contiguous bytes received)
+
+        Raises:
+            HTTPException: 400 on bad offset/size, 409 on overlap or a concurrent write, 460 on checksum mismatch
+        """
+        if session.status != "open":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already finalized")
+        if offset < 0 or offset >= session.size:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Offset outside file")
+
+        limit = min(MAX_CHUNK_SIZE, session.size - offset)
+        if length is not None and length > limit:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk exceeds {limit} bytes allowed at this offset"
+            )
+        # A resent chunk may replace itself but nothing else; without a length, at least its first byte is checked
+        await run_in_threadpool(self._check_range, session, offset, offset + (length or 1))
+
+        scratch = self.storage.staging_path(f"{session.id}.{uuid.uuid4().hex}.part")
+        try:
+            digest = hashlib.sha256()
+            written = 0
+            f = await run_in_threadpool(open, scratch, "wb")
+            try:
+                async for piece in body:
+                    written += len(piece)
+                    if written > limit:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Chunk exceeds {limit} bytes allowed at this offset"
+                        )
+                    digest.update(piece)
+                    await run_in_threadpool(f.write, piece)
+            finally:
+                await run_in_threadpool(f.close)
+
+            if written == 0:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty chunk")
+
+            sha256 = digest.hexdigest()
+            if checksum:
+                algorithm, _, expected = checksum.partition(" ")
+                if algorithm.lower() != "sha256" or expected.strip().lower() != sha256:
+                    # Nothing was written, so a previously accepted copy of this chunk stays valid
+                    raise HTTPException(status_code=460, detail="Chunk checksum mismatch")
+
+            return await run_in_threadpool(self._place_chunk, session, offset, scratch, written, sha256)
+        finally:
+            try:
+                os.remove(scratch)
+            except FileNotFoundError:
+                pass
+
+    def _check_range(self, session: UploadSession, start: int, end: int) -> Tuple[List[UploadChunk], Optional[UploadChunk]]:
+        """The session's chunks and the one at start (if resent), after checking start-end overlaps no other"""
+        chunks = self.db.query(UploadChunk).filter(UploadChunk.session_id == session.id).all()
+        retried = next((c for c in chunks if c.offset == start), None)
+        _check_overlap(chunks, retried, start, end)
+        return chunks, retried
+
+    def _place_chunk(self, session: UploadSession, offset: int, scratch: str, size: int, sha256: str) -> UploadSession:
+        """Claim the chunk's offset, copy the spooled bytes into the staging file and mark the chunk written"""
+        _, retried = self._check_range(session, offset, offset + size)
+        staging = self.storage.staging_path(session.id)  # Read before the claim's commit expires the session
+        now = datetime.utcnow()
+        concurrent = HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Chunk at offset {offset} is being written concurrently"
+        )
+        if retried is None:
+            chunk = UploadChunk(session_id=session.id, offset=offset, size=size, sha256=sha256, claimed_at=now)
+            self.db.add(chunk)
+            try:
+                self.db.flush()
+            except IntegrityError:  # A parallel PATCH claimed the same offset first
+                self.db.rollback()
+                raise concurrent
+            chunk_id = chunk.id
+            self.db.commit()
+        else:
+            # Take the row over only if nobody else holds it (or their claim went stale mid-write)
+            chunk_id = retried.id
+            claimed = self.db.query(UploadChunk).filter(
+                UploadChunk.id == retried.id,
+                UploadChunk.sha256 == retried.sha256,
+                or_(
+                    UploadChunk.claimed_at.is_(None),
+                    UploadChunk.claimed_at < now - timedelta(seconds=UPLOAD_CHUNK_CLAIM_SECONDS)
+                )
+            ).update({"size": size, "sha256": sha256, "claimed_at": now}, synchronize_session=False)
+            self.db.commit()
+            if not claimed:
+                raise concurrent
+
+        try:
+            with open(scratch, "rb") as source, open(staging, "r+b") as f:
+                f.seek(offset)
+                shutil.copyfileobj(source, f)
+        except OSError:
+            # Release the claim so the client can resend
+            self.db.query(UploadChunk).filter(UploadChunk.id == chunk_id).delete(synchronize_session=False)
+            self.db.commit()
+            raise
+        self.db.query(UploadChunk).filter(UploadChunk.id == chunk_id).update(
+            {"claimed_at": None}, synchronize_session=False
+        )
+        self.db.commit()
+
+        return self.sync_offset(session)
+
+    def sync_offset(self, session: UploadSession) -> UploadSession:
+        """
+        Recompute the contiguous offset from committed chunks
+
+        Parallel PATCHes each commit their own chunk row, so the offset is always
+        derived from the chunk table rather than incremented in place.
+        """
+        chunks = self.db.query(UploadChunk).filter(UploadChunk.session_id == session.id).all()
+        offset = _contiguous_offset(chunks)
+        if offset != session.offset:
+            session.offset = offset
+            self.db.commit()
+            self.db.refresh(session)
+        return session
+
+    def finalize(self, inspection: Inspection, upload_ids: List[str], pilot_id: int) -> dict:
+        """
+        Commit completed uploads to storage
+
+        Returns:
+            Dict with the raw folder and committed files, like StorageService.upload_inspection_images,
+            plus "videos": stored videos awaiting keyframes (local_path set when staged for api ingest mode)
+
+        Raises:
+            HTTPException: 404 for unknown/expired uploads, 409 if any is still missing bytes
+        """
+        sessions = self.db.query(UploadSession).filter(
+            UploadSession.id.in_(upload_ids),
+            UploadSession.inspection_id == inspection.id,
+            UploadSession.pilot_id == pilot_id,
+            UploadSession.expires_at >= datetime.utcnow()
+        ).all()
+        missing = set(upload_ids) - {s.id for s in sessions}
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Uploads not found or expired: {', '.join(sorted(missing))}"
+            )
+
+        # One query for every session's chunks instead of a sync_offset per file
+        chunks = {}
+        for chunk in self.db.query(UploadChunk).filter(UploadChunk.session_id.in_(upload_ids)):
+            chunks.setdefault(chunk.session_id, []).append(chunk)
+        for session in sessions:
+            if session.status == "open":
+                session.offset = _contiguous_offset(chunks.get(session.id, []))
+
+        incomplete = [s.id for s in sessions if s.status == "open" and s.offset < s.size]
+        if incomplete:
+            self.db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Uploads not complete: {', '.join(incomplete)}"
+            )
+
+        # Frame headers are read before the staging files are discarded
+        pending = [s for s in sessions if s.status == "open"]
+        metadata = FrameService.read_metadata([self.storage.staging_path(s.id) for s in pending])
+
+        # Every pending file is streamed to storage in parallel; videos keyframed in this process stay staged
+        videos = {s.id for s in pending if is_video(s.filename)}
+        staged = videos if VIDEO_INGEST_MODE == "api" else set()
+        stored = self.storage.commit_uploads(inspection.id, [(s.id, s.filename) for s in pending], keep=staged)
+        for session, item in zip(pending, stored):
+            session.storage_path = item["storage_path"]
+            session.status = "finalized"
+        FrameService(self.db).index_frames(inspection.id, [{**item, **meta} for item, meta in zip(stored, metadata)])
+        files = [{"original_name": s.filename, "storage_path": s.storage_path} for s in sessions]
+        staged_videos = [
+            {"local_path": self.storage.staging_path(s.id) if s.id in staged else None, "storage_path": s.storage_path}
+            for s in pending if s.id in videos
+        ]
+        self.db.commit()
+
+        return {"folder": f"inspections/{inspection.id}/raw", "files": files, "videos": staged_videos}
+
+    def purge_expired(self, limit: int = 100) -> int:
+        """
+        Delete expired sessions, their chunks and staging files
+
+        Returns:
+            Number of sessions removed
+        """
+        expired = self.db.query(UploadSession.id, UploadSession.status).filter(
+            UploadSession.expires_at < datetime.utcnow()
+        ).limit(limit).all()
+        if not expired:
+            return 0
+
+        ids = [row.id for row in expired]
+        for row in expired:
+            if row.status == "open":
+                self.storage.discard_upload(row.id)
+        self.db.query(UploadChunk).filter(UploadChunk.session_id.in_(ids)).delete(synchronize_session=False)
+        self.db.query(UploadSession).filter(UploadSession.id.in_(ids)).delete(synchronize_session=False)
+        self.db.commit()
+
+        return len(expired)
+
+def _check_overlap(chunks: List[UploadChunk], retried: Optional[UploadChunk], start: int, end: int):
+    """Reject a byte range that overlaps a recorded chunk other than the one being resent"""
+    for chunk in chunks:
+        if chunk is not retried and chunk.offset < end and start < chunk.offset + chunk.size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Chunk overlaps bytes {chunk.offset}-{chunk.offset + chunk.size - 1}"
+            )
+
+def _contiguous_offset(chunks: List[UploadChunk]) -> int:
+    """Bytes covered without gaps from the start of the file (chunks still being written don't count)"""
+    offset = 0
+    for chunk in sorted(chunks, key=lambda c: c.offset):
+        if chunk.claimed_at is not None or chunk.offset > offset:
+            break
+        offset = max(offset, chunk.offset + chunk.size)
+    return offset
+
+def _as_naive(value: datetime) -> datetime:
+    """Compare timezone-aware columns against naive utcnow() values"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
@@ -0,0 +1,345 @@
+"""
+Video service - Keyframe extraction for drone video uploads
+Frames are decoded one at a time at a reduced analysis rate. A small grayscale
+thumbnail of each is compared with the previous one (phase correlation for
+camera motion, mean absolute difference for change) and a keyframe is kept
+whenever the view has moved far enough that overlap with the last keyframe
+drops below the target. Hovering and near-identical frames are skipped.
+
+Decoding is CPU-heavy (roughly one core for the length of the video). With
+VIDEO_INGEST_MODE=worker (default) uploads only queue a VideoJob and the
+analysis workers download and keyframe the stored video; with api it runs as
+a background task in the API process that received the upload, competing with
+request handling there.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import VideoJob
+from app.services.analysis_service import ANALYSIS_CLAIM_CANDIDATES, AnalysisService
+from app.services.frame_service import FrameService
+from app.services.storage_service import StorageService, get_storage_service
+from app.services.storage_client import run_sync
+
+try:
+    import cv2
+except ImportError:  # Falls back to an ffmpeg pipe when OpenCV isn't installed
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".avi", ".mkv", ".ts")
+VIDEO_INGEST_MODE = os.getenv("VIDEO_INGEST_MODE", "worker")  # worker (analysis nodes) or api (upload's process)
+VIDEO_JOB_LEASE_SECONDS = int(os.getenv("VIDEO_JOB_LEASE_SECONDS", "3600"))  # Longest a video may take to keyframe
+VIDEO_JOB_MAX_ATTEMPTS = int(os.getenv("VIDEO_JOB_MAX_ATTEMPTS", "3"))
+VIDEO_ANALYSIS_FPS = float(os.getenv("VIDEO_ANALYSIS_FPS", "5"))  # Frames scored per second of video
+KEYFRAME_OVERLAP = float(os.getenv("KEYFRAME_OVERLAP", "0.7"))  # Target overlap between consecutive keyframes
+KEYFRAME_MAX_INTERVAL_S = float(os.getenv("KEYFRAME_MAX_INTERVAL_S", "10"))
+KEYFRAME_MAX_WIDTH = int(os.getenv("KEYFRAME_MAX_WIDTH", "1920"))
+KEYFRAME_JPEG_QUALITY = 90
+KEYFRAME_UPLOAD_BATCH = 16
+
+THUMB_SIZE = (160, 90)  # Width, height of the grayscale motion thumbnail
+STILL_DIFF = 2.0  # Mean abs gray difference below which the view hasn't changed
+SCENE_CUT_DIFF = 40.0  # Difference treated as a cut (motion estimate unreliable)
+
+def is_video(filename: Optional[str], content_type: Optional[str] = None) -> bool:
+    if content_type and content_type.startswith("video/"):
+        return True
+    return bool(filename) and filename.lower().endswith(VIDEO_EXTENSIONS)
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    """Grayscale float32 thumbnail (nearest-neighbour sampled, no OpenCV needed)"""
+    height, width = frame.shape[:2]
+    rows = np.linspace(0, height - 1, THUMB_SIZE[1]).astype(np.int64)
+    cols = np.linspace(0, width - 1, THUMB_SIZE[0]).astype(np.int64)
+    small = frame[rows][:, cols].astype(np.float32)
+    return small @ np.array([0.114, 0.587, 0.299], dtype=np.float32) if small.ndim == 3 else small
+
+_WINDOW = np.outer(np.hanning(THUMB_SIZE[1]), np.hanning(THUMB_SIZE[0])).astype(np.float32)
+
+def estimate_shift(previous: np.ndarray, current: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Global translation between two thumbnails by phase correlation
+
+    Returns:
+        (dx, dy) in thumbnail pixels and the correlation peak (0-1, confidence)
+    """
+    a = np.fft.rfft2((previous - previous.mean()) * _WINDOW)
+    b = np.fft.rfft2((current - current.mean()) * _WINDOW)
+    cross = a * np.conj(b)
+    cross /= np.abs(cross) + 1e-9
+    correlation = np.fft.irfft2(cross, s=previous.shape)
+    peak = np.unravel_index(np.argmax(correlation), correlation.shape)
+    dy, dx = (p if p <= n // 2 else p - n for p, n in zip(peak, correlation.shape))
+    return float(dx), float(dy), float(correlation[peak])
+
+def _frames_opencv(path: str, stride_s: float) -> Iterator[Tuple[float, np.ndarray]]:
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise RuntimeError(f"Could not open video {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps * stride_s))
+        index = 0
+        while True:
+            if index % step:
+                if not capture.grab():  # Skipped frames are never converted to pixels
+                    break
+            else:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+def _frames_ffmpeg(path: str, stride_s: float) -> Iterator[Tuple[float, np.ndarray]]:
+    probe = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+         "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True
+    )
+    width, height = (int(v) for v in probe.stdout.strip().split(",")[:2])
+    if width > KEYFRAME_MAX_WIDTH:
+        width, height = KEYFRAME_MAX_WIDTH, int(height * KEYFRAME_MAX_WIDTH / width) // 2 * 2
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", path, "-vf", f"fps={1 / stride_s},scale={width}:{height}",
+         "-f", "rawvideo", "-pix_fmt", "bgr24", "-"],
+        stdout=subprocess.PIPE
+    )
+    frame_bytes = width * height * 3
+    try:
+        index = 0
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yield index * stride_s, np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            index += 1
+    finally:
+        process.kill()
+        process.wait()
+
+def iter_frames(path: str, analysis_fps: float = VIDEO_ANALYSIS_FPS) -> Iterator[Tuple[float, np.ndarray]]:
+    """(timestamp seconds, BGR frame) at roughly analysis_fps, one frame in memory at a time"""
+    if cv2 is not None:
+        return _frames_opencv(path, 1 / analysis_fps)
+    if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+        return _frames_ffmpeg(path, 1 / analysis_fps)
+    raise RuntimeError("Video ingest requires opencv-python or ffmpeg")
+
+def select_keyframes(
+    frames: Iterator[Tuple[float, np.ndarray]],
+    overlap: float = KEYFRAME_OVERLAP,
+    max_interval_s: float = KEYFRAME_MAX_INTERVAL_S
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Keep frames whose view has moved on from the previous keyframe
+
+    Camera motion is integrated frame to frame; a keyframe is emitted once the
+    estimated overlap with the last one falls to `overlap`, on a scene cut, or
+    after max_interval_s if the view has changed at all.
+    """
+    last_key = previous = None
+    last_key_time = 0.0
+    moved_x = moved_y = 0.0
+    for timestamp, frame in frames:
+        thumb = _thumbnail(frame)
+        if last_key is None:
+            last_key = previous = thumb
+            last_key_time = timestamp
+            yield timestamp, frame
+            continue
+
+        change = float(np.abs(thumb - last_key).mean())
+        if float(np.abs(thumb - previous).mean()) >= STILL_DIFF:
+            dx, dy, _ = estimate_shift(previous, thumb)
+            moved_x += dx
+            moved_y += dy
+        previous = thumb
+
+        remaining = (1 - abs(moved_x) / THUMB_SIZE[0]) * (1 - abs(moved_y) / THUMB_SIZE[1])
+        due = timestamp - last_key_time >= max_interval_s and change >= STILL_DIFF
+        if remaining <= overlap or change >= SCENE_CUT_DIFF or due:
+            last_key, last_key_time = thumb, timestamp
+            moved_x = moved_y = 0.0
+            yield timestamp, frame
+
+class VideoIngestService:
+    """Service class turning an uploaded flight video into indexed keyframes"""
+
+    def __init__(self, db: Session, storage: StorageService = None):
+        self.db = db
+        self.storage = storage or get_storage_service()
+
+    def ingest(self, inspection_id: int, local_path: str, video_storage_path: str) -> int:
+        """
+        Extract keyframes, store them as JPEGs and index them as frames
+
+        Args:
+            inspection_id: Inspection the video belongs to
+            local_path: Local copy of the video (read once, streaming)
+            video_storage_path: Where the original video was stored
+
+        Returns:
+            Number of keyframes stored
+        """
+        folder = f"inspections/{inspection_id}/keyframes"
+        name = os.path.basename(video_storage_path)
+        rows, batch = [], []
+
+        def flush():
+            # Keyframes go up in parallel batches; only one batch of JPEGs is held at a time
+            run_sync(self._upload_batch, batch)
+            batch.clear()
+
+        for timestamp, frame in select_keyframes(iter_frames(local_path)):
+            storage_path = f"{folder}/{uuid.uuid4()}.jpg"
+            batch.append((storage_path, _encode_jpeg(frame)))
+            rows.append({
+                "storage_path": storage_path,
+                "original_name": f"{name}@{timestamp:.2f}s",
+                "video_path": video_storage_path,
+                "video_offset": round(timestamp, 3),
+            })
+            if len(batch) >= KEYFRAME_UPLOAD_BATCH:
+                flush()
+        if batch:
+            flush()
+
+        FrameService(self.db).index_frames(inspection_id, rows)
+        AnalysisService(self.db, self.storage).plan(inspection_id)  # Commits the keyframes with their shards
+        logger.info("Video %s: %d keyframes for inspection %s", video_storage_path, len(rows), inspection_id)
+        return len(rows)
+
+    def enqueue(self, inspection_id: int, video_storage_paths: List[str]):
+        """Queue stored videos for keyframing by the analysis workers, and commit"""
+        if video_storage_paths:
+            self.db.execute(insert(VideoJob), [
+                {"inspection_id": inspection_id, "storage_path": path, "status": "pending", "attempts": 0}
+                for path in video_storage_paths
+            ])
+        self.db.commit()
+
+    def claim(self, worker: str) -> Optional[VideoJob]:
+        """
+        Lease the oldest pending (or abandoned) video job to a worker, like AnalysisService.claim
+
+        Returns:
+            The claimed job (detached), or None if there is none
+        """
+        now = datetime.utcnow()
+        claimable = (VideoJob.status == "pending") | ((VideoJob.status == "running") & (VideoJob.lease_expires_at < now))
+        candidates = self.db.execute(
+            select(VideoJob.id, VideoJob.status, VideoJob.attempts)
+            .where(claimable)
+            .order_by(VideoJob.id)
+            .limit(ANALYSIS_CLAIM_CANDIDATES)
+            .with_for_update(skip_locked=True)
+        ).all()
+        claimed = None
+        for job_id, job_status, attempts in candidates:
+            unchanged = (VideoJob.id == job_id, VideoJob.status == job_status, VideoJob.attempts == attempts)
+            if attempts >= VIDEO_JOB_MAX_ATTEMPTS:
+                self.db.execute(update(VideoJob).where(*unchanged).values(
+                    status="failed", lease_expires_at=None, error="Lease expired on the last attempt"
+                ))
+                continue
+            if self.db.execute(update(VideoJob).where(*unchanged).values(
+                status="running", worker=worker, attempts=attempts + 1, error=None,
+                lease_expires_at=now + timedelta(seconds=VIDEO_JOB_LEASE_SECONDS)
+            )).rowcount:
+                claimed = job_id
+                break
+        self.db.commit()
+        if claimed is None:
+            return None
+        job = self.db.get(VideoJob, claimed)
+        self.db.expunge(job)
+        return job
+
+    def process_next(self, worker: str) -> bool:
+        """
+        Claim one video job, download the video and keyframe it
+
+        A failure hands the job back until VIDEO_JOB_MAX_ATTEMPTS, then fails it.
+
+        Returns:
+            Whether there was a job to work on
+        """
+        job = self.claim(worker)
+        if job is None:
+            return False
+        held = (VideoJob.id == job.id, VideoJob.worker == worker, VideoJob.status == "running")
+        try:
+            with tempfile.TemporaryDirectory(prefix="video-") as workdir:
+                local_path = os.path.join(workdir, os.path.basename(job.storage_path))
+                if not run_sync(self.storage.client.download_file, job.storage_path, local_path):
+                    raise FileNotFoundError(f"{job.storage_path} is not in storage")
+                self.ingest(job.inspection_id, local_path, job.storage_path)
+        except Exception as e:
+            logger.exception("Keyframe extraction failed for %s", job.storage_path)
+            self.db.rollback()
+            retry = job.attempts < VIDEO_JOB_MAX_ATTEMPTS
+            self.db.execute(update(VideoJob).where(*held).values(
+                status="pending" if retry else "failed", lease_expires_at=None, error=f"{type(e).__name__}: {e}"[:500]
+            ))
+            self.db.commit()
+            return True
+        self.db.execute(update(VideoJob).where(*held).values(
+            status="done", lease_expires_at=None, completed_at=datetime.utcnow()
+        ))
+        self.db.commit()
+        return True
+
+    async def _upload_batch(self, batch):
+        await asyncio.gather(*(
+            self.storage.client.upload(path, lambda body=body: body, "image/jpeg", len(body)) for path, body in batch
+        ))
+
+def ingest_video_job(inspection_id: int, local_path: str, video_storage_path: str):
+    """
+    Background task: keyframe a stored video, then delete its local copy
+
+    Runs after the upload response with its own session, in the API process
+    (VIDEO_INGEST_MODE=api).
+    """
+    db = SessionLocal()
+    try:
+        VideoIngestService(db).ingest(inspection_id, local_path, video_storage_path)
+    except Exception:
+        logger.exception("Keyframe extraction failed for %s", video_storage_path)
+    finally:
+        db.close()
+        try:
+            os.remove(local_path)
+        except FileNotFoundError:
+            pass
+
+def _encode_jpeg(frame: np.ndarray) -> bytes:
+    height, width = frame.shape[:2]
+    if width > KEYFRAME_MAX_WIDTH and cv2 is not None:
+        frame = cv2.resize(frame, (KEYFRAME_MAX_WIDTH, int(height * KEYFRAME_MAX_WIDTH / width)), interpolation=cv2.INTER_AREA)
+    if cv2 is not None:
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, KEYFRAME_JPEG_QUALITY])
+        if ok:
+            return buffer.tobytes()
+    from PIL import Image  # ffmpeg-only deployments need Pillow for encoding
+    import io
+    out = io.BytesIO()
+    Image.fromarray(frame[..., ::-1]).save(out, "JPEG", quality=KEYFRAME_JPEG_QUALITY)
+    return out.getvalue()
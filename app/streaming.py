@@ -0,0 +1,47 @@
+"""
+NDJSON streaming for list endpoints
+A client sending Accept: application/x-ndjson gets a list as one JSON object
+per line instead of one array. Rows come off a server-side cursor
+STREAM_BATCH_SIZE at a time and each batch is serialized and sent as soon as
+it arrives, so the first rows reach the client before the last are read and
+memory stays flat however long the list is.
+"""
+import os
+from typing import Callable, Iterator, Type
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.database import read_session
+from app.middleware.compression import qvalues
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# OpenAPI entry for routes that can answer with NDJSON as well as JSON
+NDJSON_RESPONSES = {200: {"content": {NDJSON_MEDIA_TYPE: {}}}}
+
+def wants_ndjson(request: Request) -> bool:
+    """Whether the Accept header prefers NDJSON to a JSON array"""
+    weights = qvalues(request.headers.get("accept"))
+    ndjson = weights.get(NDJSON_MEDIA_TYPE, 0.0)
+    return ndjson > 0 and ndjson >= weights.get("application/json", 0.0)
+
+def ndjson_response(request: Request, batches: Callable[[Session], Iterator[list]], schema: Type[BaseModel]) -> StreamingResponse:
+    """
+    Stream row batches as NDJSON, each row shaped by the route's response schema
+
+    Args:
+        request: Current request (picks the read session)
+        batches: Called with a session that stays open for the whole stream; yields lists of rows
+        schema: Response model each row is validated and serialized with
+    """
+    def body():
+        # The session lives as long as the stream, not the request handler
+        with read_session(request) as db:
+            for batch in batches(db):
+                yield "".join(schema.model_validate(row).model_dump_json() + "\n" for row in batch).encode("utf-8")
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,112 @@
+"""
+Classifier benchmark - throughput, latency and per-class accuracy of each
+precision mode on the val/ split, side by side with FP32.
+
+Fails (exit 1) when an exported mode loses more than --max-drop recall on any
+guarded class (Electrical and Physical by default).
+
+Usage:
+    python benchmark_classifier.py --weights models/defect_cls.pt --data split_dataset
+    python benchmark_classifier.py --precisions fp32 int8 --batch 32 --guard Electrical Physical Dust
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.services.classifier_service import (
+    CLASSIFIER_BATCH_SIZE, CLASSIFIER_CLASSES, CLASSIFIER_DATASET, CLASSIFIER_PRECISIONS,
+    CLASSIFIER_WEIGHTS, DefectClassifier, confusion_counts
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+LATENCY_SAMPLES = 100
+
+def load_split(root: str):
+    """(path, label) pairs from <root>/<class>/<image>"""
+    samples = []
+    if not os.path.isdir(root):
+        return samples
+    for cls in sorted(os.listdir(root)):
+        folder = os.path.join(root, cls)
+        if os.path.isdir(folder):
+            samples += [
+                (os.path.join(folder, name), cls)
+                for name in sorted(os.listdir(folder)) if name.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+    return samples
+
+def run(precision: str, args, samples) -> dict:
+    classifier = DefectClassifier(args.weights, precision, args.imgsz)
+    classifier.warmup()
+    paths = [p for p, _ in samples]
+
+    started = time.perf_counter()
+    predicted = [p["defect_class"] for p in classifier.classify(paths, batch_size=args.batch)]
+    elapsed = time.perf_counter() - started
+
+    # Single-frame latency, as seen by an interactive request
+    latencies = []
+    for path in paths[:LATENCY_SAMPLES]:
+        t = time.perf_counter()
+        classifier.classify([path], batch_size=1)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    expected = [label for _, label in samples]
+    return {
+        "precision": precision,
+        "model": classifier.model_path,
+        "images_per_sec": len(paths) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "accuracy": sum(e == p for e, p in zip(expected, predicted)) / len(expected),
+        "classes": confusion_counts(expected, predicted, CLASSIFIER_CLASSES),
+    }
+
+def _pct(value):
+    return "   -  " if value is None else f"{value * 100:5.1f}%"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=CLASSIFIER_WEIGHTS)
+    parser.add_argument("--data", default=CLASSIFIER_DATASET, help="split_dataset root (val/ is evaluated)")
+    parser.add_argument("--precisions", nargs="+", default=list(CLASSIFIER_PRECISIONS), choices=list(CLASSIFIER_PRECISIONS))
+    parser.add_argument("--batch", type=int, default=CLASSIFIER_BATCH_SIZE)
+    parser.add_argument("--imgsz", type=int, default=224)
+    parser.add_argument("--guard", nargs="+", default=["Electrical", "Physical"], help="Classes whose recall may not drop")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="Allowed recall drop vs fp32 (fraction)")
+    args = parser.parse_args()
+
+    samples = load_split(os.path.join(args.data, "val"))
+    if not samples:
+        print(f"No images found under {os.path.join(args.data, 'val')}")
+        return 1
+    precisions = ["fp32"] + [p for p in args.precisions if p != "fp32"]
+    results = [run(p, args, samples) for p in precisions]
+
+    print(f"{len(samples)} val images, batch {args.batch}")
+    print(f"{'mode':<6} {'img/s':>8} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'top1':>7}")
+    baseline = results[0]
+    for r in results:
+        print(f"{r['precision']:<6} {r['images_per_sec']:8.1f} {r['images_per_sec'] / baseline['images_per_sec']:7.2f}x "
+              f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {_pct(r['accuracy'])}")
+
+    print(f"\n{'class':<14} {'n':>5} " + " ".join(f"{r['precision'] + ' rec':>10} {r['precision'] + ' prec':>10}" for r in results))
+    for cls in CLASSIFIER_CLASSES:
+        row = " ".join(f"{_pct(r['classes'][cls]['recall']):>10} {_pct(r['classes'][cls]['precision']):>10}" for r in results)
+        print(f"{cls:<14} {baseline['classes'][cls]['support']:>5} {row}")
+
+    failures = []
+    for r in results[1:]:
+        for cls in args.guard:
+            base, quant = baseline["classes"][cls]["recall"], r["classes"][cls]["recall"]
+            if base is not None and quant is not None and base - quant > args.max_drop:
+                failures.append(f"{r['precision']}: {cls} recall {_pct(quant)} vs fp32 {_pct(base)}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
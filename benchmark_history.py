@@ -0,0 +1,175 @@
+"""
+Status-history benchmark - Latency of the inspection status-update write path
+with the transition log off, written inline (one extra INSERT + commit per
+request), or handed to the batched background writer; then delivery checks
+for the writer under injected database failures, lost commit acknowledgements
+and a full buffer.
+
+Usage:
+    python benchmark_history.py --updates 2000 [--db-latency-ms 1]
+    DATABASE_URL=postgresql://... python benchmark_history.py
+
+Without DATABASE_URL a throwaway SQLite file is used; --db-latency-ms adds a
+simulated network round trip to every statement so the cost of the inline
+write is visible locally. Exits 1 if any event is lost or duplicated.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "history_bench.db"))
+
+from sqlalchemy import event, func, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Inspection, InspectionEvent, User  # noqa: E402
+from app.services import history_service  # noqa: E402
+from app.services.history_service import HistoryWriter, make_event  # noqa: E402
+from app.services.inspection_service import InspectionService  # noqa: E402
+
+def _setup(count: int) -> list:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(name="bench", email=f"{uuid.uuid4().hex[:12]}@bench.local", password="-", role="customer")
+        db.add(user)
+        db.flush()
+        inspections = [Inspection(customer_id=user.id, location="Bench", status="pending") for _ in range(count)]
+        db.add_all(inspections)
+        db.commit()
+        return [i.id for i in inspections]
+    finally:
+        db.close()
+
+def _stored(inspection_id: int) -> tuple:
+    """(rows, distinct event ids) logged for an inspection"""
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(func.count(), func.count(func.distinct(InspectionEvent.event_id)))
+            .where(InspectionEvent.inspection_id == inspection_id)
+        ).one()
+    finally:
+        db.close()
+
+def bench_write_path(mode: str, inspection_id: int, updates: int) -> dict:
+    """Time update_status requests (own session each) alternating between two statuses"""
+    history_service.HISTORY_WRITER_MODE = mode
+    latencies = []
+    for n in range(updates):
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            InspectionService(db).update_status(inspection_id, "scheduled" if n % 2 == 0 else "pending")
+        finally:
+            db.close()
+        latencies.append(time.perf_counter() - start)
+    history_service.close_history_writer()
+    ms = np.array(latencies) * 1000
+    rows, distinct = _stored(inspection_id)
+    expected = 0 if mode == "off" else updates
+    return {
+        "p50": np.percentile(ms, 50), "p95": np.percentile(ms, 95), "p99": np.percentile(ms, 99),
+        "ok": rows == distinct == expected, "rows": rows,
+    }
+
+class FlakySessions:
+    """Session factory whose first sessions fail to insert, or commit then raise (lost ack)"""
+
+    def __init__(self, failures: int = 0, lost_acks: int = 0, delay: float = 0.0):
+        self.failures = failures
+        self.lost_acks = lost_acks
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        db = SessionLocal()
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                def execute(*args, **kwargs):
+                    raise OperationalError("INSERT", {}, Exception("injected failure"))
+                db.execute = execute
+            elif self.lost_acks:
+                self.lost_acks -= 1
+                commit = db.commit
+                def commit_then_fail():
+                    commit()
+                    db.commit = commit
+                    raise OperationalError("COMMIT", {}, Exception("injected lost acknowledgement"))
+                db.commit = commit_then_fail
+        return db
+
+def check_delivery(name: str, inspection_id: int, events: int, writer: HistoryWriter, producers: int = 1) -> bool:
+    per_thread = events // producers
+
+    def produce():
+        for _ in range(per_thread):
+            writer.submit([make_event(inspection_id, "scheduled", "pending", source="bench")])
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=produce) for _ in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close(timeout=120)
+    seconds = time.perf_counter() - start
+    rows, distinct = _stored(inspection_id)
+    ok = rows == distinct == per_thread * producers
+    stats = writer.stats()
+    print(f"{name:<22} {rows:>6} stored / {per_thread * producers} sent, {distinct} distinct  "
+          f"batches={stats['batches']} retries={stats['retries']} inline={stats['inline_writes']}  "
+          f"{seconds:.2f}s  {'ok' if ok else 'FAIL'}")
+    return ok
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=1000, help="Status updates timed per mode")
+    parser.add_argument("--events", type=int, default=2000, help="Events sent per delivery check")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Simulated round trip added per statement")
+    args = parser.parse_args()
+    logging.getLogger("app.services.history_service").setLevel(logging.ERROR)  # Injected failures are expected
+
+    if args.db_latency_ms:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _round_trip(*_):
+            time.sleep(args.db_latency_ms / 1000)
+
+    ids = _setup(7)
+    print(f"Write path: {args.updates} status updates per mode ({engine.url.get_backend_name()})")
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  logged")
+    results = {}
+    for mode, inspection_id in zip(("off", "async", "inline"), ids):
+        result = results[mode] = bench_write_path(mode, inspection_id, args.updates)
+        print(f"{mode:<8} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f}  "
+              f"{result['rows']} {'ok' if result['ok'] else 'FAIL'}")
+    print(f"async p50 overhead vs off: {results['async']['p50'] - results['off']['p50']:+.2f} ms, "
+          f"inline: {results['inline']['p50'] - results['off']['p50']:+.2f} ms")
+
+    print(f"\nDelivery: {args.events} events per scenario")
+    history_service.HISTORY_ENQUEUE_TIMEOUT_SECONDS = 0.005
+    checks = [
+        check_delivery("steady", ids[3], args.events, HistoryWriter(batch_size=200)),
+        check_delivery("failing inserts", ids[4], args.events, HistoryWriter(FlakySessions(failures=4), batch_size=200)),
+        check_delivery("lost commit acks", ids[5], args.events, HistoryWriter(FlakySessions(lost_acks=3), batch_size=200)),
+        check_delivery(
+            "full buffer (slow db)", ids[6], args.events,
+            HistoryWriter(FlakySessions(delay=0.05), buffer_size=50, batch_size=20), producers=4
+        ),
+    ]
+    ok = all(r["ok"] for r in results.values()) and all(checks)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Query budget harness - exercises every /api/v1 route against a throwaway SQLite
+database and fails if any route issues more SQL than its @query_budget allows,
+or answers any call with an error status (a route that errors out early can't
+prove its budget).
+
+Usage:
+    python check_query_budgets.py
+"""
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="vyooma-budget-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'budget.db')}"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ["PROFILING_MODE"] = "on"  # So the profile download route has a profile to serve
+os.environ["PROFILE_SAMPLE_RATE"] = "0"
+
+from fastapi.testclient import TestClient
+from fastapi.routing import APIRoute
+
+from app.main import app
+from app.auth import create_access_token, hash_password
+from app.database import SessionLocal
+from app.models import User
+from app.middleware.query_budget import QueryBudgetMiddleware, QueryBudgetExceeded, assert_within_budget
+
+results = []
+errors = []
+
+# Smallest JPEG header carrying an XMP packet, so frame ingest has something to index
+_XMP = b"http://ns.adobe.com/xap/1.0/\x00" + b'<rdf:Description drone-dji:GpsLatitude="26.9" drone-dji:GpsLongtitude="73.0"/>'
+_FRAME = b"\xff\xd8\xff\xe1" + (len(_XMP) + 2).to_bytes(2, "big") + _XMP + b"\xff\xd9"
+
+def _collect(label, budget, log):
+    results.append((label, budget, log))
+
+def _check_status(response):
+    if response.status_code >= 400:
+        response.read()
+        errors.append(f"{response.request.method} {response.request.url.path}: answered {response.status_code} {response.text[:200]}")
+
+def _headers(client, role):
+    email = f"budget-{role}@example.com"
+    client.post("/api/v1/auth/register", json={
+        "name": role, "email": email, "password": "budget123", "role": role, "latitude": 27.0, "longitude": 73.5
+    })
+    token = client.post("/api/v1/auth/login", json={"email": email, "password": "budget123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def _admin_headers():
+    # Admins cannot self-register, so create one directly
+    db = SessionLocal()
+    try:
+        admin = User(name="admin", email="budget-admin@example.com", password=hash_password("budget123"), role="admin")
+        db.add(admin)
+        db.commit()
+        token = create_access_token({"user_id": admin.id, "email": admin.email, "role": admin.role})
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {token}"}
+
+def exercise(client):
+    """One realistic call per v1 route, in workflow order"""
+    customer = _headers(client, "customer")
+    pilot = _headers(client, "pilot")
+    admin = _admin_headers()
+    booking = {"location": "Budget Solar Park", "scheduled_date": "2030-01-01T00:00:00", "package": "Premium",
+               "latitude": 26.9, "longitude": 73.0}
+
+    for _ in range(3):
+        client.post("/api/v1/inspections", json=booking, headers=customer)
+    retried = {**customer, "Idempotency-Key": "budget-booking"}
+    inspection_id = client.post("/api/v1/inspections", json=booking, headers=retried).json()["id"]
+    client.post("/api/v1/inspections", json=booking, headers=retried)  # Replayed without SQL
+    client.get("/api/v1/inspections", headers=customer)
+    client.get("/api/v1/inspections", headers=pilot)
+    client.get("/api/v1/inspections", headers={**pilot, "Accept": "application/x-ndjson"})
+    client.get("/api/v1/inspections?date_from=2020-01-01T00:00:00", headers=customer)
+    client.post("/api/v1/inspections/dispatch?dry_run=true", headers=admin)
+    client.get(f"/api/v1/inspections/{inspection_id}", headers=customer)
+    client.patch(f"/api/v1/inspections/{inspection_id}/assign", headers=pilot)
+    client.patch(f"/api/v1/inspections/{inspection_id}/status?new_status=scheduled", headers=pilot)
+    client.post(f"/api/v1/inspections/{inspection_id}/upload",
+                files=[("files", ("frame.jpg", _FRAME, "image/jpeg"))], headers=pilot)
+    client.get(f"/api/v1/inspections/{inspection_id}/frames?min_lat=26&min_lon=72&max_lat=28&max_lon=74", headers=customer)
+    client.get(f"/api/v1/inspections/{inspection_id}/frames/bounds", headers=customer)
+    client.get(f"/api/v1/inspections/{inspection_id}/frames/nearest?lat=26.9&lon=73.0&k=1", headers=customer)
+    client.get(f"/api/v1/inspections/{inspection_id}/analysis", headers=customer)
+    client.post(f"/api/v1/inspections/{inspection_id}/analysis/retry", headers=admin)
+
+    upload = client.post(f"/api/v1/inspections/{inspection_id}/uploads",
+                         json={"filename": "frame.jpg", "size": 4}, headers=pilot).json()
+    client.head(f"/api/v1/inspections/{inspection_id}/uploads/{upload['id']}", headers=pilot)
+    client.patch(f"/api/v1/inspections/{inspection_id}/uploads/{upload['id']}",
+                 content=b"\xff\xd8\xff\xd9", headers={**pilot, "Upload-Offset": "0"})
+    client.get(f"/api/v1/inspections/{inspection_id}/uploads/{upload['id']}", headers=pilot)
+    client.post(f"/api/v1/inspections/{inspection_id}/uploads/finalize",
+                json={"upload_ids": [upload["id"]]}, headers=pilot)
+
+    client.post("/api/v1/reports", json={
+        "inspection_id": inspection_id, "title": "Budget report", "summary": "ok",
+        "defect_classification": "Dust", "confidence": 90,
+        "findings": [{"defect_class": "Dust", "confidence": 90, "latitude": 26.9, "longitude": 73.0},
+                     {"defect_class": "Physical", "confidence": 75, "latitude": 26.9001, "longitude": 73.0002}]
+    }, headers=pilot)
+    client.get(f"/api/v1/reports/{inspection_id}", headers=customer)
+    client.get(f"/api/v1/reports/{inspection_id}/pdf", headers=customer)  # Queues the render
+    client.get(f"/api/v1/reports/{inspection_id}/pdf", headers=customer, follow_redirects=False)
+    client.get(f"/api/v1/inspections/{inspection_id}/history", headers=customer)
+    client.get("/api/v1/dashboard/me", headers=customer)
+    client.get("/api/v1/dashboard/me", headers=pilot)
+    client.get(f"/api/v1/inspections/batch?ids={inspection_id}&ids={inspection_id - 1}&ids=999999", headers=customer)
+    client.get(f"/api/v1/reports/batch?inspection_ids={inspection_id}&inspection_ids=999999", headers=customer)
+    client.get("/api/v1/search?q=budget+sol&status=completed", headers=customer)
+    client.get("/api/v1/search/suggest?q=bud", headers=pilot)
+    client.get(f"/api/v1/reports/heatmap/{inspection_id}/12/2878/1714.png", headers=customer)
+    client.get("/api/v1/reports/customer/all", headers=customer)
+    client.get("/api/v1/reports/customer/all", headers={**customer, "Accept": "application/x-ndjson"})
+    client.get("/api/v1/reports/customer/all?date_from=2020-01-01T00:00:00", headers=customer)
+    client.get("/api/v1/reports/customer/export?format=ndjson", headers=customer)
+    client.get("/api/v1/reports/analytics/me", headers=customer)
+    client.get("/api/v1/reports/analytics/me/trends?by_site=true", headers=customer)
+    client.post("/api/v1/analytics/sla/refresh", headers=admin)
+    client.get("/api/v1/analytics/sla?group_by=package_region", headers=admin)
+    client.get("/api/v1/sync/changes", headers=pilot)
+    client.post("/api/v1/sync/push", json={
+        "inspections": [{"id": inspection_id, "base": {"processed_images_path": None}, "changes": {"processed_images_path": "field/processed"}}],
+        "events": [{"event_id": "budget-sync-event", "inspection_id": inspection_id, "field": "processed_images_path",
+                    "from_value": None, "to_value": "field/processed", "occurred_at": "2030-01-01T00:00:00"}],
+    }, headers={**pilot, "Idempotency-Key": "budget-sync"})
+    profile_id = client.get("/api/v1/profiles", headers={**admin, "X-Profile": "1"}).headers["X-Profile-Id"]
+    client.post("/api/v1/profiles/token", headers=admin)
+    client.get(f"/api/v1/profiles/{profile_id}?format=folded", headers=admin)
+
+def main() -> int:
+    app.add_middleware(QueryBudgetMiddleware, on_request=_collect)
+    with TestClient(app) as client:
+        client.event_hooks["response"].append(_check_status)
+        exercise(client)
+
+    failures = list(errors)
+    covered = set()
+    for label, budget, log in results:
+        covered.add(label)
+        if budget is None:
+            if label.split(" ", 1)[1].startswith("/api/v1"):
+                failures.append(f"{label}: no @query_budget declared ({len(log.statements)} statements)")
+            continue
+        try:
+            assert_within_budget(label, budget, log)
+            print(f"ok   {label:<55} {len(log.statements):>3} statements {log.rows:>4} rows  ({budget})")
+        except QueryBudgetExceeded as e:
+            failures.append(str(e))
+
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path.startswith("/api/v1"):
+            for method in route.methods:
+                if f"{method} {route.path}" not in covered:
+                    failures.append(f"{method} {route.path}: not exercised by the harness")
+
+    for failure in dict.fromkeys(failures):
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Fake storage server - Local stand-in for the Supabase Storage endpoints the
+StorageClient uses (object upload, batch signing, signed download), with
+optional latency and failure injection to exercise pooling and retries.
+
+Usage:
+    python fake_storage.py serve --port 9000 [--latency-ms 50] [--failure-rate 0.1]
+    SUPABASE_URL=http://127.0.0.1:9000 SUPABASE_KEY=dev uvicorn app.main:app
+
+    python fake_storage.py bench --frames 500 --frame-kb 512 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import tempfile
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
+
+STORAGE_ROOT = os.getenv("FAKE_STORAGE_ROOT", os.path.join(tempfile.gettempdir(), "vyooma-fake-storage"))
+LATENCY_MS = float(os.getenv("FAKE_STORAGE_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.getenv("FAKE_STORAGE_FAILURE_RATE", "0"))
+
+app = FastAPI(title="Fake Storage")
+_tokens = {}  # token -> (bucket, path)
+
+def _object_path(bucket: str, path: str) -> str:
+    full = os.path.normpath(os.path.join(STORAGE_ROOT, bucket, path))
+    if not full.startswith(os.path.join(STORAGE_ROOT, bucket)):
+        raise HTTPException(status_code=400, detail="Invalid path")
+    return full
+
+async def _simulate():
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Injected failure")
+
+def _sign(bucket: str, path: str) -> str:
+    token = secrets.token_urlsafe(16)
+    _tokens[token] = (bucket, path)
+    return f"/object/sign/{bucket}/{path}?token={token}"
+
+@app.post("/storage/v1/object/sign/{bucket}")
+async def sign_batch(bucket: str, request: Request):
+    await _simulate()
+    body = await request.json()
+    return [
+        {"path": p, "signedURL": _sign(bucket, p), "error": None}
+        if os.path.exists(_object_path(bucket, p))
+        else {"path": p, "signedURL": None, "error": "Object not found"}
+        for p in body["paths"]
+    ]
+
+@app.post("/storage/v1/object/{bucket}/{path:path}")
+async def upload_object(bucket: str, path: str, request: Request):
+    await _simulate()
+    target = _object_path(bucket, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "wb") as f:
+        async for chunk in request.stream():
+            f.write(chunk)
+    return {"Key": f"{bucket}/{path}"}
+
+@app.get("/storage/v1/object/sign/{bucket}/{path:path}")
+async def download_signed(bucket: str, path: str, token: str):
+    if _tokens.get(token) != (bucket, path):
+        raise HTTPException(status_code=400, detail="Invalid signature")
+    return FileResponse(_object_path(bucket, path))
+
+def bench(args):
+    """Upload N frames through the shared client against an in-process fake server"""
+    import threading
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    from app.services.storage_client import StorageClient, HTTP2_AVAILABLE
+
+    frame = os.urandom(args.frame_kb * 1024)
+
+    async def run(concurrency):
+        client = StorageClient(url=f"http://127.0.0.1:{args.port}", key="dev", bucket="bench", max_concurrency=concurrency)
+        started = time.perf_counter()
+        paths = await asyncio.gather(*(
+            client.upload(f"frames/{i}.jpg", lambda: frame, "image/jpeg", size=len(frame)) for i in range(args.frames)
+        ))
+        signed = await client.sign_many(paths)
+        elapsed = time.perf_counter() - started
+        await client.aclose()
+        assert all(signed.values())
+        return elapsed
+
+    total_mb = args.frames * args.frame_kb / 1024
+    print(f"{args.frames} frames x {args.frame_kb} KB, {LATENCY_MS:.0f} ms latency, http2={HTTP2_AVAILABLE}")
+    for concurrency in (1, args.concurrency):
+        elapsed = asyncio.run(run(concurrency))
+        print(f"  concurrency {concurrency:>3}: {elapsed:6.2f} s  ({total_mb / elapsed:6.1f} MB/s)")
+    server.should_exit = True
+
+def main():
+    global LATENCY_MS, FAILURE_RATE
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("--port", type=int, default=9000)
+        p.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+        p.add_argument("--failure-rate", type=float, default=FAILURE_RATE)
+    sub.choices["bench"].add_argument("--frames", type=int, default=500)
+    sub.choices["bench"].add_argument("--frame-kb", type=int, default=512)
+    sub.choices["bench"].add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    LATENCY_MS, FAILURE_RATE = args.latency_ms, args.failure_rate
+
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run(app, host="127.0.0.1", port=args.port)
+    else:
+        bench(args)
+
+if __name__ == "__main__":
+    main()